@@ -1,87 +1,36 @@
 import sys
-import subprocess
-import importlib.util
 import os
+import multiprocessing
+import importlib.util
 
-def check_and_install_libraries():
-    """
-    Vérifie si les bibliothèques requises sont installées et les installe si nécessaire
-    """
-    print("Vérification des dépendances nécessaires...")
-    
-    # Liste des bibliothèques requises
-    required_libraries = {
-        "PIL": "pillow",       # Pour le traitement des images
-        "PyPDF2": "PyPDF2",    # Pour la manipulation basique des PDF
-    }
-    
-    # Vérification et installation des bibliothèques
-    for lib_name, pip_name in required_libraries.items():
-        if not is_library_installed(lib_name):
-            print(f"{lib_name} n'est pas installé. Installation en cours...")
-            try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", pip_name])
-                print(f"{lib_name} a été installé avec succès.")
-            except subprocess.CalledProcessError:
-                print(f"Erreur lors de l'installation de {lib_name}. Veuillez l'installer manuellement avec : pip install {pip_name}")
-                return False
-        else:
-            print(f"{lib_name} est déjà installé.")
-    
-    # Vérifier si Ghostscript est installé
-    if not is_ghostscript_installed():
-        print("\nGhostscript n'est pas installé ou n'est pas dans le PATH.")
-        print("La compression PDF sera limitée sans Ghostscript.")
-        print("\nInstructions d'installation de Ghostscript :")
-        print("- Windows : Télécharger et installer depuis https://www.ghostscript.com/download.html")
-        print("- macOS : brew install ghostscript")
-        print("- Linux : sudo apt-get install ghostscript")
-        print("\nL'application fonctionnera sans Ghostscript, mais la compression PDF sera moins efficace.")
-    else:
-        print("Ghostscript est installé et disponible.")
-    
-    print("\nToutes les dépendances Python ont été vérifiées.")
-    return True
-
-def is_library_installed(library_name):
-    """
-    Vérifie si une bibliothèque Python est installée
-    """
-    return importlib.util.find_spec(library_name) is not None
-
-def is_ghostscript_installed():
-    """
-    Vérifie si Ghostscript est installé
-    """
-    try:
-        # Tente d'exécuter la commande gs --version
-        subprocess.run(
-            ["gs", "--version"], 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        return False
+from pj_compressor import COMPRESSION_SETTINGS, compress_tree, interrupted_run
+from pj_compressor.dependencies import check_and_install_libraries
 
-# Exécuter la vérification des bibliothèques avant d'importer les modules
+# Les dépendances de compression sont vérifiées en arrière-plan, une fois la fenêtre affichée
 if __name__ == "__main__":
-    # Vérifier et installer les bibliothèques
-    if check_and_install_libraries():
+    # Nécessaire pour le pool de processus dans un exécutable figé (Windows)
+    multiprocessing.freeze_support()
+    
+    # Seul tkinter est nécessaire pour afficher la fenêtre
+    if importlib.util.find_spec("tkinter") is not None:
         print("Démarrage de l'application...")
         
-        # Maintenant qu'on est sûr que les bibliothèques sont installées, on peut les importer
+        # Pillow et PyPDF2 ne sont importés qu'au premier fichier de ce type : la fenêtre
+        # s'affiche sans les attendre, et les dépendances sont vérifiées en arrière-plan
         import tkinter as tk
         from tkinter import filedialog, ttk, messagebox
-        from PIL import Image, ImageFile
         import threading
-        import shutil
-        import tempfile
-        from PyPDF2 import PdfReader, PdfWriter
+        import queue
+        import time
         
-        # Permet à Pillow de traiter des images potentiellement corrompues
-        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        # Fréquence de rafraîchissement de l'interface (ms)
+        REFRESH_INTERVAL_MS = 100
+        # Nombre de lignes conservées dans le journal affiché (le journal complet est dans un fichier)
+        MAX_LOG_LINES = 2000
+        # Dossier des journaux complets de chaque exécution
+        LOG_DIR = os.path.join(os.path.expanduser("~"), ".pj_compressor", "logs")
+        # Choix proposés pour la conversion des PNG (libellé → format)
+        PNG_CONVERSION_CHOICES = {"Non": None, "JPEG": "jpeg", "WebP": "webp"}
         
         class CompressionApp:
             def __init__(self, root):
@@ -95,7 +44,21 @@ if __name__ == "__main__":
                 self.destination_folder = tk.StringVar()
                 self.compression_level = tk.StringVar(value="moyenne")
                 self.create_copies = tk.BooleanVar(value=True)
+                self.worker_count = tk.IntVar(value=os.cpu_count() or 1)
+                self.force_rebuild = tk.BooleanVar(value=False)
+                self.min_saving_percent = tk.IntVar(value=0)
+                self.png_conversion = tk.StringVar(value="Non")
+                self.target_size_kb = tk.IntVar(value=0)
+                self.deduplicate = tk.BooleanVar(value=False)
                 self.compression_running = False
+                # Le bouton de compression n'est activé qu'une fois les dépendances vérifiées
+                self.dependencies_ok = False
+                
+                # File d'événements entre le thread de compression et l'interface :
+                # seul le thread Tk touche aux widgets, à intervalle régulier
+                self.events = queue.Queue()
+                self.log_file = None
+                self.log_lock = threading.Lock()
                 
                 # Configuration du style
                 self.style = ttk.Style()
@@ -106,12 +69,10 @@ if __name__ == "__main__":
                 # Création de l'interface
                 self.create_widgets()
                 
-                # Définir les niveaux de compression (qualité/dpi)
-                self.compression_settings = {
-                    "légère": {"image_quality": 90, "pdf_dpi": 150},
-                    "moyenne": {"image_quality": 75, "pdf_dpi": 120},
-                    "forte": {"image_quality": 50, "pdf_dpi": 90}
-                }
+                # Niveaux de compression (qualité/dpi), partagés avec la ligne de commande
+                self.compression_settings = COMPRESSION_SETTINGS
+                
+                self.root.after(REFRESH_INTERVAL_MS, self.process_events)
             
             def create_widgets(self):
                 # Frame principale
@@ -195,6 +156,71 @@ if __name__ == "__main__":
                 )
                 copy_check.grid(row=1, column=0, columnspan=3, sticky=tk.W, pady=5)
                 
+                # Option Nombre de processus
+                workers_label = ttk.Label(options_frame, text="Processus en parallèle:")
+                workers_label.grid(row=2, column=0, sticky=tk.W, pady=5)
+                
+                ttk.Spinbox(
+                    options_frame, 
+                    from_=1, 
+                    to=(os.cpu_count() or 1) * 2, 
+                    textvariable=self.worker_count, 
+                    width=5
+                ).grid(row=2, column=1, sticky=tk.W, pady=5)
+                
+                # Option Recompression complète
+                force_check = ttk.Checkbutton(
+                    options_frame, 
+                    text="Tout recompresser (ignorer les fichiers déjà traités lors d'une exécution précédente)", 
+                    variable=self.force_rebuild
+                )
+                force_check.grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=5)
+                
+                # Option Gain minimal
+                saving_label = ttk.Label(options_frame, text="Gain minimal (%):")
+                saving_label.grid(row=4, column=0, sticky=tk.W, pady=5)
+                
+                ttk.Spinbox(
+                    options_frame, 
+                    from_=0, 
+                    to=90, 
+                    textvariable=self.min_saving_percent, 
+                    width=5
+                ).grid(row=4, column=1, sticky=tk.W, pady=5)
+                
+                # Option Conversion des PNG
+                convert_label = ttk.Label(options_frame, text="Convertir les PNG en:")
+                convert_label.grid(row=5, column=0, sticky=tk.W, pady=5)
+                
+                ttk.Combobox(
+                    options_frame, 
+                    values=list(PNG_CONVERSION_CHOICES), 
+                    textvariable=self.png_conversion, 
+                    state="readonly", 
+                    width=8
+                ).grid(row=5, column=1, sticky=tk.W, pady=5)
+                
+                # Option Taille maximale par fichier
+                target_label = ttk.Label(options_frame, text="Taille max. par fichier (Ko, 0 = sans limite):")
+                target_label.grid(row=6, column=0, sticky=tk.W, pady=5)
+                
+                ttk.Spinbox(
+                    options_frame, 
+                    from_=0, 
+                    to=100000, 
+                    increment=100, 
+                    textvariable=self.target_size_kb, 
+                    width=8
+                ).grid(row=6, column=1, sticky=tk.W, pady=5)
+                
+                # Option Fichiers identiques
+                dedup_check = ttk.Checkbutton(
+                    options_frame, 
+                    text="Ne compresser qu'une fois les fichiers identiques (copies de la même pièce jointe)", 
+                    variable=self.deduplicate
+                )
+                dedup_check.grid(row=7, column=0, columnspan=3, sticky=tk.W, pady=5)
+                
                 # Section Logs
                 log_frame = ttk.LabelFrame(main_frame, text="Journal", padding=10)
                 log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -218,6 +244,11 @@ if __name__ == "__main__":
                 )
                 self.progress_bar.pack(fill=tk.X, pady=(10, 5))
                 
+                # Avancement (nombre de fichiers traités / découverts)
+                self.status_var = tk.StringVar()
+                status_label = ttk.Label(main_frame, textvariable=self.status_var)
+                status_label.pack(fill=tk.X)
+                
                 # Boutons
                 buttons_frame = ttk.Frame(main_frame)
                 buttons_frame.pack(fill=tk.X, pady=5)
@@ -229,6 +260,9 @@ if __name__ == "__main__":
                     width=25
                 )
                 self.compress_button.pack(side=tk.RIGHT, padx=5)
+                # Activé une fois les dépendances vérifiées
+                self.compress_button.config(state=tk.DISABLED)
+                self.status_var.set("Vérification des dépendances...")
                 
                 cancel_button = ttk.Button(
                     buttons_frame, 
@@ -251,10 +285,96 @@ if __name__ == "__main__":
                     self.log("Dossier destination sélectionné: " + folder)
             
             def log(self, message):
-                self.log_text.insert(tk.END, message + "\n")
+                """Ajoute un message au journal (utilisable depuis n'importe quel thread)"""
+                with self.log_lock:
+                    if self.log_file is not None:
+                        self.log_file.write(message + "\n")
+                self.events.put(("log", message))
+            
+            def process_events(self):
+                """Applique à l'interface, par lots, les événements reçus depuis le dernier rafraîchissement"""
+                lines = []
+                progress = None
+                finished = None
+                try:
+                    while True:
+                        event = self.events.get_nowait()
+                        if event[0] == "log":
+                            lines.append(event[1])
+                        elif event[0] == "progress":
+                            # Seul le dernier état d'avancement compte
+                            progress = event[1:]
+                        elif event[0] == "done":
+                            finished = event[1:]
+                        elif event[0] == "dependencies":
+                            self.dependencies_checked(event[1])
+                except queue.Empty:
+                    pass
+                
+                if lines:
+                    self.append_log(lines[-MAX_LOG_LINES:])
+                if progress is not None:
+                    self.show_progress(*progress)
+                if finished is not None:
+                    self.finish_compression(*finished)
+                
+                with self.log_lock:
+                    if self.log_file is not None:
+                        self.log_file.flush()
+                
+                self.root.after(REFRESH_INTERVAL_MS, self.process_events)
+            
+            def append_log(self, lines):
+                self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+                
+                # Ne garder que les dernières lignes dans le widget
+                line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                if line_count > MAX_LOG_LINES:
+                    self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+                
                 self.log_text.see(tk.END)
-                # Pour s'assurer que les messages sont visibles immédiatement
-                self.root.update_idletasks()
+            
+            def open_log_file(self):
+                """Ouvre le fichier recevant le journal complet de l'exécution et renvoie son chemin"""
+                try:
+                    os.makedirs(LOG_DIR, exist_ok=True)
+                    log_path = os.path.join(LOG_DIR, time.strftime("compression_%Y%m%d_%H%M%S.log"))
+                    log_file = open(log_path, "w", encoding="utf-8")
+                except OSError as e:
+                    self.log(f"Avertissement: impossible de créer le fichier journal ({str(e)})")
+                    return None
+                with self.log_lock:
+                    self.log_file = log_file
+                self.log(f"Journal complet: {log_path}")
+                return log_path
+            
+            def close_log_file(self):
+                with self.log_lock:
+                    log_file, self.log_file = self.log_file, None
+                if log_file is not None:
+                    log_file.close()
+            
+            def check_dependencies(self):
+                """Vérifie (et installe si besoin) les dépendances sans bloquer l'affichage de la fenêtre"""
+                try:
+                    available = check_and_install_libraries(self.log)
+                except Exception as e:
+                    self.log(f"Erreur lors de la vérification des dépendances: {str(e)}")
+                    available = False
+                self.events.put(("dependencies", available))
+            
+            def dependencies_checked(self, available):
+                self.dependencies_ok = available
+                if available:
+                    self.status_var.set("")
+                    self.compress_button.config(state=tk.NORMAL)
+                else:
+                    self.status_var.set("Dépendances manquantes")
+                    messagebox.showerror(
+                        "Erreur",
+                        "Impossible de démarrer la compression en raison de dépendances manquantes "
+                        "(voir le journal)."
+                    )
             
             def start_compression(self):
                 if self.compression_running:
@@ -280,252 +400,94 @@ if __name__ == "__main__":
                     if not confirm:
                         return
                 
-                # Vérifier si Ghostscript est installé pour la compression PDF
-                gs_installed = is_ghostscript_installed()
-                if not gs_installed:
-                    self.log("Avertissement: Ghostscript n'est pas installé ou disponible dans le PATH.")
-                    self.log("La compression PDF sera limitée. Considérez installer Ghostscript pour de meilleurs résultats.")
+                # Les options sont lues ici : le thread de compression ne touche pas aux variables Tk
+                try:
+                    options = dict(
+                        source=source,
+                        destination=destination if self.create_copies.get() else None,
+                        level=self.compression_level.get(),
+                        workers=self.worker_count.get(),
+                        force=self.force_rebuild.get(),
+                        min_saving_percent=self.min_saving_percent.get(),
+                        convert_png=PNG_CONVERSION_CHOICES[self.png_conversion.get()],
+                        target_size=self.target_size_kb.get() * 1024 or None,
+                        # Copie légère si le système de fichiers le permet, copie sinon
+                        dedup="reflink" if self.deduplicate.get() else None
+                    )
+                except tk.TclError:
+                    messagebox.showerror("Erreur", "Veuillez saisir des nombres entiers dans les options!")
+                    return
+                
+                # Compression précédente interrompue (arrêt brutal, fermeture de l'application)
+                run = interrupted_run(options["source"], options["destination"])
+                if run is not None:
+                    resume = messagebox.askyesno(
+                        "Reprise",
+                        f"Une compression lancée le {run.get('started')} a été interrompue "
+                        f"({run['processed']} fichiers déjà traités).\n"
+                        "Reprendre là où elle s'est arrêtée, avec les mêmes options?"
+                    )
+                    if resume:
+                        options.update(run.get("options", {}))
+                        options["resume"] = True
+                
+                # Initialiser la barre de progression (indéterminée tant que le parcours n'est pas terminé)
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_var.set(0)
+                self.status_var.set("Parcours du dossier source...")
                 
                 # Démarrer la compression dans un thread séparé
                 self.compression_running = True
                 self.compress_button.config(state=tk.DISABLED)
-                threading.Thread(target=self.compress_files, daemon=True).start()
+                log_path = self.open_log_file()
+                if log_path:
+                    # Rapport détaillé (une ligne par fichier) à côté du journal
+                    options["report"] = os.path.splitext(log_path)[0] + "_rapport.csv"
+                threading.Thread(target=self.compress_files, args=(options,), daemon=True).start()
             
-            def compress_files(self):
+            def compress_files(self, options):
                 try:
-                    source = self.source_folder.get()
-                    destination = self.destination_folder.get()
-                    comp_level = self.compression_level.get()
-                    create_copies = self.create_copies.get()
-                    
-                    # Récupérer les paramètres de compression
-                    image_quality = self.compression_settings[comp_level]["image_quality"]
-                    pdf_dpi = self.compression_settings[comp_level]["pdf_dpi"]
-                    
-                    self.log(f"Niveau de compression sélectionné: {comp_level}")
-                    self.log(f"Qualité d'image: {image_quality}, DPI pour PDF: {pdf_dpi}")
-                    
-                    # Lister tous les fichiers à traiter
-                    all_files = []
-                    for root, _, files in os.walk(source):
-                        for file_name in files:
-                            if file_name.lower().endswith((".png", ".jpg", ".jpeg", ".pdf")):
-                                file_path = os.path.join(root, file_name)
-                                all_files.append(file_path)
-                    
-                    if not all_files:
-                        self.log("Aucun fichier à compresser trouvé dans le dossier source.")
-                        self.finish_compression()
-                        return
+                    summary = compress_tree(log=self.log, progress=self.update_progress, **options)
                     
-                    self.log(f"Nombre de fichiers à traiter: {len(all_files)}")
-                    
-                    # Initialiser la barre de progression
-                    self.progress_var.set(0)
-                    processed = 0
-                    saved_space = 0
-                    
-                    for file_path in all_files:
-                        # Récupérer la taille initiale
-                        initial_size = os.path.getsize(file_path)
-                        
-                        # Déterminer le chemin de destination
-                        rel_path = os.path.relpath(file_path, source)
-                        dest_path = os.path.join(destination, rel_path) if create_copies else file_path
-                        
-                        if create_copies:
-                            # Créer les dossiers de destination si nécessaire
-                            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                            # Copier le fichier
-                            shutil.copy2(file_path, dest_path)
-                            file_to_compress = dest_path
-                        else:
-                            file_to_compress = file_path
-                        
-                        # Compression selon le type de fichier
-                        file_ext = os.path.splitext(file_path)[1].lower()
-                        if file_ext in ['.png', '.jpg', '.jpeg']:
-                            success = self.compress_image(file_to_compress, image_quality)
-                        elif file_ext == '.pdf':
-                            success = self.compress_pdf(file_to_compress, pdf_dpi)
-                        else:
-                            success = False
-                        
-                        # Calculer l'espace gagné si la compression a réussi
-                        if success:
-                            final_size = os.path.getsize(file_to_compress)
-                            file_saved = initial_size - final_size
-                            saved_space += file_saved
-                            
-                            # Informations sur la taille (en KB pour plus de lisibilité)
-                            if file_saved > 0:
-                                self.log(f"{os.path.basename(file_path)}: {initial_size/1024:.1f} KB → {final_size/1024:.1f} KB (-{file_saved/1024:.1f} KB)")
-                            else:
-                                self.log(f"{os.path.basename(file_path)}: Pas de réduction de taille significative")
-                        
-                        # Mettre à jour la progression
-                        processed += 1
-                        progress = (processed / len(all_files)) * 100
-                        self.progress_var.set(progress)
-                        
-                        # Mettre à jour l'interface
-                        if processed % 5 == 0 or processed == len(all_files):
-                            self.root.update_idletasks()
-                    
-                    # Rapport final
-                    if saved_space > 0:
-                        if saved_space > 1024*1024:
-                            self.log(f"Compression terminée! Espace total économisé: {saved_space/(1024*1024):.2f} MB")
-                        else:
-                            self.log(f"Compression terminée! Espace total économisé: {saved_space/1024:.2f} KB")
+                    if summary.total:
+                        self.events.put(("done", "info", "Compression des fichiers terminée avec succès!"))
                     else:
-                        self.log("Compression terminée! Aucune réduction significative de taille n'a été obtenue.")
-                    
-                    messagebox.showinfo("Terminé", "Compression des fichiers terminée avec succès!")
+                        self.events.put(("done", None, None))
                     
                 except Exception as e:
                     self.log(f"Erreur lors de la compression: {str(e)}")
-                    messagebox.showerror("Erreur", f"Une erreur est survenue: {str(e)}")
-                
-                finally:
-                    self.finish_compression()
+                    self.events.put(("done", "error", f"Une erreur est survenue: {str(e)}"))
             
-            def finish_compression(self):
-                self.compression_running = False
-                self.compress_button.config(state=tk.NORMAL)
+            def update_progress(self, processed, discovered, discovery_done):
+                """Appelée par le thread de compression : l'affichage est fait par process_events"""
+                self.events.put(("progress", processed, discovered, discovery_done))
             
-            def compress_image(self, file_path, quality=75):
-                """Compresse une image avec la qualité spécifiée"""
-                try:
-                    with Image.open(file_path) as img:
-                        # Vérifier le mode de l'image (convertir si nécessaire)
-                        if img.mode in ("RGBA", "P"):
-                            # Convertir les images avec transparence en RGB
-                            img = img.convert("RGB")
-                        
-                        # Sauvegarder l'image compressée
-                        img.save(file_path, optimize=True, quality=quality)
-                        return True
-                        
-                except Exception as e:
-                    self.log(f"Erreur lors de la compression de {os.path.basename(file_path)}: {str(e)}")
-                    return False
+            def show_progress(self, processed, discovered, discovery_done):
+                if discovery_done:
+                    self.progress_bar.config(mode='determinate')
+                    self.progress_var.set((processed / discovered) * 100 if discovered else 100)
+                    self.status_var.set(f"{processed} / {discovered} fichiers traités")
+                else:
+                    self.progress_bar.step()
+                    self.status_var.set(f"{processed} fichiers traités, {discovered} découverts (parcours en cours)")
             
-            def compress_pdf(self, file_path, dpi=120):
-                """Compresse un PDF en utilisant Ghostscript si disponible, sinon utilise une méthode alternative"""
-                try:
-                    # Vérifier si Ghostscript est installé
-                    if is_ghostscript_installed():
-                        # Méthode avec Ghostscript (plus efficace)
-                        return self.compress_pdf_ghostscript(file_path, dpi)
-                    else:
-                        # Méthode alternative (moins efficace mais sans dépendance externe)
-                        return self.compress_pdf_alternative(file_path)
-                        
-                except Exception as e:
-                    self.log(f"Erreur lors de la compression de {os.path.basename(file_path)}: {str(e)}")
-                    return False
-            
-            def compress_pdf_ghostscript(self, file_path, dpi=120):
-                """Compresse un PDF en utilisant Ghostscript (méthode plus efficace)"""
-                try:
-                    # Création d'un fichier temporaire
-                    fd, temp_file = tempfile.mkstemp(suffix='.pdf')
-                    os.close(fd)
-                    
-                    # Déterminer le niveau de compression basé sur le DPI
-                    if dpi >= 150:
-                        preset = '/printer'  # Légère compression
-                    elif dpi >= 100:
-                        preset = '/ebook'    # Compression moyenne
-                    else:
-                        preset = '/screen'   # Forte compression
-                    
-                    # Construire la commande Ghostscript
-                    gs_command = [
-                        'gs', '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
-                        f'-dPDFSETTINGS={preset}', '-dNOPAUSE', '-dQUIET', '-dBATCH',
-                        f'-sOutputFile={temp_file}', file_path
-                    ]
-                    
-                    # Exécuter Ghostscript
-                    result = subprocess.run(gs_command, check=True, capture_output=True)
-                    
-                    # Vérifier si le fichier temporaire existe et a une taille
-                    if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
-                        # Remplacer l'original par le compressé
-                        os.replace(temp_file, file_path)
-                        return True
-                    else:
-                        self.log(f"Erreur: Ghostscript n'a pas créé de fichier valide pour {os.path.basename(file_path)}")
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-                        return False
-                        
-                except subprocess.SubprocessError as e:
-                    self.log(f"Erreur Ghostscript: {str(e)}")
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                    return False
-                    
-                except Exception as e:
-                    self.log(f"Erreur lors de la compression PDF: {str(e)}")
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                    return False
-            
-            def compress_pdf_alternative(self, file_path):
-                """
-                Méthode alternative pour la compression PDF quand Ghostscript n'est pas disponible.
-                Cette méthode est moins efficace mais fonctionne sans dépendance externe.
-                """
-                try:
-                    # Création d'un nom temporaire pour le fichier compressé
-                    temp_file = file_path + ".temp"
-                    
-                    # Lecture du PDF original
-                    reader = PdfReader(file_path)
-                    writer = PdfWriter()
-            
-                    # Copie de chaque page avec compression
-                    for page in reader.pages:
-                        # Ajouter la page au nouveau document
-                        writer.add_page(page)
-                    
-                    # Préserver les métadonnées
-                    if hasattr(reader, 'metadata') and reader.metadata:
-                        writer.add_metadata(reader.metadata)
-                    
-                    # Compresser les streams disponibles avec PyPDF2
-                    for page in writer._objects:
-                        if hasattr(page, '/Contents') and page['/Contents']:
-                            writer._objects[page['/Contents']].compress()
-                    
-                    # Écriture du fichier compressé
-                    with open(temp_file, "wb") as f:
-                        writer.write(f)
-                    
-                    # Vérifier si le fichier temporaire existe et a une taille
-                    if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
-                        # Remplacer l'original par le compressé
-                        os.replace(temp_file, file_path)
-                        return True
-                    else:
-                        if os.path.exists(temp_file):
-                            os.remove(temp_file)
-                        return False
-                        
-                except Exception as e:
-                    self.log(f"Erreur méthode alternative PDF: {str(e)}")
-                    if 'temp_file' in locals() and os.path.exists(temp_file):
-                        os.remove(temp_file)
-                    return False
+            def finish_compression(self, kind, message):
+                self.compression_running = False
+                if self.dependencies_ok:
+                    self.compress_button.config(state=tk.NORMAL)
+                self.close_log_file()
+                
+                if kind == "info":
+                    messagebox.showinfo("Terminé", message)
+                elif kind == "error":
+                    messagebox.showerror("Erreur", message)
 
         # Lancer l'application
         root = tk.Tk()
         app = CompressionApp(root)
+        threading.Thread(target=app.check_dependencies, daemon=True).start()
         root.mainloop()
     else:
-        print("Impossible de démarrer l'application en raison de dépendances manquantes.")
+        print("Impossible de démarrer l'application : tkinter n'est pas disponible.")
         input("Appuyez sur Entrée pour quitter...")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Compression des pièces jointes comptables (PNG, JPG, PDF)
+
+Utilisable sans interface graphique :
+
+    from pj_compressor import compress_tree
+    compress_tree("factures", "factures_compressees", "moyenne", workers=8)
+
+ou en ligne de commande : python -m pj_compressor --help
+"""
+from .compressors import (
+    IMAGE_EXTENSIONS,
+    PDF_EXTENSIONS,
+    compress_image,
+    compress_pdf,
+    compress_pdf_ghostscript,
+    compress_pdf_alternative,
+)
+from .engine import (
+    COMPRESSION_SETTINGS,
+    FileResult,
+    RunSummary,
+    SerialEngine,
+    ParallelEngine,
+    create_engine,
+    compress_tree,
+    interrupted_run,
+)
+from .ghostscript import GhostscriptPool
+from .watch import watch_tree
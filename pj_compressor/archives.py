@@ -0,0 +1,362 @@
+"""
+Archives ZIP et tar comme source et/ou destination : les fichiers sont lus depuis
+l'archive, compressés en mémoire et écrits directement dans la nouvelle archive (ou
+dossier), en conservant l'arborescence interne. Les autres fichiers de l'archive
+(tableurs, XML...) sont recopiés tels quels.
+"""
+import os
+import io
+import time
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import collections
+
+from .compressors import (
+    IMAGE_EXTENSIONS, PDF_EXTENSIONS, TEMP_PREFIX, SizeTarget, compress_image, compress_pdf,
+)
+from .dependencies import ghostscript_info, set_ghostscript_info
+from .engine import FileResult, RunSummary, is_worth_saving, manifest_key
+from .images import PNG_CONVERSIONS
+from .report import StageTimings
+
+# Extensions reconnues et mode d'écriture tarfile correspondant
+TAR_MODES = {
+    ".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz", ".tar.bz2": "w:bz2", ".tar.xz": "w:xz",
+}
+ZIP_EXTENSIONS = (".zip",)
+
+
+def archive_type(path):
+    """ "zip", "tar" ou None selon l'extension du chemin"""
+    name = path.lower()
+    if name.endswith(ZIP_EXTENSIONS):
+        return "zip"
+    if name.endswith(tuple(TAR_MODES)):
+        return "tar"
+    return None
+
+
+def safe_member_name(name):
+    """
+    Chemin relatif d'un fichier de l'archive (séparateurs /), ou None s'il sortirait
+    du dossier de destination (chemin absolu, composant ..)
+    """
+    name = name.replace("\\", "/")
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or name.startswith("/") or ".." in parts or ":" in parts[0]:
+        return None
+    return "/".join(parts)
+
+
+def walk_directory(source, exclude=()):
+    """
+    Tous les fichiers d'un dossier (chemin, stat), dans l'ordre alphabétique, sauf les
+    fichiers temporaires (TEMP_PREFIX) et les chemins de exclude (archive destination)
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    for directory, subdirs, names in os.walk(source):
+        subdirs.sort()
+        for name in sorted(names):
+            file_path = os.path.join(directory, name)
+            if name.startswith(TEMP_PREFIX) or os.path.abspath(file_path) in excluded:
+                continue
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+            yield file_path, file_stat
+
+
+def member_names(source, exclude=()):
+    """Noms relatifs (séparateurs /) des fichiers d'une archive ou d'un dossier, sans lire leur contenu"""
+    kind = archive_type(source)
+    if kind == "zip":
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    elif kind == "tar":
+        with tarfile.open(source, "r|*") as archive:
+            names = [member.name for member in archive if member.isfile()]
+    else:
+        names = [manifest_key(file_path, source) for file_path, _ in walk_directory(source, exclude)]
+    return {safe_member_name(name) for name in names} - {None}
+
+
+def read_members(source, exclude=()):
+    """
+    Parcourt les fichiers d'une archive (ou d'un dossier) au fil de l'eau et renvoie
+    (nom relatif, contenu, attributs) ; un seul fichier à la fois est en mémoire.
+    Attributs : date de modification ("mtime") et, s'ils sont connus, droits ("mode"),
+    propriétaire et groupe ("uid", "gid", "uname", "gname").
+    """
+    kind = archive_type(source)
+    if kind == "zip":
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                attributes = {"mtime": time.mktime(info.date_time + (0, 0, -1))}
+                # Droits Unix dans les attributs externes (archives créées sous Linux ou macOS)
+                if info.external_attr >> 16:
+                    attributes["mode"] = (info.external_attr >> 16) & 0o7777
+                yield info.filename, archive.read(info), attributes
+    elif kind == "tar":
+        # Lecture séquentielle : l'archive n'est parcourue qu'une fois, même compressée
+        with tarfile.open(source, "r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    attributes = dict(
+                        mtime=member.mtime, mode=member.mode, uid=member.uid, gid=member.gid,
+                        uname=member.uname, gname=member.gname,
+                    )
+                    yield member.name, archive.extractfile(member).read(), attributes
+    else:
+        for file_path, file_stat in walk_directory(source, exclude):
+            try:
+                with open(file_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            attributes = dict(
+                mtime=file_stat.st_mtime, mode=file_stat.st_mode & 0o7777,
+                uid=file_stat.st_uid, gid=file_stat.st_gid,
+            )
+            yield manifest_key(file_path, source), data, attributes
+
+
+class ArchiveWriter:
+    """
+    Écriture des fichiers produits dans une archive ZIP ou tar, ou dans un dossier.
+    L'archive est écrite dans un fichier temporaire, mis à sa place par close().
+    """
+    def __init__(self, destination):
+        self.destination = destination
+        self.kind = archive_type(destination)
+        self.names = set()
+        if self.kind is None:
+            self.temp_path = None
+            return
+        directory = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+        os.close(fd)
+        if self.kind == "zip":
+            self.archive = zipfile.ZipFile(self.temp_path, "w", zipfile.ZIP_DEFLATED)
+        else:
+            mode = next(mode for extension, mode in TAR_MODES.items() if destination.lower().endswith(extension))
+            self.archive = tarfile.open(self.temp_path, mode)
+
+    def add(self, name, data, attributes):
+        """
+        Ajoute un fichier (attributs : voir read_members). Renvoie False, sans rien écrire,
+        si un fichier de même nom a déjà été ajouté.
+        """
+        if name in self.names:
+            return False
+        self.names.add(name)
+        mtime = attributes["mtime"]
+        mode = attributes.get("mode")
+        if self.kind == "zip":
+            # Les dates ZIP commencent en 1980
+            info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315619200))[:6])
+            # Images et PDF sont déjà compressés : les recompresser ne ferait que coûter du temps
+            stored = name.lower().endswith(IMAGE_EXTENSIONS + PDF_EXTENSIONS + (".webp",))
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            if mode is not None:
+                info.external_attr = (0o100000 | mode) << 16
+            self.archive.writestr(info, data)
+        elif self.kind == "tar":
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = mtime
+            for key in ("mode", "uid", "gid", "uname", "gname"):
+                if attributes.get(key) is not None:
+                    setattr(info, key, attributes[key])
+            self.archive.addfile(info, io.BytesIO(data))
+        else:
+            path = os.path.join(self.destination, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            if mode is not None:
+                os.chmod(path, mode)
+            os.utime(path, (mtime, mtime))
+        return True
+
+    def close(self, completed=True):
+        """Termine l'archive ; elle n'est mise en place que si l'écriture est allée à son terme"""
+        if self.kind is None:
+            return
+        self.archive.close()
+        if completed:
+            os.replace(self.temp_path, self.destination)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def compress_member(name, data, settings, convert_png=None):
+    """
+    Compresse un fichier d'archive en mémoire ; renvoie (FileResult, contenu produit).
+    Le contenu d'origine est renvoyé si le fichier n'est pas une image ou un PDF,
+    si la compression échoue ou si elle n'apporte pas assez (is_worth_saving).
+    Exécutée dans un processus de travail.
+    """
+    started = time.perf_counter()
+    timings = StageTimings()
+    target = SizeTarget(settings["target_size"]) if settings.get("target_size") else None
+    result = FileResult(name, name)
+    result.initial_size = result.final_size = len(data)
+    extension = os.path.splitext(name)[1].lower()
+    output = data
+
+    if extension in IMAGE_EXTENSIONS + PDF_EXTENSIONS:
+        # Fichiers intermédiaires dans un dossier local, supprimé à la fin
+        scratch = tempfile.mkdtemp(prefix="pj_archive_")
+        try:
+            output_path = os.path.join(scratch, "output" + extension)
+            if extension in IMAGE_EXTENSIONS:
+                written = compress_image(
+                    name, settings["image_quality"], result.messages.append, output_path,
+                    settings.get("image_max_dimension"), settings.get("png_colors"),
+                    settings.get("image_bilevel", False), convert_png, timings, target,
+                    settings.get("memory_budget"), data
+                )
+                output_path = written or output_path
+            else:
+                # Ghostscript lit un fichier : le PDF n'est écrit sur le disque local que pour lui
+                input_path = os.path.join(scratch, "input.pdf")
+                if ghostscript_info() is not None:
+                    with open(input_path, "wb") as f:
+                        f.write(data)
+                written = compress_pdf(
+                    input_path, settings["pdf_dpi"], result.messages.append, None, output_path, timings,
+                    target, settings["image_quality"], settings.get("memory_budget"), data
+                )
+
+            if written is None:
+                # Contenu d'origine conservé faute de mémoire (message du compresseur)
+                result.success = result.rejected = result.kept = True
+            elif written:
+                result.success = True
+                with open(output_path, "rb") as f:
+                    compressed = f.read()
+                if is_worth_saving(len(data), len(compressed), settings):
+                    output = compressed
+                    result.final_size = len(compressed)
+                    # Image convertie (PNG en JPEG ou WebP) : le fichier change d'extension
+                    result.dest_path = os.path.splitext(name)[0] + os.path.splitext(output_path)[1]
+                else:
+                    result.rejected = True
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    else:
+        # Autre type de fichier : recopié tel quel
+        result.success = True
+        timings.method = "passthrough"
+
+    if target is not None:
+        result.fit = target.setting
+        result.over_target = result.final_size > target.max_bytes
+    result.stages = timings.stages
+    result.method = timings.method
+    result.elapsed = time.perf_counter() - started
+    return result, output
+
+
+def compress_archive(source, destination, settings, workers=1, log=print, progress=None, summary=None,
+                     metrics=None):
+    """
+    Compresse les fichiers de l'archive (ou du dossier) source vers l'archive (ou le dossier)
+    destination, sans extraction sur le disque. Sans destination, l'archive source est remplacée.
+    Les fichiers sont traités par workers processus, au plus workers * 4 à la fois en mémoire.
+    Renvoie summary (RunSummary), complété au fil des fichiers, comme metrics (RunMetrics) s'il est fourni.
+    """
+    summary = summary if summary is not None else RunSummary()
+    destination = destination or source
+    # Dossier source : l'archive destination peut s'y trouver
+    exclude = [destination]
+    names = set()
+    if settings.get("convert_png"):
+        # Noms lus d'avance : un PNG n'est pas converti si le nom cible existe déjà dans l'archive
+        names = member_names(source, exclude)
+
+    def convert_png_for(name):
+        convert_png = settings.get("convert_png")
+        if convert_png and os.path.splitext(name)[0] + PNG_CONVERSIONS[convert_png][1] in names:
+            return None
+        return convert_png
+
+    writer = ArchiveWriter(destination)
+    completed = False
+    window = max(1, workers) * 4
+    pending = collections.deque()
+
+    def write(result, output, attributes):
+        """Écrit le fichier produit dans la destination, dans l'ordre de l'archive source"""
+        if not writer.add(result.dest_path, output, attributes):
+            result.success = False
+            result.messages.append(f"{result.dest_path}: nom déjà présent dans la destination (ignoré)")
+        return result
+
+    def results(executor):
+        for name, data, attributes in read_members(source, exclude):
+            safe_name = safe_member_name(name)
+            if safe_name is None:
+                log(f"{name}: chemin invalide dans l'archive (ignoré)")
+                continue
+            summary.total += 1
+            if executor is None:
+                yield write(*compress_member(safe_name, data, settings, convert_png_for(safe_name)), attributes)
+                continue
+            pending.append((attributes, executor.submit(
+                compress_member, safe_name, data, settings, convert_png_for(safe_name)
+            )))
+            if len(pending) >= window:
+                attributes, future = pending.popleft()
+                yield write(*future.result(), attributes)
+        summary.discovery_done = True
+        while pending:
+            attributes, future = pending.popleft()
+            yield write(*future.result(), attributes)
+
+    try:
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=set_ghostscript_info, initargs=(ghostscript_info(),)
+            )
+        else:
+            executor = None
+        try:
+            for result in results(executor):
+                for message in result.messages:
+                    log(message)
+                summary.add(result)
+                if metrics is not None:
+                    metrics.add_result(result, result.file_path)
+
+                name = result.file_path
+                # Fichier recopié tel quel, ou conservé faute de mémoire (motif déjà dans le journal)
+                if not result.success or result.method == "passthrough" or result.kept:
+                    pass
+                elif result.rejected:
+                    log(f"{name}: Pas de réduction de taille significative (original conservé)")
+                elif result.dest_path != name:
+                    log(f"{name} → {os.path.basename(result.dest_path)}: {result.initial_size/1024:.1f} KB → "
+                        f"{result.final_size/1024:.1f} KB (-{result.saved/1024:.1f} KB)")
+                else:
+                    log(f"{name}: {result.initial_size/1024:.1f} KB → {result.final_size/1024:.1f} KB "
+                        f"(-{result.saved/1024:.1f} KB)")
+                if result.over_target:
+                    log(f"{name}: Taille cible non atteinte ({result.final_size/1024:.1f} KB)")
+
+                if progress is not None:
+                    progress(summary.processed, summary.total, summary.discovery_done)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        completed = True
+    finally:
+        writer.close(completed)
+    return summary
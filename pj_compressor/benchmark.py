@@ -0,0 +1,441 @@
+"""
+Banc d'essai reproductible : génère un corpus synthétique de pièces jointes
+(photos JPEG, scans PNG, PDF texte, PDF d'images) et mesure chaque méthode de compression.
+
+    python -m pj_compressor.benchmark --level moyenne --workers 4 --output resultats.json
+
+Pour chaque méthode : fichiers/s, Mo/s, latence par fichier (p50/p95), pic de mémoire
+résidente et taux de compression, au format JSON. Chaque méthode est mesurée dans un
+processus séparé, pour que les pics de mémoire des mesures ne se cumulent pas.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import COMPRESSION_SETTINGS, create_engine, destination_path, iter_files
+from .compressors import compress_image, compress_pdf_ghostscript, compress_pdf_alternative
+from .dependencies import ghostscript_info
+from .prefetch import Prefetcher
+from .report import percentile
+
+BENCHMARK_VERSION = 1
+
+# Composition du corpus (nombre de fichiers de chaque type, multiplié par --scale)
+CORPUS = {"photo": 6, "scan": 6, "pdf_texte": 6, "pdf_images": 4}
+# Index du corpus généré (paramètres et fichiers), pour le réutiliser d'une mesure à l'autre
+CORPUS_INDEX = "corpus.json"
+# Photos de reçus prises au téléphone (paysage ou portrait)
+PHOTO_SIZES = [(1600, 1200), (3024, 4032), (4000, 3000)]
+# Pages A4 scannées à 150 et 200 DPI
+SCAN_SIZES = [((1240, 1754), 150), ((1654, 2339), 200)]
+
+WORDS = (
+    "facture avoir client fournisseur total TVA HT TTC montant date échéance règlement "
+    "référence quantité prix unitaire remise acompte solde virement chèque désignation"
+).split()
+
+# Méthodes mesurées, dans l'ordre du rapport
+METHODS = (
+    "image", "pdf_ghostscript", "pdf_alternative", "moteur_serie", "moteur_serie_prefetch", "moteur_parallele",
+)
+
+
+def random_bytes(rng, count):
+    return rng.getrandbits(8 * count).to_bytes(count, "little")
+
+
+def noise_texture(rng, size, tile=64):
+    """Grain aléatoire (capteur, papier) répété sur toute l'image, en niveaux de gris"""
+    from PIL import Image
+
+    pattern = Image.frombytes("L", (tile, tile), random_bytes(rng, tile * tile))
+    texture = Image.new("L", size)
+    for x in range(0, size[0], tile):
+        for y in range(0, size[1], tile):
+            texture.paste(pattern, (x, y))
+    return texture
+
+
+def make_photo(rng, size):
+    """Photo : dégradés de couleurs aléatoires et grain"""
+    from PIL import Image
+
+    coarse = (size[0] // 32 + 1, size[1] // 32 + 1)
+    img = Image.frombytes("RGB", coarse, random_bytes(rng, coarse[0] * coarse[1] * 3))
+    img = img.resize(size, Image.BICUBIC)
+    grain = noise_texture(rng, size).convert("RGB")
+    return Image.blend(img, grain, 0.12)
+
+
+def make_scan(rng, size, color):
+    """Page scannée : lignes de texte, tableau, tampon en couleur et léger grain du papier"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new("RGB", size, (250, 250, 247))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    margin = size[0] // 12
+    line_height = size[1] // 70
+    for index in range(50):
+        y = margin + index * line_height
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        draw.text((margin, y), f"{line} {rng.randint(1, 9999)},{rng.randint(0, 99):02d}", fill=(20, 20, 20), font=font)
+        if index % 10 == 9:
+            draw.line((margin, y + line_height - 2, size[0] - margin, y + line_height - 2), fill=(40, 40, 40), width=2)
+    if color:
+        x, y = rng.randint(margin, size[0] // 2), rng.randint(size[1] // 2, size[1] - 3 * margin)
+        draw.ellipse((x, y, x + size[0] // 4, y + size[0] // 8), outline=(30, 60, 170), width=6)
+    grain = noise_texture(rng, size).point(lambda value: 245 + value // 25).convert("RGB")
+    return Image.blend(img, grain, 0.05) if color else Image.blend(img, grain, 0.05).convert("L").convert("RGB")
+
+
+def pdf_text(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_text_pdf(path, pages, compress_streams):
+    """PDF texte minimal (police Helvetica non incorporée), comme ceux des logiciels de facturation"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 50 800 Td 14 TL " + " ".join(f"{pdf_text(line)} '" for line in lines) + " ET"
+        stream = content.encode("cp1252")
+        stream_filter = b""
+        if compress_streams:
+            stream = zlib.compress(stream)
+            stream_filter = b" /Filter /FlateDecode"
+        objects.append(b"<< /Length %d%s >>\nstream\n" % (len(stream), stream_filter) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def load_corpus(directory, scale=1, seed=0):
+    """
+    Corpus déjà généré dans directory avec les mêmes paramètres ({type: [chemins]}),
+    ou None s'il est absent, incomplet ou généré autrement
+    """
+    try:
+        with open(os.path.join(directory, CORPUS_INDEX), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    expected = {"version": BENCHMARK_VERSION, "composition": CORPUS, "scale": scale, "seed": seed}
+    if any(index.get(key) != value for key, value in expected.items()):
+        return None
+    corpus = {
+        kind: [os.path.join(directory, name) for name in names]
+        for kind, names in index.get("files", {}).items()
+    }
+    if not all(os.path.isfile(path) for paths in corpus.values() for path in paths):
+        return None
+    return corpus
+
+
+def generate_corpus(directory, scale=1, seed=0):
+    """
+    Génère le corpus dans directory (créé si besoin) : même graine, mêmes fichiers.
+    Les paramètres et les fichiers sont enregistrés dans CORPUS_INDEX (voir load_corpus).
+    Renvoie {type: [chemins]}.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    corpus = {}
+
+    for index in range(CORPUS["photo"] * scale):
+        path = os.path.join(directory, f"photo_{index:03d}.jpg")
+        make_photo(rng, PHOTO_SIZES[index % len(PHOTO_SIZES)]).save(path, "JPEG", quality=92, dpi=(72, 72))
+        corpus.setdefault("photo", []).append(path)
+
+    for index in range(CORPUS["scan"] * scale):
+        path = os.path.join(directory, f"scan_{index:03d}.png")
+        size, dpi = SCAN_SIZES[index % len(SCAN_SIZES)]
+        make_scan(rng, size, color=index % 3 == 0).save(path, "PNG", dpi=(dpi, dpi))
+        corpus.setdefault("scan", []).append(path)
+
+    for index in range(CORPUS["pdf_texte"] * scale):
+        path = os.path.join(directory, f"texte_{index:03d}.pdf")
+        pages = [
+            [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))) for _ in range(50)]
+            for _ in range(rng.randint(1, 6))
+        ]
+        write_text_pdf(path, pages, compress_streams=index % 2 == 0)
+        corpus.setdefault("pdf_texte", []).append(path)
+
+    for index in range(CORPUS["pdf_images"] * scale):
+        path = os.path.join(directory, f"images_{index:03d}.pdf")
+        pages = []
+        for page in range(rng.randint(1, 4)):
+            if page % 2:
+                size, _ = SCAN_SIZES[page % len(SCAN_SIZES)]
+                pages.append(make_scan(rng, size, color=True))
+            else:
+                pages.append(make_photo(rng, PHOTO_SIZES[page % len(PHOTO_SIZES)]))
+        pages[0].save(path, "PDF", save_all=True, append_images=pages[1:], resolution=150)
+        corpus.setdefault("pdf_images", []).append(path)
+
+    index = {
+        "version": BENCHMARK_VERSION, "composition": CORPUS, "scale": scale, "seed": seed,
+        "files": {kind: [os.path.basename(path) for path in paths] for kind, paths in corpus.items()},
+    }
+    with open(os.path.join(directory, CORPUS_INDEX), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    return corpus
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus et de ses sous-processus (None sous Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def metrics(latencies, elapsed, input_bytes, output_bytes, failed):
+    """Indicateurs d'une méthode : débit, latence par fichier, mémoire et taux de compression"""
+    files = len(latencies)
+    return {
+        "files": files,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(files / elapsed, 2) if elapsed else None,
+        "mb_per_s": round(input_bytes / (1024 * 1024) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            "max": round(max(latencies) * 1000, 1) if latencies else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        # Taille produite / taille d'origine (plus petit = meilleur)
+        "ratio": round(output_bytes / input_bytes, 4) if input_bytes else None,
+    }
+
+
+def measure_files(files, compress, output_dir):
+    """Appelle compress(fichier, sortie) sur chaque fichier et mesure la durée de chaque appel"""
+    latencies = []
+    input_bytes = output_bytes = failed = 0
+    started = time.perf_counter()
+    for file_path in files:
+        output_path = os.path.join(output_dir, os.path.basename(file_path))
+        file_started = time.perf_counter()
+        written = compress(file_path, output_path)
+        latencies.append(time.perf_counter() - file_started)
+
+        size = os.path.getsize(file_path)
+        input_bytes += size
+        if written:
+            # compress_image renvoie le chemin écrit (l'extension peut changer)
+            output_bytes += os.path.getsize(written if isinstance(written, str) else output_path)
+        else:
+            failed += 1
+            output_bytes += size
+    return metrics(latencies, time.perf_counter() - started, input_bytes, output_bytes, failed)
+
+
+def measure_engine(corpus_dir, output_dir, settings, workers, prefetch=None):
+    """Traite tout le corpus avec le moteur (série ou parallèle), comme compress_tree"""
+    engine = create_engine(settings, workers, roots=[corpus_dir, output_dir], prefetch=prefetch)
+    jobs = (
+        (file_path, destination_path(file_path, corpus_dir, output_dir), None)
+        for file_path, _ in iter_files(corpus_dir)
+    )
+    latencies = []
+    input_bytes = output_bytes = failed = 0
+    started = time.perf_counter()
+    for result in engine.run(jobs):
+        # Durée mesurée dans le processus de travail, hors attente dans la file
+        latencies.append(result.elapsed)
+        input_bytes += result.initial_size
+        output_bytes += result.final_size if result.success else result.initial_size
+        failed += not result.success
+    return metrics(latencies, time.perf_counter() - started, input_bytes, output_bytes, failed)
+
+
+def run_method(method, corpus, corpus_dir, level, workers):
+    """Mesure une méthode ; exécutée dans un processus neuf"""
+    settings = COMPRESSION_SETTINGS[level]
+    images = corpus.get("photo", []) + corpus.get("scan", [])
+    pdfs = corpus.get("pdf_texte", []) + corpus.get("pdf_images", [])
+    ignore = lambda message: None
+
+    output_dir = tempfile.mkdtemp(prefix="pj_bench_")
+    try:
+        if method == "image":
+            return measure_files(images, lambda path, output: compress_image(
+                path, settings["image_quality"], ignore, output, settings["image_max_dimension"],
+                settings["png_colors"], settings["image_bilevel"]
+            ), output_dir)
+        if method == "pdf_ghostscript":
+            return measure_files(pdfs, lambda path, output: compress_pdf_ghostscript(
+                path, settings["pdf_dpi"], ignore, output
+            ), output_dir)
+        if method == "pdf_alternative":
+            return measure_files(pdfs, lambda path, output: compress_pdf_alternative(
+                path, ignore, output, settings["pdf_dpi"], settings["image_quality"]
+            ), output_dir)
+        if method == "moteur_serie":
+            return measure_engine(corpus_dir, output_dir, settings, 1)
+        if method == "moteur_serie_prefetch":
+            return measure_engine(corpus_dir, output_dir, settings, 1, Prefetcher())
+        if method == "moteur_parallele":
+            return measure_engine(corpus_dir, output_dir, settings, workers)
+        raise ValueError(f"Méthode inconnue: {method}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def environment():
+    """Machine et versions utilisées, pour comparer des résultats comparables"""
+    import PIL
+
+    gs = ghostscript_info(refresh=True)
+    return {
+        "python": platform.python_version(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "ghostscript": gs.version if gs else None,
+    }
+
+
+def run_benchmark(corpus_dir, level="moyenne", workers=None, methods=METHODS, scale=1, seed=0, log=print):
+    """
+    Génère le corpus (s'il n'existe pas déjà dans corpus_dir) puis mesure chaque méthode.
+    Renvoie le rapport (dictionnaire sérialisable en JSON).
+    """
+    workers = workers or os.cpu_count() or 1
+    env = environment()
+
+    corpus = load_corpus(corpus_dir, scale, seed)
+    if corpus is None:
+        log(f"Génération du corpus dans {corpus_dir} (échelle {scale}, graine {seed})")
+        corpus = generate_corpus(corpus_dir, scale, seed)
+    else:
+        log(f"Corpus existant réutilisé: {corpus_dir} (échelle {scale}, graine {seed})")
+
+    report = {
+        "version": BENCHMARK_VERSION,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "level": level,
+        "workers": workers,
+        "scale": scale,
+        "seed": seed,
+        "environment": env,
+        "corpus": {
+            kind: {"files": len(paths), "bytes": sum(os.path.getsize(path) for path in paths)}
+            for kind, paths in corpus.items()
+        },
+        "results": {},
+    }
+
+    # Un processus neuf (spawn) par méthode : pic de mémoire propre à chaque mesure
+    context = multiprocessing.get_context("spawn")
+    for method in methods:
+        if method == "pdf_ghostscript" and env["ghostscript"] is None:
+            log(f"{method}: ignoré (Ghostscript non disponible)")
+            continue
+        if method == "moteur_parallele" and workers <= 1:
+            log(f"{method}: ignoré (un seul processus)")
+            continue
+        log(f"Mesure: {method}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_method, method, corpus, corpus_dir, level, workers).result()
+        report["results"][method] = result
+        log(f"{method}: {result['files_per_s']} fichiers/s, {result['mb_per_s']} Mo/s, "
+            f"p95 {result['latency_ms']['p95']} ms, taux {result['ratio']}")
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pj_compressor.benchmark",
+        description="Banc d'essai de la compression sur un corpus synthétique reproductible",
+    )
+    parser.add_argument(
+        "-l", "--level", choices=list(COMPRESSION_SETTINGS), default="moyenne",
+        help="niveau de compression mesuré (défaut : moyenne)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="processus du moteur parallèle (défaut : un par cœur)",
+    )
+    parser.add_argument(
+        "--methods", nargs="+", choices=METHODS, default=list(METHODS), metavar="METHODE",
+        help=f"méthodes à mesurer ({', '.join(METHODS)})",
+    )
+    parser.add_argument("--scale", type=int, default=1, help="multiplie le nombre de fichiers du corpus")
+    parser.add_argument("--seed", type=int, default=0, help="graine du générateur de corpus")
+    parser.add_argument(
+        "--corpus", default=None, metavar="DOSSIER",
+        help="dossier du corpus, réutilisé s'il a été généré avec les mêmes paramètres (défaut : dossier temporaire supprimé à la fin)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="fichier JSON du rapport (défaut : sortie standard)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.scale < 1:
+        parser.error("--scale doit être supérieur ou égal à 1")
+
+    # Progression sur la sortie d'erreur : la sortie standard reste du JSON valide
+    log = lambda message: print(message, file=sys.stderr)
+
+    corpus_dir = args.corpus or tempfile.mkdtemp(prefix="pj_corpus_")
+    try:
+        report = run_benchmark(
+            corpus_dir, args.level, args.workers, args.methods, args.scale, args.seed, log=log
+        )
+    finally:
+        if args.corpus is None:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Point d'entrée en ligne de commande (sans Tk ni installation automatique des dépendances)
+"""
+import signal
+import argparse
+import threading
+
+from .dedup import DEDUP_MODES
+from .engine import COMPRESSION_SETTINGS, compress_tree, interrupted_run
+from .images import PNG_CONVERSIONS
+from .prefetch import PREFETCH_FILES
+from .watch import SETTLE_SECONDS, watch_tree
+
+# Variantes sans accents acceptées en ligne de commande
+LEVEL_ALIASES = {"legere": "légère"}
+
+
+def parse_level(value):
+    level = LEVEL_ALIASES.get(value, value)
+    if level not in COMPRESSION_SETTINGS:
+        raise argparse.ArgumentTypeError(
+            f"niveau inconnu: {value} (choix: {', '.join(COMPRESSION_SETTINGS)})"
+        )
+    return level
+
+
+# Suffixes acceptés pour --target-size et --memory-budget
+SIZE_UNITS = {
+    "": 1, "k": 1024, "ko": 1024, "kb": 1024, "m": 1024 * 1024, "mo": 1024 * 1024, "mb": 1024 * 1024,
+    "g": 1024 ** 3, "go": 1024 ** 3, "gb": 1024 ** 3,
+}
+
+
+def parse_size(value):
+    """Taille en octets, avec un suffixe facultatif : 500K, 2M, 1.5Mo, 1G..."""
+    text = value.strip().lower()
+    number = text.rstrip("kmgob")
+    unit = text[len(number):]
+    try:
+        size = float(number) * SIZE_UNITS[unit]
+    except (ValueError, KeyError):
+        raise argparse.ArgumentTypeError(f"taille invalide: {value} (exemples : 500K, 2M)")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"taille invalide: {value}")
+    return int(size)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pj_compressor",
+        description="Compression des pièces jointes comptables (PNG, JPG, PDF)",
+    )
+    parser.add_argument("source", help="dossier ou archive (ZIP, tar) contenant les fichiers à compresser")
+    parser.add_argument(
+        "destination", nargs="?",
+        help="dossier ou archive où créer les copies compressées (omis avec --in-place)",
+    )
+    parser.add_argument(
+        "-l", "--level", type=parse_level, default="moyenne",
+        help="niveau de compression : légère, moyenne ou forte (défaut : moyenne)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="nombre de processus en parallèle (défaut : un par cœur)",
+    )
+    parser.add_argument(
+        "--prefetch", type=int, default=PREFETCH_FILES, metavar="N",
+        help=f"fichiers lus à l'avance pendant la compression, avec un seul processus "
+             f"(défaut : {PREFETCH_FILES}, 0 : désactivé)",
+    )
+    parser.add_argument(
+        "--in-place", action="store_true",
+        help="écraser les originaux au lieu de créer des copies",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="tout recompresser, même les fichiers inchangés depuis la dernière exécution",
+    )
+    parser.add_argument(
+        "--hash", action="store_true", dest="use_hash",
+        help="comparer le contenu (SHA-256) des fichiers dont seule la date a changé",
+    )
+    parser.add_argument(
+        "--min-saving-bytes", type=int, default=0, metavar="OCTETS",
+        help="gain minimal en octets pour remplacer un fichier (défaut : 0, tout gain)",
+    )
+    parser.add_argument(
+        "--min-saving-percent", type=float, default=0, metavar="POURCENT",
+        help="gain minimal en pourcentage de la taille d'origine (défaut : 0)",
+    )
+    parser.add_argument(
+        "--convert-png", choices=sorted(PNG_CONVERSIONS), default=None,
+        help="convertir les PNG sans transparence dans ce format s'il est plus compact",
+    )
+    parser.add_argument(
+        "--target-size", type=parse_size, default=None, metavar="TAILLE",
+        help="taille maximale de chaque fichier (ex. 500K, 2M) : réduit davantage les fichiers qui la dépassent",
+    )
+    parser.add_argument(
+        "--dedup", action="store_true",
+        help="ne compresser qu'une fois les fichiers identiques (même pièce jointe dans plusieurs dossiers)",
+    )
+    parser.add_argument(
+        "--dedup-mode", choices=DEDUP_MODES, default="reflink",
+        help="création des doublons : copie légère si possible (reflink, par défaut), "
+             "lien physique (hardlink) ou copie (copy)",
+    )
+    parser.add_argument(
+        "--memory-budget", type=parse_size, default=None, metavar="TAILLE",
+        help="mémoire maximale de l'exécution (ex. 512M, 1G), partagée entre les processus "
+             "(au moins 8M par processus)",
+    )
+    parser.add_argument(
+        "--report", default=None, metavar="FICHIER",
+        help="rapport d'exécution par fichier (tailles, durée de chaque étape, erreurs) en CSV ou JSON",
+    )
+    parser.add_argument(
+        "--profile", default=None, metavar="FICHIER",
+        help="enregistrer un profil cProfile de l'exécution (à combiner avec --workers 1)",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="reprendre l'exécution interrompue dans ce dossier, avec ses options, là où elle s'est arrêtée",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="surveiller le dossier source et compresser les nouveaux fichiers au fil de l'eau (Ctrl+C pour arrêter)",
+    )
+    parser.add_argument(
+        "--settle", type=float, default=SETTLE_SECONDS, metavar="SECONDES",
+        help=f"en surveillance, délai sans modification avant de traiter un fichier (défaut : {SETTLE_SECONDS:g} s)",
+    )
+    parser.add_argument(
+        "--poll", action="store_true",
+        help="en surveillance, relire les dossiers modifiés au lieu d'utiliser inotify",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="n'afficher que le bilan final")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.in_place == (args.destination is not None):
+        parser.error("indiquer soit un dossier destination, soit --in-place")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers doit être supérieur ou égal à 1")
+
+    if args.prefetch < 0:
+        parser.error("--prefetch doit être positif ou nul")
+    if args.settle < 0:
+        parser.error("--settle doit être positif")
+
+    log = (lambda message: None) if args.quiet else print
+    options = dict(
+        level=args.level, workers=args.workers, force=args.force, use_hash=args.use_hash,
+        min_saving_bytes=args.min_saving_bytes, min_saving_percent=args.min_saving_percent,
+        convert_png=args.convert_png, report=args.report, profile=args.profile,
+        target_size=args.target_size, memory_budget=args.memory_budget,
+        dedup=args.dedup_mode if args.dedup else None, prefetch=args.prefetch,
+    )
+    if args.resume:
+        # Les options de compression sont celles de l'exécution interrompue
+        run = interrupted_run(args.source, args.destination)
+        if run is not None:
+            log(f"Reprise de l'exécution du {run.get('started')} ({run['processed']} fichiers déjà traités)")
+            options.update(run.get("options", {}))
+        options["resume"] = True
+
+    try:
+        if args.watch:
+            # Arrêt propre sur Ctrl+C ou SIGTERM : les compressions en cours sont terminées
+            stopping = threading.Event()
+            for name in ("SIGINT", "SIGTERM"):
+                if hasattr(signal, name):
+                    signal.signal(getattr(signal, name), lambda signum, frame: stopping.set())
+            summary = watch_tree(
+                args.source, args.destination, log=log, stop=stopping.is_set,
+                settle=args.settle, polling=args.poll, **options
+            )
+        else:
+            summary = compress_tree(args.source, args.destination, log=log, **options)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.quiet:
+        print(summary.describe())
+
+    # Code de sortie non nul si au moins un fichier n'a pas pu être compressé
+    return 1 if summary.failed else 0
@@ -0,0 +1,353 @@
+"""
+Compresseurs par type de fichier (images et PDF)
+"""
+import io
+import os
+import subprocess
+import tempfile
+
+from .dependencies import ghostscript_info, is_ghostscript_installed
+
+# Extensions prises en charge
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+PDF_EXTENSIONS = (".pdf",)
+
+# Préfixe des fichiers temporaires écrits à côté des fichiers traités (ignorés lors du parcours)
+TEMP_PREFIX = ".pj_"
+
+# Au-delà de budget / LOW_MEMORY_PDF_FACTOR octets, un PDF est traité par la méthode
+# alternative sans conserver les objets déjà lus
+LOW_MEMORY_PDF_FACTOR = 4
+
+# Résolutions essayées successivement pour ramener un PDF sous la taille cible
+PDF_TARGET_DPIS = (150, 120, 100, 90, 72, 60, 50)
+
+
+class SizeTarget:
+    """
+    Taille maximale visée pour un fichier (mode « taille cible »).
+    hint : réglage qui avait permis d'atteindre la cible lors d'une exécution précédente
+    ({"scale", "quality"} pour une image, {"dpi"} pour un PDF), essayé en premier.
+    setting : réglage retenu par le compresseur, à mémoriser pour l'exécution suivante.
+    """
+    def __init__(self, max_bytes, hint=None):
+        self.max_bytes = max_bytes
+        self.hint = hint or {}
+        self.setting = None
+
+
+def compress_image(file_path, quality=75, log=print, output_path=None, max_dimension=None,
+                   png_colors=None, bilevel=False, convert_png=None, timings=None, target=None,
+                   memory_budget=None, source=None):
+    """
+    Compresse une image avec la qualité spécifiée.
+    L'image est lue depuis file_path et écrite directement dans output_path
+    (par défaut, le fichier lui-même).
+    Si max_dimension est fixé, les images plus grandes sont réduites avant l'encodage :
+    les JPEG sont alors décodés directement à échelle réduite (Image.draft).
+
+    L'encodage le plus compact est choisi selon le format (voir images.py) :
+    palette de png_colors couleurs, niveaux de gris, noir et blanc 1 bit (bilevel),
+    conversion des PNG en JPEG ou WebP (convert_png), qui change l'extension du fichier.
+    Renvoie le chemin du fichier écrit, False en cas d'erreur, ou None si l'image
+    est conservée telle quelle faute de mémoire (memory_budget).
+    timings : StageTimings recevant les durées de décodage, d'encodage et d'écriture.
+    target : SizeTarget ; si l'encodage dépasse la taille cible, l'échelle et la qualité
+    sont cherchées en mémoire jusqu'à passer sous la cible (voir images.fit_to_size).
+    memory_budget : mémoire maximale (octets) ; la taille décodée est estimée d'après
+    l'en-tête avant tout décodage, et les images trop grandes passent par un chemin
+    économe (encodage unique) ou sont conservées telles quelles. L'image produite
+    a toujours la taille fixée par max_dimension, quel que soit le budget.
+    source : contenu du fichier déjà lu en mémoire (lecture anticipée), lu à la place de file_path.
+    """
+    from PIL import Image, ImageFile
+    from .images import MemoryBudgetError, choose_encoding, fit_to_size, open_image, plan_memory
+    from .report import StageTimings
+
+    timings = timings or StageTimings()
+    timings.method = "pillow"
+
+    # Permet à Pillow de traiter des images potentiellement corrompues
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+    stream = io.BytesIO(source) if source is not None else None
+    try:
+        # Avec un budget mémoire, la taille décodée est vérifiée avant décodage (plan_memory) :
+        # la limite de Pillow ne doit pas refuser les grands JPEG décodés à taille réduite
+        with open_image(stream if stream is not None else file_path, pixel_limit=not memory_budget) as img:
+            with timings.stage("decode"):
+                source_format = img.format
+                save_options = {}
+                target_size = img.size
+                if max_dimension and max(img.size) > max_dimension:
+                    scale = max_dimension / max(img.size)
+                    target_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+
+                low_memory = False
+                if memory_budget:
+                    low_memory = plan_memory(img, target_size, memory_budget)
+
+                if target_size != img.size:
+                    scale = target_size[0] / img.width
+
+                    # Décodage JPEG à 1/2, 1/4 ou 1/8 de la taille, sans descendre sous la cible
+                    img.draft(None, target_size)
+
+                    # Rééchantillonnage final à la taille cible
+                    if img.size != target_size:
+                        img = img.resize(target_size, Image.LANCZOS)
+
+                    # La taille physique du document ne change pas : la résolution diminue d'autant
+                    if "dpi" in img.info:
+                        save_options["dpi"] = tuple(round(value * scale) for value in img.info["dpi"])
+                img.load()
+
+            # Choisir l'encodage le plus compact pour ce format
+            with timings.stage("encode"):
+                options = dict(png_colors=png_colors, bilevel=bilevel, convert_png=convert_png,
+                               low_memory=low_memory)
+                data, extension, _ = choose_encoding(img, source_format, quality, save_options, **options)
+                if target is not None and len(data) > target.max_bytes:
+                    data, extension, _ = fit_to_size(
+                        img, source_format, quality, target, save_options, **options
+                    )
+
+        output_path = output_path or file_path
+        if extension is not None:
+            output_path = os.path.splitext(output_path)[0] + extension
+
+        # Sauvegarder l'image compressée
+        with timings.stage("write"):
+            with open(output_path, "wb") as f:
+                f.write(data)
+        return output_path
+
+    except MemoryBudgetError as e:
+        log(f"{os.path.basename(file_path)}: {e}, original conservé")
+        return None
+    except Exception as e:
+        log(f"Erreur lors de la compression de {os.path.basename(file_path)}: {describe_error(e, file_path, stream)}")
+        return False
+
+
+def describe_error(error, file_path, stream=None):
+    """
+    Texte d'une erreur de lecture ; un fichier lu en mémoire (stream, BytesIO) y est
+    désigné par son nom plutôt que par la représentation de l'objet
+    """
+    message = str(error)
+    if stream is not None:
+        message = message.replace(repr(stream), repr(os.path.basename(file_path)))
+    return message
+
+
+def ghostscript_preset(dpi):
+    """Préréglage Ghostscript correspondant au DPI du niveau de compression"""
+    if dpi >= 150:
+        return '/printer'  # Légère compression
+    elif dpi >= 100:
+        return '/ebook'    # Compression moyenne
+    else:
+        return '/screen'   # Forte compression
+
+
+def compress_pdf(file_path, dpi=120, log=print, ghostscript=None, output_path=None, timings=None,
+                 target=None, quality=75, memory_budget=None, source=None):
+    """
+    Compresse un PDF en utilisant Ghostscript si disponible, sinon utilise une méthode alternative.
+    Si un pool de processus Ghostscript persistants est fourni, il est utilisé en priorité.
+    Le résultat est écrit dans output_path (par défaut, le fichier lui-même).
+    timings : StageTimings recevant la durée de la compression et la méthode utilisée.
+    target : SizeTarget ; la résolution des images est abaissée pas à pas
+    (PDF_TARGET_DPIS) jusqu'à passer sous la taille cible.
+    quality : qualité JPEG des images réencodées par la méthode alternative.
+    memory_budget : mémoire maximale (octets) de la méthode alternative ; Ghostscript
+    traite de lui-même les documents page par page avec une mémoire bornée.
+    source : contenu du fichier déjà lu en mémoire, utilisé par la méthode alternative
+    (Ghostscript lit le fichier lui-même).
+    Renvoie True si le PDF a été écrit, False en cas d'erreur, ou None s'il est
+    conservé tel quel faute de mémoire (voir compress_pdf_alternative).
+    """
+    from .report import StageTimings
+
+    timings = timings or StageTimings()
+    use_ghostscript = ghostscript is not None or is_ghostscript_installed()
+
+    def attempt(step_dpi, first):
+        """Une compression du PDF ; les essais suivants fixent la résolution des images"""
+        if not use_ghostscript:
+            # Méthode alternative (moins efficace mais sans dépendance externe)
+            timings.method = "pypdf"
+            with timings.stage("pypdf"):
+                return compress_pdf_alternative(
+                    file_path, log, output_path, step_dpi, quality, memory_budget, source
+                )
+        with timings.stage("gs"):
+            if first and ghostscript is not None:
+                timings.method = "ghostscript_pool"
+                return ghostscript.compress(file_path, step_dpi, log, output_path)
+            # Méthode avec Ghostscript (plus efficace), un processus par essai
+            timings.method = "ghostscript"
+            return compress_pdf_ghostscript(file_path, step_dpi, log, output_path, None if first else step_dpi)
+
+    try:
+        hint_dpi = target.hint.get("dpi", dpi) if target is not None else dpi
+        success = False
+        if hint_dpi >= dpi:
+            success = attempt(dpi, True)
+            if target is None or (success and os.path.getsize(output_path or file_path) <= target.max_bytes):
+                if target is not None:
+                    target.setting = {"dpi": dpi}
+                return success
+        # Sinon, reprendre directement à la résolution retenue lors de l'exécution précédente
+
+        # Taille cible dépassée : résolutions de plus en plus basses
+        for step_dpi in PDF_TARGET_DPIS:
+            if step_dpi >= dpi or step_dpi > hint_dpi:
+                continue
+            if not attempt(step_dpi, False):
+                continue
+            success = True
+            if os.path.getsize(output_path or file_path) <= target.max_bytes:
+                target.setting = {"dpi": step_dpi}
+                break
+        return success
+
+    except Exception as e:
+        log(f"Erreur lors de la compression de {os.path.basename(file_path)}: {str(e)}")
+        return False
+
+
+def compress_pdf_ghostscript(file_path, dpi=120, log=print, output_path=None, resolution=None):
+    """
+    Compresse un PDF en utilisant Ghostscript (méthode plus efficace).
+    resolution : si fixée, les images sont rééchantillonnées à cette résolution (DPI)
+    au lieu de celle du préréglage.
+    """
+    output_path = output_path or file_path
+    try:
+        # Création d'un fichier temporaire à côté du fichier final (remplacement atomique)
+        fd, temp_file = tempfile.mkstemp(suffix='.pdf', prefix=TEMP_PREFIX, dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+
+        # Déterminer le niveau de compression basé sur le DPI
+        preset = ghostscript_preset(dpi)
+
+        # Construire la commande Ghostscript
+        info = ghostscript_info()
+        gs_command = [
+            info.executable if info else 'gs', '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
+            f'-dPDFSETTINGS={preset}', '-dNOPAUSE', '-dQUIET', '-dBATCH',
+            f'-sOutputFile={temp_file}', file_path
+        ]
+        if resolution:
+            gs_command[-2:-2] = [
+                '-dDownsampleColorImages=true', '-dDownsampleGrayImages=true', '-dDownsampleMonoImages=true',
+                f'-dColorImageResolution={resolution}', f'-dGrayImageResolution={resolution}',
+                f'-dMonoImageResolution={resolution * 2}',
+                '-dColorImageDownsampleThreshold=1.0', '-dGrayImageDownsampleThreshold=1.0',
+            ]
+
+        # Exécuter Ghostscript
+        subprocess.run(gs_command, check=True, capture_output=True)
+
+        # Vérifier si le fichier temporaire existe et a une taille
+        if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
+            # Remplacer l'original par le compressé
+            os.replace(temp_file, output_path)
+            return True
+        else:
+            log(f"Erreur: Ghostscript n'a pas créé de fichier valide pour {os.path.basename(file_path)}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+
+    except subprocess.SubprocessError as e:
+        log(f"Erreur Ghostscript: {str(e)}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+
+    except Exception as e:
+        log(f"Erreur lors de la compression PDF de {os.path.basename(file_path)}: {str(e)}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+
+
+def compress_pdf_alternative(file_path, log=print, output_path=None, dpi=120, quality=75, memory_budget=None,
+                             source=None):
+    """
+    Méthode alternative pour la compression PDF quand Ghostscript n'est pas disponible.
+    Les images des pages sont réduites à dpi et réencodées en JPEG (voir pdfimages.py),
+    les images identiques ne sont enregistrées qu'une fois et les flux de contenu
+    sont compressés. Moins efficace que Ghostscript, mais sans dépendance externe.
+
+    Le document est lu au fil des pages depuis le fichier, et chaque page est
+    recompressée dès sa copie. Si le fichier est grand au regard de memory_budget
+    (octets), les objets lus sont oubliés après chaque page : la mémoire utilisée
+    dépend alors de la taille des pages et du résultat, pas de celle du fichier d'origine.
+    Si une image ne peut pas être décodée dans memory_budget, le document est conservé
+    tel quel et None est renvoyé.
+    source : contenu du fichier déjà lu en mémoire, lu à la place de file_path.
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+    from .images import MemoryBudgetError
+    from .pdfimages import PdfImageRecompressor
+
+    output_path = output_path or file_path
+    memory = io.BytesIO(source) if source is not None else None
+    try:
+        # Création d'un fichier temporaire à côté du fichier final (remplacement atomique,
+        # et reconnu par son préfixe s'il reste après une interruption)
+        fd, temp_file = tempfile.mkstemp(suffix='.pdf', prefix=TEMP_PREFIX, dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        size = len(source) if source is not None else os.path.getsize(file_path)
+        low_memory = bool(memory_budget) and size * LOW_MEMORY_PDF_FACTOR > memory_budget
+
+        # Lecture du PDF original depuis le fichier ouvert (PyPDF2 chargerait sinon tout le fichier en mémoire)
+        with (memory if memory is not None else open(file_path, "rb")) as stream:
+            reader = PdfReader(stream)
+            writer = PdfWriter()
+            recompressor = PdfImageRecompressor(writer, dpi, quality, memory_budget)
+
+            # Copie de chaque page, puis réduction de ses images et compression de ses flux de contenu
+            for page in reader.pages:
+                recompressor.dedupe_page(page)
+                writer.add_page(page)
+                added = writer.pages[len(writer.pages) - 1]
+                recompressor.process_page(added)
+                added.compress_content_streams()
+                if low_memory:
+                    # Les objets lus (images d'origine) sont relus depuis le fichier si besoin
+                    reader.resolved_objects.clear()
+
+            # Préserver les métadonnées
+            if hasattr(reader, 'metadata') and reader.metadata:
+                writer.add_metadata(reader.metadata)
+            recompressor.finish()
+
+        # Écriture du fichier compressé
+        with open(temp_file, "wb") as f:
+            writer.write(f)
+
+        # Vérifier si le fichier temporaire existe et a une taille
+        if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
+            # Remplacer l'original par le compressé
+            os.replace(temp_file, output_path)
+            return True
+        else:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+
+    except MemoryBudgetError as e:
+        log(f"{os.path.basename(file_path)}: {e}, original conservé")
+        if 'temp_file' in locals() and os.path.exists(temp_file):
+            os.remove(temp_file)
+        return None
+    except Exception as e:
+        log(f"Erreur méthode alternative PDF ({os.path.basename(file_path)}): {describe_error(e, file_path, memory)}")
+        if 'temp_file' in locals() and os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
@@ -0,0 +1,156 @@
+"""
+Fichiers identiques dans l'arborescence (même facture ou même logo joint à plusieurs
+écritures) : chaque contenu n'est compressé qu'une fois, les autres destinations
+reçoivent le résultat par lien physique, copie légère (reflink) ou copie.
+"""
+import os
+import shutil
+
+from .manifest import file_hash
+
+# Modes de création des doublons
+DEDUP_MODES = ("copy", "reflink", "hardlink")
+# Libellés des modes dans le journal
+DEDUP_LABELS = {"copy": "copie", "reflink": "copie légère", "hardlink": "lien physique"}
+
+# Nombre maximal d'originaux indexés (mode surveillance) : les plus anciens sont ensuite oubliés
+MAX_INDEXED_FILES = 100000
+
+# Requête ioctl de clonage de fichier (copie légère) sous Linux (Btrfs, XFS...)
+FICLONE = 0x40049409
+
+
+class Outcome:
+    """
+    Résultat du traitement d'un original réduit à ce qu'en reprennent ses doublons
+    (voir engine.materialize_duplicate) : chemins et statut, sans messages ni mesures
+    """
+    def __init__(self, result):
+        self.file_path = result.file_path
+        self.dest_path = result.dest_path
+        self.success = result.success
+        self.rejected = result.rejected
+        self.kept = result.kept
+        self.final_size = result.final_size
+        self.fit = result.fit
+        self.over_target = result.over_target
+
+
+class DuplicateIndex:
+    """
+    Index des contenus rencontrés pendant le parcours. Seuls les fichiers dont
+    la taille a déjà été vue sont lus pour calculer leur empreinte (SHA-256, bloc par bloc).
+
+    eager : empreinte calculée pour chaque fichier dès sa découverte. Nécessaire en
+    compression sur place, où un fichier peut être remplacé avant qu'un fichier
+    de même taille ne soit découvert.
+
+    Chaque original n'occupe qu'une entrée (chemin, date, empreinte, Outcome une fois
+    traité) ; les originaux en échec ou modifiés depuis leur découverte sont retirés,
+    et au-delà de MAX_INDEXED_FILES (mode surveillance) les plus anciens sont oubliés.
+    """
+    def __init__(self, eager=False):
+        self.eager = eager
+        # Taille → [chemin, date (st_mtime_ns) lors du parcours, empreinte (None : pas encore
+        # calculée), Outcome (None : pas encore traité)]
+        self.sizes = {}
+        # Original en cours de traitement → sa taille et son entrée
+        self.pending = {}
+        # Original en cours de traitement → doublons (source, destination) en attente de son résultat
+        self.waiting = {}
+        self.indexed = 0
+        self.count = 0
+
+    def find(self, file_path, file_stat):
+        """
+        Renvoie (chemin, Outcome ou None s'il n'est pas encore traité) du fichier déjà
+        rencontré de même contenu que file_path, ou None (file_path est alors enregistré
+        comme original de son contenu)
+        """
+        group = self.sizes.setdefault(file_stat.st_size, [])
+        digest = file_hash(file_path) if self.eager or group else None
+        for member in list(group):
+            if member[2] is None:
+                # Premier fichier de cette taille : empreinte calculée maintenant, s'il n'a pas changé
+                try:
+                    current = os.stat(member[0])
+                    unchanged = (current.st_size, current.st_mtime_ns) == (file_stat.st_size, member[1])
+                    member[2] = file_hash(member[0]) if unchanged else False
+                except OSError:
+                    member[2] = False
+                if member[2] is False:
+                    # Original modifié ou supprimé : ne peut plus servir d'original
+                    self.remove(file_stat.st_size, member)
+                    continue
+            if member[2] == digest:
+                self.count += 1
+                return member[0], member[3]
+        member = [file_path, file_stat.st_mtime_ns, digest, None]
+        group.append(member)
+        self.pending[file_path] = (file_stat.st_size, member)
+        self.indexed += 1
+        if self.indexed > MAX_INDEXED_FILES:
+            self.forget_oldest()
+        return None
+
+    def processed(self, result):
+        """
+        Enregistre le résultat (FileResult) d'un original pour les doublons découverts
+        ensuite ; un original en échec est retiré de l'index
+        """
+        size, member = self.pending.pop(result.file_path, (None, None))
+        if member is None:
+            return
+        if result.success:
+            member[3] = Outcome(result)
+        else:
+            self.remove(size, member)
+
+    def remove(self, size, member):
+        group = self.sizes.get(size)
+        if group is not None and member in group:
+            group.remove(member)
+            self.indexed -= 1
+            if not group:
+                del self.sizes[size]
+
+    def forget_oldest(self):
+        """Oublie les originaux de la taille rencontrée le plus tôt (hors originaux en cours de traitement)"""
+        for size, group in self.sizes.items():
+            forgotten = [member for member in group if member[3] is not None]
+            if forgotten:
+                for member in forgotten:
+                    self.remove(size, member)
+                return
+
+
+def reflink(source, dest):
+    """Copie légère : les deux fichiers partagent leurs blocs jusqu'à la première modification"""
+    import fcntl
+
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_or_copy(source, dest, mode="copy"):
+    """
+    Crée dest avec le contenu de source selon mode (voir DEDUP_MODES), avec repli
+    sur une copie si le système de fichiers ne le permet pas. dest ne doit pas exister.
+    Renvoie le mode effectivement utilisé.
+    """
+    if mode == "hardlink":
+        try:
+            os.link(source, dest)
+            return "hardlink"
+        except OSError:
+            pass
+    elif mode == "reflink":
+        try:
+            reflink(source, dest)
+            return "reflink"
+        except (ImportError, OSError):
+            # fcntl absent (Windows) ou système de fichiers sans copie légère
+            if os.path.exists(dest):
+                os.remove(dest)
+    shutil.copyfile(source, dest)
+    return "copy"
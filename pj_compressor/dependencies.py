@@ -0,0 +1,185 @@
+"""
+Vérification des dépendances (bibliothèques Python et Ghostscript)
+"""
+import os
+import sys
+import json
+import shutil
+import subprocess
+import importlib.util
+import threading
+import collections
+
+# Noms de l'exécutable Ghostscript en ligne de commande selon le système
+if sys.platform == "win32":
+    GHOSTSCRIPT_EXECUTABLES = ("gswin64c", "gswin32c", "gs")
+else:
+    GHOSTSCRIPT_EXECUTABLES = ("gs",)
+
+GhostscriptInfo = collections.namedtuple("GhostscriptInfo", ["executable", "version"])
+
+# Résultats des sondes conservés d'un lancement à l'autre : gs --version et la recherche
+# des bibliothèques ne sont relancés que si l'exécutable ou l'interpréteur a changé
+PROBE_CACHE = os.path.join(os.path.expanduser("~"), ".pj_compressor", "dependances.json")
+
+# Cache de la sonde Ghostscript (partagé par tous les threads du processus)
+_NOT_PROBED = object()
+_ghostscript_probe = _NOT_PROBED
+_ghostscript_lock = threading.Lock()
+
+
+def check_and_install_libraries(log=print):
+    """
+    Vérifie si les bibliothèques requises sont installées et les installe si nécessaire
+    """
+    log("Vérification des dépendances nécessaires...")
+
+    # Liste des bibliothèques requises
+    required_libraries = {
+        "PIL": "pillow",       # Pour le traitement des images
+        "PyPDF2": "PyPDF2",    # Pour la manipulation basique des PDF
+    }
+
+    # Vérification et installation des bibliothèques
+    for lib_name, pip_name in required_libraries.items():
+        if not is_library_installed(lib_name):
+            log(f"{lib_name} n'est pas installé. Installation en cours...")
+            try:
+                subprocess.check_call([sys.executable, "-m", "pip", "install", pip_name])
+                log(f"{lib_name} a été installé avec succès.")
+            except subprocess.CalledProcessError:
+                log(f"Erreur lors de l'installation de {lib_name}. Veuillez l'installer manuellement avec : pip install {pip_name}")
+                return False
+        else:
+            log(f"{lib_name} est déjà installé.")
+
+    # Vérifier si Ghostscript est installé
+    if not ghostscript_info(refresh=True):
+        log("\nGhostscript n'est pas installé ou n'est pas dans le PATH.")
+        log("La compression PDF sera limitée sans Ghostscript.")
+        log("\nInstructions d'installation de Ghostscript :")
+        log("- Windows : Télécharger et installer depuis https://www.ghostscript.com/download.html")
+        log("- macOS : brew install ghostscript")
+        log("- Linux : sudo apt-get install ghostscript")
+        log("\nL'application fonctionnera sans Ghostscript, mais la compression PDF sera moins efficace.")
+    else:
+        log(f"Ghostscript {ghostscript_info().version} est installé et disponible.")
+
+    log("\nToutes les dépendances Python ont été vérifiées.")
+    return True
+
+
+def load_probe_cache():
+    """Résultats des sondes du lancement précédent ({} si absents ou illisibles)"""
+    try:
+        with open(PROBE_CACHE, encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_probe_cache(cache):
+    """Enregistre les résultats des sondes ; sans effet si le dossier n'est pas accessible en écriture"""
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE), exist_ok=True)
+        temp_path = f"{PROBE_CACHE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(temp_path, PROBE_CACHE)
+    except OSError:
+        pass
+
+
+def file_signature(path):
+    """Taille et date de modification d'un fichier, ou None s'il n'existe plus"""
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+
+def is_library_installed(library_name):
+    """
+    Vérifie si une bibliothèque Python est installée.
+    Le module trouvé au lancement précédent par le même interpréteur est réutilisé
+    tant qu'il n'a pas changé, sans parcourir sys.path.
+    """
+    cache = load_probe_cache()
+    interpreter = f"{sys.executable} {sys.version}"
+    libraries = cache.get("libraries", {}) if cache.get("interpreter") == interpreter else {}
+    cached = libraries.get(library_name)
+    if cached and file_signature(cached["origin"]) == cached["signature"]:
+        return True
+
+    spec = importlib.util.find_spec(library_name)
+    if spec is None:
+        return False
+    if spec.origin:
+        libraries[library_name] = {"origin": spec.origin, "signature": file_signature(spec.origin)}
+        cache.update(interpreter=interpreter, libraries=libraries)
+        save_probe_cache(cache)
+    return True
+
+
+def detect_ghostscript():
+    """
+    Recherche l'exécutable Ghostscript et sa version (None si introuvable).
+    La version n'est redemandée à gs que si son chemin, sa taille ou sa date ont
+    changé depuis le lancement précédent (mise à jour ou autre installation).
+    """
+    cache = load_probe_cache()
+    cached = cache.get("ghostscript") or {}
+    for executable in GHOSTSCRIPT_EXECUTABLES:
+        path = shutil.which(executable)
+        if path is None:
+            continue
+        signature = file_signature(path)
+        if cached.get("path") == path and cached.get("signature") == signature:
+            return GhostscriptInfo(executable, cached["version"])
+        try:
+            # Tente d'exécuter la commande gs --version
+            completed = subprocess.run(
+                [path, "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+        except (subprocess.SubprocessError, OSError):
+            continue
+        version = completed.stdout.decode("ascii", "replace").strip()
+        cache["ghostscript"] = {"path": path, "signature": signature, "version": version}
+        save_probe_cache(cache)
+        return GhostscriptInfo(executable, version)
+    return None
+
+
+def ghostscript_info(refresh=False):
+    """
+    Résultat mis en cache de detect_ghostscript : la sonde n'est lancée qu'une fois,
+    sauf si refresh=True (au début de chaque exécution de compress_tree, où seul le
+    chemin de l'exécutable est revérifié si gs n'a pas changé)
+    """
+    global _ghostscript_probe
+    with _ghostscript_lock:
+        if refresh or _ghostscript_probe is _NOT_PROBED:
+            _ghostscript_probe = detect_ghostscript()
+        return _ghostscript_probe
+
+
+def set_ghostscript_info(info):
+    """
+    Fixe le résultat de la sonde sans lancer gs
+    (utilisé pour transmettre le résultat aux processus de travail)
+    """
+    global _ghostscript_probe
+    with _ghostscript_lock:
+        _ghostscript_probe = info
+
+
+def is_ghostscript_installed():
+    """
+    Vérifie si Ghostscript est installé
+    """
+    return ghostscript_info() is not None
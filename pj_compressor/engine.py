@@ -0,0 +1,855 @@
+"""
+Moteur de compression : parcours de l'arborescence, exécution parallèle et bilan
+"""
+import os
+import stat
+import time
+import shutil
+import tempfile
+import collections
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .dedup import DEDUP_LABELS, DEDUP_MODES, DuplicateIndex, link_or_copy
+from .dependencies import ghostscript_info, set_ghostscript_info
+from .ghostscript import GhostscriptPool
+from .compressors import (
+    IMAGE_EXTENSIONS, PDF_EXTENSIONS, TEMP_PREFIX, LOW_MEMORY_PDF_FACTOR, SizeTarget, compress_image, compress_pdf,
+)
+from .images import PNG_CONVERSIONS
+from .manifest import MANIFEST_FILES, Manifest, file_fingerprint, manifest_key
+from .prefetch import PREFETCH_FILES, PREFETCH_MAX_FILE_BYTES, Prefetcher
+from .report import RunMetrics, StageTimings
+
+# Niveaux de compression : qualité/dpi, plus grand côté des images en pixels,
+# nombre de couleurs de la palette des PNG (None : sans perte) et passage en noir et blanc 1 bit
+COMPRESSION_SETTINGS = {
+    "légère": {"image_quality": 90, "pdf_dpi": 150, "image_max_dimension": 3000,
+               "png_colors": None, "image_bilevel": False},
+    "moyenne": {"image_quality": 75, "pdf_dpi": 120, "image_max_dimension": 2000,
+                "png_colors": 256, "image_bilevel": True},
+    "forte": {"image_quality": 50, "pdf_dpi": 90, "image_max_dimension": 1600,
+              "png_colors": 64, "image_bilevel": True}
+}
+
+# Intervalle (secondes) entre deux enregistrements du manifeste en mode surveillance
+MANIFEST_SAVE_INTERVAL = 30
+
+# Réglages propres à l'exécution, sans effet sur le résultat : non enregistrés dans le manifeste
+# (les fichiers conservés faute de mémoire ne sont pas enregistrés, voir FileResult.kept)
+RUNTIME_SETTINGS = ("memory_budget",)
+# Part minimale du budget mémoire par processus de travail
+MIN_WORKER_MEMORY = 8 * 1024 * 1024
+
+
+class FileResult:
+    """
+    Résultat du traitement d'un fichier, renvoyé par les processus de travail au journal
+    """
+    def __init__(self, file_path, dest_path):
+        self.file_path = file_path
+        self.dest_path = dest_path
+        self.initial_size = 0
+        self.final_size = 0
+        self.success = False
+        # Compression réussie mais rejetée : le fichier n'était pas assez réduit
+        self.rejected = False
+        # Original conservé sans compression faute de mémoire (budget) : non enregistré
+        # dans le manifeste, pour être compressé lors d'une exécution suivante
+        self.kept = False
+        self.messages = []
+        # Empreinte du fichier source après traitement, pour le manifeste
+        self.fingerprint = None
+        # Durée du traitement dans le processus de travail (secondes), détaillée par étape
+        self.elapsed = 0.0
+        self.stages = {}
+        # Méthode de compression utilisée (pillow, ghostscript_pool, ghostscript, pypdf)
+        self.method = None
+        # Mode taille cible : réglage retenu (mis en cache dans le manifeste) et dépassement
+        self.fit = None
+        self.over_target = False
+
+    @property
+    def saved(self):
+        return self.initial_size - self.final_size
+
+
+class RunSummary:
+    """
+    Bilan d'une exécution de compress_tree
+    """
+    def __init__(self):
+        self.total = 0
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.kept = 0
+        self.over_target = 0
+        self.duplicates = 0
+        # Le total n'est définitif qu'à la fin du parcours du dossier source
+        self.discovery_done = False
+        self.saved_space = 0
+
+    def add(self, result):
+        self.processed += 1
+        if result.success:
+            self.saved_space += result.saved
+            if result.kept:
+                self.kept += 1
+            elif result.rejected:
+                self.rejected += 1
+            if result.over_target:
+                self.over_target += 1
+        else:
+            self.failed += 1
+
+    def describe(self):
+        """Message de fin de compression affiché dans le journal"""
+        if self.saved_space > 0:
+            if self.saved_space > 1024*1024:
+                return f"Compression terminée! Espace total économisé: {self.saved_space/(1024*1024):.2f} MB"
+            return f"Compression terminée! Espace total économisé: {self.saved_space/1024:.2f} KB"
+        return "Compression terminée! Aucune réduction significative de taille n'a été obtenue."
+
+
+def is_worth_saving(initial_size, output_size, settings):
+    """
+    Indique si le fichier compressé mérite de remplacer l'original : il doit être plus petit,
+    et le gain doit atteindre les seuils min_saving_bytes et min_saving_percent
+    """
+    saved = initial_size - output_size
+    return (
+        saved > 0
+        and saved >= settings.get("min_saving_bytes", 0)
+        and saved * 100 >= initial_size * settings.get("min_saving_percent", 0)
+    )
+
+
+def process_file(file_path, dest_path, settings, hash_files=False, ghostscript=None, fit_hint=None, source=None):
+    """
+    Traite un fichier complet : les compresseurs lisent la source et écrivent le résultat
+    dans un fichier temporaire à côté de la destination, en une seule passe.
+    Le résultat n'est conservé que s'il est suffisamment plus petit que l'original
+    (is_worth_saving) ; sinon l'original est conservé (ou copié tel quel).
+    Exécutée dans un processus de travail : les messages sont renvoyés dans le résultat.
+    ghostscript : pool de processus gs persistants (uniquement dans les threads du moteur).
+    fit_hint : en mode taille cible (settings["target_size"]), réglage retenu lors de
+    l'exécution précédente, essayé en premier.
+    source : (stat, contenu ou None) du fichier lu à l'avance (voir prefetch.py) ;
+    les compresseurs lisent alors le contenu en mémoire au lieu du fichier.
+    """
+    try:
+        return compress_file(file_path, dest_path, settings, hash_files, ghostscript, fit_hint, source)
+    except OSError as e:
+        # Fichier supprimé, déplacé ou devenu illisible depuis sa découverte (mode surveillance,
+        # partage réseau) : seul ce fichier est en échec, l'exécution continue
+        return failed_result(file_path, dest_path, e)
+
+
+def failed_result(file_path, dest_path, error):
+    """Résultat en échec d'un fichier que le système n'a pas permis de lire ou d'écrire"""
+    result = FileResult(file_path, dest_path)
+    result.messages.append(f"Erreur lors du traitement de {os.path.basename(file_path)}: {error}")
+    return result
+
+
+def compress_file(file_path, dest_path, settings, hash_files=False, ghostscript=None, fit_hint=None, source=None):
+    """
+    Corps de process_file ; les erreurs d'accès aux fichiers (OSError) sont propagées
+    """
+    started = time.perf_counter()
+    timings = StageTimings()
+    target = SizeTarget(settings["target_size"], fit_hint) if settings.get("target_size") else None
+    result = FileResult(file_path, dest_path)
+    create_copy = dest_path != file_path
+
+    # Récupérer la taille initiale (et les métadonnées à conserver)
+    source_stat, data = source if source is not None else (os.stat(file_path), None)
+    result.initial_size = source_stat.st_size
+
+    dest_dir = os.path.dirname(dest_path)
+    if create_copy:
+        # Créer les dossiers de destination si nécessaire
+        os.makedirs(dest_dir, exist_ok=True)
+
+    file_ext = os.path.splitext(file_path)[1].lower()
+    fd, temp_path = tempfile.mkstemp(suffix=file_ext, prefix=TEMP_PREFIX, dir=dest_dir or os.curdir)
+    os.close(fd)
+
+    output_path = temp_path
+    committed = False
+    # Fichier écrit par le compresseur, False en cas d'erreur, None si l'original est conservé
+    written = False
+    try:
+        # Compression selon le type de fichier
+        if file_ext in IMAGE_EXTENSIONS:
+            # Pas de conversion si un fichier du même nom existe déjà avec l'extension cible
+            convert_png = settings.get("convert_png")
+            if convert_png and os.path.exists(os.path.splitext(file_path)[0] + PNG_CONVERSIONS[convert_png][1]):
+                convert_png = None
+
+            written = compress_image(
+                file_path, settings["image_quality"], result.messages.append, temp_path,
+                settings.get("image_max_dimension"), settings.get("png_colors"),
+                settings.get("image_bilevel", False), convert_png, timings, target,
+                settings.get("memory_budget"), data
+            )
+        elif file_ext in PDF_EXTENSIONS:
+            written = compress_pdf(
+                file_path, settings["pdf_dpi"], result.messages.append, ghostscript, temp_path, timings, target,
+                settings["image_quality"], settings.get("memory_budget"), data
+            ) and temp_path
+
+        if written is None:
+            # Original conservé tel quel faute de mémoire (message du compresseur)
+            result.success = result.rejected = result.kept = True
+            result.final_size = result.initial_size
+        elif written:
+            result.success = True
+            output_path = written
+
+        if result.success and not result.kept:
+            output_size = os.path.getsize(output_path)
+            if is_worth_saving(result.initial_size, output_size, settings):
+                # Image convertie (PNG en JPEG ou WebP) : la destination change d'extension
+                result.dest_path = os.path.splitext(dest_path)[0] + os.path.splitext(output_path)[1]
+                with timings.stage("replace"):
+                    os.replace(output_path, result.dest_path)
+                committed = True
+                result.final_size = output_size
+            else:
+                result.rejected = True
+                result.final_size = result.initial_size
+    finally:
+        for path in {temp_path, output_path}:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if committed:
+        with timings.stage("replace"):
+            if create_copy:
+                # Conserver les dates et permissions de l'original
+                shutil.copystat(file_path, result.dest_path)
+            else:
+                # Le fichier compressé remplace l'original : conserver ses permissions
+                os.chmod(result.dest_path, stat.S_IMODE(source_stat.st_mode))
+                if result.dest_path != file_path:
+                    os.remove(file_path)
+    elif create_copy:
+        # Copie simple de l'original si la compression échoue ou n'apporte pas assez
+        with timings.stage("copy"):
+            if data is not None:
+                # Original déjà en mémoire : pas de seconde lecture
+                with open(dest_path, "wb") as f:
+                    f.write(data)
+                shutil.copystat(file_path, dest_path)
+            else:
+                shutil.copy2(file_path, dest_path)
+
+    if result.success:
+        # En compression sur place, l'empreinte est celle du fichier compressé
+        with timings.stage("fingerprint"):
+            result.fingerprint = file_fingerprint(file_path if create_copy else result.dest_path, hash_files)
+    if target is not None:
+        result.fit = target.setting
+        result.over_target = (result.final_size if result.success else result.initial_size) > target.max_bytes
+    result.stages = timings.stages
+    result.method = timings.method
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def materialize_duplicate(original, file_path, dest_path, mode="copy", hash_files=False):
+    """
+    Reproduit pour un doublon le résultat du traitement de son original (FileResult ou dedup.Outcome) :
+    le fichier produit par l'original est lié ou copié (link_or_copy) vers la destination
+    du doublon, qui prend l'extension d'un PNG converti. Sur place, un doublon dont
+    l'original a été conservé tel quel reste inchangé.
+    """
+    started = time.perf_counter()
+    result = FileResult(file_path, dest_path)
+    try:
+        source_stat = os.stat(file_path)
+    except OSError as e:
+        return failed_result(file_path, dest_path, e)
+    result.initial_size = source_stat.st_size
+    result.success = original.success
+    result.rejected = original.rejected
+    result.kept = original.kept
+    result.final_size = original.final_size
+    result.fit = original.fit
+    result.over_target = original.over_target
+    result.method = "duplicate"
+    create_copy = dest_path != file_path
+    name = os.path.basename(original.file_path)
+
+    if create_copy or (original.success and not original.rejected):
+        result.dest_path = os.path.splitext(dest_path)[0] + os.path.splitext(original.dest_path)[1]
+        if not create_copy and result.dest_path != file_path and os.path.exists(result.dest_path):
+            # PNG converti, mais un fichier du même nom existe déjà avec l'extension cible
+            result.dest_path = file_path
+            result.rejected = True
+            result.final_size = result.initial_size
+            result.messages.append(f"{os.path.basename(file_path)}: identique à {name}, original conservé")
+        else:
+            dest_dir = os.path.dirname(result.dest_path)
+            os.makedirs(dest_dir or os.curdir, exist_ok=True)
+            temp_path = os.path.join(dest_dir, TEMP_PREFIX + os.path.basename(result.dest_path))
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                used = link_or_copy(original.dest_path, temp_path, mode)
+                os.replace(temp_path, result.dest_path)
+                # Un lien physique partage les dates et permissions de l'original
+                if used != "hardlink":
+                    if create_copy:
+                        shutil.copystat(file_path, result.dest_path)
+                    else:
+                        os.chmod(result.dest_path, stat.S_IMODE(source_stat.st_mode))
+                if not create_copy and result.dest_path != file_path:
+                    os.remove(file_path)
+                result.messages.append(f"{os.path.basename(file_path)}: identique à {name} ({DEDUP_LABELS[used]})")
+            except OSError as e:
+                result.success = False
+                result.dest_path = dest_path
+                result.messages.append(f"Erreur lors de la création du doublon {os.path.basename(file_path)}: {e}")
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    else:
+        result.messages.append(f"{os.path.basename(file_path)}: identique à {name}")
+
+    if result.success:
+        try:
+            result.fingerprint = file_fingerprint(file_path if create_copy else result.dest_path, hash_files)
+        except OSError as e:
+            result.success = False
+            result.messages.append(f"Erreur lors du traitement de {os.path.basename(file_path)}: {e}")
+    result.stages = {"dedup": time.perf_counter() - started}
+    result.elapsed = result.stages["dedup"]
+    return result
+
+
+def ghostscript_pool(roots):
+    """Pool gs persistant si Ghostscript est disponible, sinon contexte vide (None)"""
+    if ghostscript_info() is None:
+        return contextlib.nullcontext()
+    return GhostscriptPool(roots)
+
+
+class SerialEngine:
+    """
+    Moteur d'exécution séquentiel : traite les fichiers un par un dans le thread courant
+    """
+    def __init__(self, settings, hash_files=False, roots=(), prefetch=None):
+        self.settings = settings
+        self.hash_files = hash_files
+        self.roots = roots
+        self.prefetch = prefetch
+        self.workers = 1
+
+    def run(self, jobs):
+        """
+        Traite les fichiers (source, destination, réglage précédent en mode taille cible)
+        et renvoie les résultats dans l'ordre
+        """
+        with ghostscript_pool(self.roots) as gs_pool:
+            for job in read_ahead(jobs, self.prefetch):
+                if job is None:
+                    continue
+                file_path, dest_path, fit_hint, source = job
+                yield process_file(file_path, dest_path, self.settings, self.hash_files, gs_pool, fit_hint, source)
+
+
+class ParallelEngine:
+    """
+    Moteur d'exécution parallèle : les images (et les PDF sans Ghostscript) sont traitées
+    dans un pool de processus, les PDF Ghostscript par un nombre borné de sous-processus gs.
+    Chaque processus lit lui-même ses fichiers pendant que les autres compressent :
+    seuls les chemins leur sont transmis, jamais le contenu des fichiers.
+    """
+    def __init__(self, settings, workers, hash_files=False, roots=()):
+        self.settings = settings
+        self.hash_files = hash_files
+        self.roots = roots
+        self.workers = workers
+
+    def run(self, jobs):
+        """
+        Traite les fichiers (source, destination, réglage précédent en mode taille cible)
+        et renvoie les résultats dans l'ordre. Un job None (mode surveillance, aucun
+        fichier prêt) publie les résultats déjà obtenus sans attendre la suite.
+        """
+        # multiprocessing n'est chargé qu'au premier lancement d'un moteur parallèle
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Nombre de fichiers en cours au maximum, pour ne pas charger toute la liste dans les pools
+        window = self.workers * 4
+        pending = collections.deque()
+
+        # Le résultat de la sonde Ghostscript est transmis aux processus de travail
+        info = ghostscript_info()
+
+        with ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=set_ghostscript_info, initargs=(info,)
+                ) as processes, \
+                ThreadPoolExecutor(max_workers=self.workers) as gs_threads, \
+                ghostscript_pool(self.roots) as gs_pool:
+            try:
+                for job in read_ahead(jobs):
+                    if job is None:
+                        while pending and pending[0].done():
+                            yield pending.popleft().result()
+                        continue
+                    file_path, dest_path, fit_hint, source = job
+                    # Ghostscript travaille dans son propre processus : un thread suffit pour le piloter
+                    if gs_pool is not None and file_path.lower().endswith(PDF_EXTENSIONS):
+                        future = gs_threads.submit(
+                            process_file, file_path, dest_path, self.settings, self.hash_files, gs_pool, fit_hint,
+                            source
+                        )
+                    else:
+                        future = processes.submit(
+                            process_file, file_path, dest_path, self.settings, self.hash_files, None, fit_hint,
+                            source
+                        )
+                    pending.append(future)
+
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Annuler les tâches restantes si le traitement est interrompu
+                for future in pending:
+                    future.cancel()
+
+
+def create_engine(settings, workers=None, hash_files=False, roots=(), prefetch=None):
+    """
+    Crée le moteur d'exécution adapté au nombre de processus demandé
+    (par défaut, un processus par cœur).
+    roots : dossiers où les PDF sont compressés, accessibles aux processus gs persistants.
+    prefetch : Prefetcher lisant les fichiers à l'avance, ou None ; utilisé par le moteur
+    séquentiel (en parallèle, les processus de travail lisent chacun leurs fichiers).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return SerialEngine(settings, hash_files, roots, prefetch)
+    return ParallelEngine(settings, workers, hash_files, roots)
+
+
+def read_ahead(jobs, prefetch=None):
+    """Jobs complétés de leur fichier lu à l'avance par prefetch (None sans lecture anticipée)"""
+    if prefetch is not None:
+        return prefetch.run(jobs)
+    return (job if job is None else job + (None,) for job in jobs)
+
+
+def iter_files(source, exclude=()):
+    """
+    Parcourt le dossier source au fil de l'eau (os.scandir) et renvoie (chemin, stat)
+    pour chaque fichier à traiter, sans attendre la fin du parcours.
+    Les entrées d'un dossier sont lues d'un bloc avant d'être traitées : les fichiers
+    remplacés pendant la compression sur place ne sont donc jamais vus deux fois.
+    exclude : dossiers à ne pas parcourir (la destination si elle est dans la source).
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    pending_dirs = [source]
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            # Dossier illisible : ignoré, comme avec os.walk
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.abspath(entry.path) not in excluded:
+                        subdirs.append(entry.path)
+                elif (entry.name.lower().endswith(IMAGE_EXTENSIONS + PDF_EXTENSIONS)
+                        and not entry.name.startswith(TEMP_PREFIX)
+                        and entry.is_file()):
+                    # stat() est mis en cache par DirEntry (gratuit sous Windows)
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+        # Parcours en profondeur, dans l'ordre alphabétique
+        pending_dirs.extend(reversed(subdirs))
+
+
+def destination_path(file_path, source, destination=None):
+    """
+    Chemin de destination d'un fichier
+    (le fichier lui-même si destination est None, c'est-à-dire compression sur place)
+    """
+    if destination is None:
+        return file_path
+    return os.path.join(destination, os.path.relpath(file_path, source))
+
+
+def remove_temp_files(root):
+    """
+    Supprime les fichiers temporaires (TEMP_PREFIX) laissés dans l'arborescence
+    par une exécution interrompue, sauf le manifeste et son journal.
+    Renvoie le nombre de fichiers supprimés.
+    """
+    removed = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.startswith(TEMP_PREFIX) and not (directory == root and name in MANIFEST_FILES):
+                try:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+def interrupted_run(source, destination=None):
+    """
+    Exécution interrompue dans ce dossier (arrêt brutal ou fermeture de l'application),
+    ou None : dictionnaire avec sa date de début ("started"), le nombre de fichiers
+    déjà traités ("processed") et ses options ("options"), à passer à compress_tree
+    avec resume=True pour la reprendre.
+    """
+    manifest = Manifest.load(source if destination is None else destination)
+    if manifest.interrupted is None:
+        return None
+    return dict(manifest.interrupted, processed=len(manifest.resumed))
+
+
+def compress_tree(source, destination=None, level="moyenne", workers=None, log=print, progress=None,
+                  force=False, use_hash=False, min_saving_bytes=0, min_saving_percent=0,
+                  convert_png=None, report=None, profile=None, target_size=None, memory_budget=None,
+                  dedup=None, files=None, resume=False, prefetch=PREFETCH_FILES):
+    """
+    Compresse toutes les pièces jointes (PNG, JPG, PDF) du dossier source.
+
+    Si destination est None, les originaux sont écrasés ; sinon l'arborescence est
+    recréée dans destination. Les fichiers sont compressés pendant le parcours du dossier :
+    progress(traités, découverts, parcours_terminé) est appelé après chaque fichier.
+
+    Les fichiers inchangés depuis une précédente exécution au même niveau sont ignorés
+    grâce au manifeste enregistré dans la destination ; force=True recompresse tout.
+    use_hash compare aussi le contenu des fichiers dont seule la date a changé.
+
+    Un fichier compressé ne remplace l'original que s'il est plus petit d'au moins
+    min_saving_bytes octets et min_saving_percent % : la taille totale ne grossit jamais.
+
+    convert_png ("jpeg" ou "webp") autorise la conversion des PNG sans transparence
+    vers ce format lorsqu'elle donne le plus petit fichier ; le fichier produit
+    prend alors l'extension du nouveau format.
+
+    target_size : taille maximale de chaque fichier, en octets (mode taille cible).
+    Les fichiers qui la dépassent au niveau choisi sont réduits davantage (échelle et
+    qualité des images, résolution des PDF) ; le réglage trouvé est mémorisé dans le
+    manifeste et sert de point de départ lors des exécutions suivantes.
+
+    memory_budget : mémoire maximale de l'exécution, en octets, partagée entre les processus
+    (au moins MIN_WORKER_MEMORY par processus). La taille décodée des images est estimée
+    avant décodage : les plus grandes passent par un chemin économe, et les PDF sont traités
+    page par page. Le budget ne réduit jamais un fichier plus que le niveau : un fichier qui
+    ne tient pas dans le budget est conservé tel quel, sans être enregistré dans le manifeste.
+
+    dedup : mode de création des doublons ("copy", "reflink" ou "hardlink", voir DEDUP_MODES).
+    Les fichiers de contenu identique ne sont alors compressés qu'une fois, et les autres
+    destinations reçoivent le résultat par copie, copie légère ou lien physique (repli
+    sur une copie si le système de fichiers ne le permet pas).
+
+    Chaque fichier traité est ajouté au journal de l'exécution dès la fin de son traitement.
+    Après une interruption, les fichiers temporaires laissés sur place sont supprimés
+    à l'exécution suivante, et les fichiers déjà traités ne sont pas recompressés ;
+    resume=True reprend en outre une exécution forcée (force=True) là où elle s'était
+    arrêtée (voir interrupted_run pour retrouver ses options).
+
+    prefetch : nombre de fichiers lus à l'avance en mémoire pendant la compression des
+    précédents (0 : pas de lecture anticipée), pour masquer la latence des partages réseau.
+    Utilisé avec un seul processus : en parallèle, les lectures des processus se recouvrent déjà.
+
+    files : fichiers à traiter (chemin, stat) à la place du parcours du dossier source,
+    utilisé par le mode surveillance (watch.py) ; None y signale une attente.
+
+    report : fichier du rapport d'exécution (CSV si l'extension est .csv, JSON sinon),
+    avec une ligne par fichier : tailles, durée de chaque étape, méthode et erreurs.
+    profile : fichier où enregistrer le profil cProfile du processus principal
+    (la compression elle-même n'est profilée qu'avec un seul processus, workers=1).
+    Renvoie un RunSummary.
+    """
+    if level not in COMPRESSION_SETTINGS:
+        raise ValueError(f"Niveau de compression inconnu: {level}")
+    from .archives import archive_type, compress_archive
+
+    archive_mode = archive_type(source) is not None or (destination is not None and archive_type(destination) is not None)
+    if archive_type(source) is not None:
+        if not os.path.isfile(source):
+            raise ValueError(f"Archive source introuvable: {source}")
+    elif not os.path.isdir(source):
+        raise ValueError(f"Dossier source introuvable: {source}")
+    if convert_png is not None and convert_png not in PNG_CONVERSIONS:
+        raise ValueError(f"Format de conversion des PNG inconnu: {convert_png}")
+    if convert_png == "webp":
+        from PIL import features
+        if not features.check("webp"):
+            raise ValueError("Cette installation de Pillow ne gère pas le format WebP")
+    if target_size is not None and target_size <= 0:
+        raise ValueError(f"Taille cible invalide: {target_size}")
+    if memory_budget is not None and memory_budget <= 0:
+        raise ValueError(f"Budget mémoire invalide: {memory_budget}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if memory_budget and memory_budget // max(1, workers) < MIN_WORKER_MEMORY:
+        raise ValueError(
+            f"Budget mémoire insuffisant: {memory_budget / (1024 * 1024):.1f} MB pour {workers} processus "
+            f"(au moins {MIN_WORKER_MEMORY // (1024 * 1024)} MB par processus)"
+        )
+    if dedup is not None and dedup not in DEDUP_MODES:
+        raise ValueError(f"Mode de dédoublonnage inconnu: {dedup}")
+
+    settings = dict(
+        COMPRESSION_SETTINGS[level],
+        min_saving_bytes=min_saving_bytes,
+        min_saving_percent=min_saving_percent,
+        convert_png=convert_png,
+        target_size=target_size,
+    )
+    summary = RunSummary()
+    # Lignes par fichier conservées uniquement pour le rapport demandé
+    metrics = RunMetrics(rows=bool(report))
+
+    log(f"Niveau de compression sélectionné: {level}")
+    log(f"Qualité d'image: {settings['image_quality']}, DPI pour PDF: {settings['pdf_dpi']}, "
+        f"taille d'image maximale: {settings['image_max_dimension']} px")
+    if convert_png:
+        log(f"Conversion des PNG autorisée vers: {PNG_CONVERSIONS[convert_png][0]}")
+    if target_size:
+        log(f"Taille maximale par fichier: {target_size/1024:.0f} KB")
+
+    if archive_mode:
+        # Archive en source ou en destination : traitement en mémoire, sans manifeste
+        if memory_budget:
+            settings["memory_budget"] = memory_budget // workers
+        log(f"Processus de compression en parallèle: {workers}")
+        compress_archive(source, destination, settings, workers, log, progress, summary, metrics)
+        if report:
+            metrics.write(report)
+            log(f"Rapport d'exécution enregistré: {report}")
+        log_summary(summary, log)
+        return summary
+
+    manifest_root = source if destination is None else destination
+    manifest = Manifest.load(manifest_root)
+    interrupted = manifest.interrupted
+    if interrupted is not None:
+        log(f"Exécution précédente interrompue ({interrupted.get('started')}): "
+            f"{len(manifest.resumed)} fichiers déjà traités")
+        removed = remove_temp_files(manifest_root)
+        if removed:
+            log(f"Fichiers temporaires supprimés: {removed}")
+    elif resume:
+        log("Aucune exécution interrompue à reprendre.")
+    resume = resume and interrupted is not None
+    if force and not resume:
+        manifest = Manifest(manifest_root)
+    options = dict(
+        level=level, force=force, use_hash=use_hash, min_saving_bytes=min_saving_bytes,
+        min_saving_percent=min_saving_percent, convert_png=convert_png, target_size=target_size, dedup=dedup,
+    )
+    manifest.start_journal(
+        {"started": time.strftime("%Y-%m-%d %H:%M:%S"), "options": options}, resume
+    )
+
+    # Sonde Ghostscript lancée une seule fois par exécution, puis mise en cache
+    gs = ghostscript_info(refresh=True)
+    if gs is None:
+        log("Avertissement: Ghostscript n'est pas installé ou disponible dans le PATH.")
+        log("La compression PDF sera limitée. Considérez installer Ghostscript pour de meilleurs résultats.")
+    else:
+        log(f"Ghostscript {gs.version} détecté ({gs.executable})")
+
+    roots = [source] if destination is None else [source, destination]
+    # Les PDF compressés par Ghostscript sont lus par gs lui-même : pas de lecture anticipée
+    prefetcher = Prefetcher(prefetch, skip_extensions=PDF_EXTENSIONS if gs is not None else ()) if prefetch else None
+    engine = create_engine(settings, workers, use_hash, roots, prefetcher)
+    log(f"Processus de compression en parallèle: {engine.workers}")
+    if memory_budget:
+        # Chaque processus de travail dispose d'une part égale du budget
+        settings["memory_budget"] = memory_budget // engine.workers
+        if prefetcher is not None:
+            # Les fichiers lus à l'avance ne doivent pas faire passer un PDF hors du chemin économe
+            prefetcher.max_file_bytes = min(
+                PREFETCH_MAX_FILE_BYTES, settings["memory_budget"] // LOW_MEMORY_PDF_FACTOR
+            )
+        log(f"Budget mémoire: {memory_budget / (1024 * 1024):.0f} MB "
+            f"({settings['memory_budget'] / (1024 * 1024):.0f} MB par processus)")
+    manifest_settings = {key: value for key, value in settings.items() if key not in RUNTIME_SETTINGS}
+
+    # Sur place, les originaux sont remplacés pendant le parcours : empreinte calculée dès la découverte
+    duplicates = DuplicateIndex(eager=destination is None) if dedup else None
+    # Doublons dont l'original était déjà traité lors de leur découverte
+    ready = collections.deque()
+
+    last_save = time.monotonic()
+
+    def save_manifest():
+        """En mode surveillance, intègre le journal au manifeste toutes les MANIFEST_SAVE_INTERVAL secondes"""
+        nonlocal last_save
+        if time.monotonic() - last_save >= MANIFEST_SAVE_INTERVAL:
+            manifest.compact_journal()
+            last_save = time.monotonic()
+
+    def jobs():
+        """Fichiers nouveaux ou modifiés, transmis au moteur au fur et à mesure du parcours"""
+        walk = files if files is not None else iter_files(source, exclude=[destination] if destination else ())
+        for item in metrics.timed_iter("walk", walk):
+            if item is None:
+                save_manifest()
+                yield None
+                continue
+            file_path, file_stat = item
+            dest_path = destination_path(file_path, source, destination)
+            key = manifest_key(file_path, source)
+            with metrics.stage("manifest"):
+                up_to_date = manifest.is_up_to_date(key, file_path, file_stat, manifest_settings, use_hash)
+                # Exécution forcée reprise : seuls les fichiers traités avant l'interruption sont ignorés
+                up_to_date = up_to_date and (not force or key in manifest.resumed)
+                # En mode copie, le fichier produit (éventuellement converti) doit encore exister
+                up_to_date = up_to_date and (dest_path == file_path or os.path.exists(
+                    destination_path(os.path.join(source, manifest.output_key(key)), source, destination)))
+            if up_to_date:
+                summary.skipped += 1
+                metrics.count("fichiers.ignorés")
+                continue
+            summary.total += 1
+
+            if duplicates is not None:
+                with metrics.stage("dedup"):
+                    original = duplicates.find(file_path, file_stat)
+                if original is not None:
+                    original_path, outcome = original
+                    if outcome is not None:
+                        ready.append(materialize_duplicate(outcome, file_path, dest_path, dedup, use_hash))
+                    else:
+                        duplicates.waiting.setdefault(original_path, []).append((file_path, dest_path))
+                    continue
+            yield file_path, dest_path, manifest.fit_hint(key)
+
+        summary.discovery_done = True
+        if summary.skipped:
+            log(f"Fichiers inchangés depuis la dernière compression (ignorés): {summary.skipped}")
+        log(f"Nombre de fichiers à traiter: {summary.total}")
+        if progress is not None:
+            progress(summary.processed, summary.total, True)
+
+    def results():
+        """Résultats du moteur, suivis de ceux des doublons des fichiers traités"""
+        for result in engine.run(jobs()):
+            yield result
+            if duplicates is not None:
+                duplicates.processed(result)
+                for file_path, dest_path in duplicates.waiting.pop(result.file_path, ()):
+                    yield materialize_duplicate(result, file_path, dest_path, dedup, use_hash)
+            while ready:
+                yield ready.popleft()
+        while ready:
+            yield ready.popleft()
+
+    completed = False
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        # Les résultats arrivent dans l'ordre des fichiers, quel que soit le processus qui les a traités
+        for result in results():
+            for message in result.messages:
+                log(message)
+
+            summary.add(result)
+            if result.method == "duplicate":
+                summary.duplicates += 1
+            metrics.add_result(result, manifest_key(result.file_path, source))
+
+            # Informations sur la taille (en KB pour plus de lisibilité)
+            if result.success:
+                if result.kept:
+                    # Non enregistré dans le manifeste : compressé lors d'une exécution suivante
+                    pass
+                elif destination is None:
+                    # Sur place, un PNG converti est retrouvé sous son nouveau nom à l'exécution suivante
+                    manifest.record(
+                        manifest_key(result.dest_path, source), result.fingerprint,
+                        level, manifest_settings, result.final_size, fit=result.fit
+                    )
+                else:
+                    manifest.record(
+                        manifest_key(result.file_path, source), result.fingerprint,
+                        level, manifest_settings, result.final_size,
+                        output=manifest_key(result.dest_path, destination), fit=result.fit
+                    )
+                name = os.path.basename(result.file_path)
+                if result.kept:
+                    # Motif déjà indiqué dans le journal par le compresseur
+                    pass
+                elif result.rejected:
+                    log(f"{name}: Pas de réduction de taille significative (original conservé)")
+                elif os.path.splitext(result.dest_path)[1] != os.path.splitext(result.file_path)[1]:
+                    log(f"{name} → {os.path.basename(result.dest_path)}: {result.initial_size/1024:.1f} KB → "
+                        f"{result.final_size/1024:.1f} KB (-{result.saved/1024:.1f} KB)")
+                else:
+                    log(f"{name}: {result.initial_size/1024:.1f} KB → {result.final_size/1024:.1f} KB (-{result.saved/1024:.1f} KB)")
+
+            if result.over_target:
+                metrics.count("fichiers.cible_dépassée")
+                size = result.final_size if result.success else result.initial_size
+                log(f"{os.path.basename(result.file_path)}: Taille cible non atteinte ({size/1024:.1f} KB)")
+
+            if progress is not None:
+                progress(summary.processed, summary.total, summary.discovery_done)
+        completed = True
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+            log(f"Profil d'exécution enregistré: {profile}")
+
+        # Conserver la progression même si l'exécution est interrompue ; le journal
+        # n'est conservé que dans ce cas, pour une éventuelle reprise
+        manifest.save()
+        manifest.close_journal(completed)
+        if report:
+            metrics.write(report)
+            log(f"Rapport d'exécution enregistré: {report}")
+
+    log_summary(summary, log)
+    return summary
+
+
+def log_summary(summary, log=print):
+    """Bilan de fin d'exécution dans le journal"""
+    if not summary.total:
+        if summary.skipped:
+            log("Aucun fichier nouveau ou modifié à compresser.")
+        else:
+            log("Aucun fichier à compresser trouvé dans le dossier source.")
+        return
+
+    if summary.rejected:
+        log(f"Fichiers conservés sans modification (gain insuffisant): {summary.rejected}")
+    if summary.kept:
+        log(f"Fichiers conservés sans compression (budget mémoire insuffisant): {summary.kept}")
+    if summary.duplicates:
+        log(f"Fichiers identiques à un autre fichier (compressés une seule fois): {summary.duplicates}")
+    if summary.over_target:
+        log(f"Fichiers au-dessus de la taille cible: {summary.over_target}")
+    log(summary.describe())
@@ -0,0 +1,197 @@
+"""
+Pool de processus Ghostscript persistants, pilotés en PostScript par leur entrée standard.
+
+Lancer un interpréteur gs coûte souvent plus cher que la compression d'une facture
+d'une page : chaque processus du pool traite donc une suite de PDF, en changeant de
+fichier de sortie (OutputFile) entre deux documents.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from .dependencies import ghostscript_info
+from .compressors import TEMP_PREFIX, ghostscript_preset, compress_pdf_ghostscript
+
+# Après ce nombre d'échecs sans aucun succès, le pool est désactivé (retour à un gs par fichier)
+MAX_FAILURES_WITHOUT_SUCCESS = 3
+
+
+def ps_string(text):
+    """Chaîne PostScript littérale (UTF-8, caractères spéciaux et non ASCII échappés)"""
+    chars = []
+    for byte in text.encode("utf-8"):
+        if byte in b"()\\":
+            chars.append("\\" + chr(byte))
+        elif byte < 32 or byte > 126:
+            chars.append(f"\\{byte:03o}")
+        else:
+            chars.append(chr(byte))
+    return "(" + "".join(chars) + ")"
+
+
+class GhostscriptError(Exception):
+    """Le processus Ghostscript persistant n'a pas pu traiter le fichier"""
+
+
+class GhostscriptWorker:
+    """
+    Un interpréteur gs (device pdfwrite) lancé une fois pour un préréglage donné.
+    Les accès fichiers restent limités (-dSAFER) aux dossiers autorisés.
+    """
+    def __init__(self, executable, preset, roots, scratch_dir):
+        self.preset = preset
+        # Marqueur de fin de traitement, imprévisible pour le contenu d'un PDF
+        self.marker = "PJ_" + os.urandom(16).hex()
+        # Fichier de sortie « au repos », qui referme le PDF produit après chaque document
+        self.idle_output = os.path.join(scratch_dir, self.marker + ".pdf")
+
+        permits = []
+        for root in list(roots) + [scratch_dir]:
+            pattern = os.path.join(os.path.abspath(root), "*")
+            permits += [f"--permit-file-read={pattern}", f"--permit-file-write={pattern}"]
+
+        self.process = subprocess.Popen(
+            [
+                executable, '-q', '-dSAFER', '-dNOPAUSE', '-sDEVICE=pdfwrite',
+                '-dCompatibilityLevel=1.4', f'-dPDFSETTINGS={preset}',
+                f'-sOutputFile={self.idle_output}', *permits, '-'
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def convert(self, input_path, output_path):
+        """Écrit dans output_path la version compressée de input_path"""
+        program = (
+            f"{{ << /OutputFile {ps_string(output_path)} >> setpagedevice "
+            f"{ps_string(input_path)} run }} stopped "
+            # Refermer le PDF produit en revenant au fichier de sortie au repos
+            f"<< /OutputFile {ps_string(self.idle_output)} >> setpagedevice "
+            f"{{ ({self.marker} ERROR ) print $error /errorname get =string cvs print }} "
+            f"{{ ({self.marker} OK) print }} ifelse "
+            f"(\\n) print flush clear cleardictstack\n"
+        )
+        try:
+            self.process.stdin.write(program.encode("ascii"))
+            self.process.stdin.flush()
+        except OSError as e:
+            raise GhostscriptError(f"processus Ghostscript interrompu ({e})")
+
+        # Les messages de l'interpréteur PDF sont ignorés jusqu'au marqueur
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise GhostscriptError("processus Ghostscript interrompu")
+            line = line.decode("utf-8", "replace").strip()
+            if line.startswith(self.marker):
+                status = line[len(self.marker):].strip()
+                if status != "OK":
+                    raise GhostscriptError(status)
+                return
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        """Termine l'interpréteur (fin de l'entrée standard), de force s'il ne répond plus"""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class GhostscriptPool:
+    """
+    Processus Ghostscript persistants partagés par les threads du moteur : chaque thread
+    dispose de son propre interpréteur par préréglage, lancé à la première utilisation.
+
+    roots : dossiers où se trouvent les PDF à traiter (accès autorisés à gs).
+    Les fichiers hors de ces dossiers, ou tout échec du processus persistant,
+    sont traités par compress_pdf_ghostscript (un gs par fichier).
+    """
+    def __init__(self, roots, info=None):
+        self.info = info or ghostscript_info()
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.scratch_dir = tempfile.mkdtemp(prefix="pj_gs_")
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.successes = 0
+        self.failures = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def enabled(self):
+        return self.successes > 0 or self.failures < MAX_FAILURES_WITHOUT_SUCCESS
+
+    def is_allowed(self, file_path):
+        file_path = os.path.abspath(file_path)
+        return any(file_path.startswith(root + os.sep) for root in self.roots)
+
+    def get_worker(self, preset):
+        """Interpréteur du thread courant pour ce préréglage (relancé s'il s'est arrêté)"""
+        workers = getattr(self.local, "workers", None)
+        if workers is None:
+            workers = self.local.workers = {}
+        worker = workers.get(preset)
+        if worker is None or not worker.alive:
+            worker = GhostscriptWorker(self.info.executable, preset, self.roots, self.scratch_dir)
+            workers[preset] = worker
+            with self.lock:
+                self.workers.append(worker)
+        return worker
+
+    def discard_worker(self, preset):
+        worker = self.local.workers.pop(preset, None)
+        if worker is not None:
+            with self.lock:
+                self.workers.remove(worker)
+            worker.close()
+
+    def compress(self, file_path, dpi=120, log=print, output_path=None):
+        """Compresse un PDF vers output_path (par défaut sur place), comme compress_pdf_ghostscript"""
+        output_path = output_path or file_path
+        if not self.enabled or not (self.is_allowed(file_path) and self.is_allowed(output_path)):
+            return compress_pdf_ghostscript(file_path, dpi, log, output_path)
+
+        preset = ghostscript_preset(dpi)
+        # Fichier temporaire à côté du fichier final, pour un remplacement atomique
+        fd, temp_file = tempfile.mkstemp(suffix='.pdf', prefix=TEMP_PREFIX, dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        try:
+            self.get_worker(preset).convert(os.path.abspath(file_path), temp_file)
+            if os.path.getsize(temp_file) == 0:
+                raise GhostscriptError("fichier de sortie vide")
+        except (OSError, GhostscriptError):
+            # Le processus a pu rester dans un état incohérent : le remplacer au prochain fichier
+            self.discard_worker(preset)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            with self.lock:
+                self.failures += 1
+            return compress_pdf_ghostscript(file_path, dpi, log, output_path)
+
+        os.replace(temp_file, output_path)
+        with self.lock:
+            self.successes += 1
+        return True
+
+    def close(self):
+        """Arrête tous les interpréteurs et supprime le dossier de travail"""
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
@@ -0,0 +1,287 @@
+"""
+Stratégies d'encodage par format d'image.
+
+Plusieurs encodages candidats sont produits en mémoire (PNG optimisé, palette réduite,
+niveaux de gris, noir et blanc 1 bit, conversion JPEG/WebP facultative) et le plus
+petit est retenu.
+"""
+import io
+import itertools
+
+# Écart maximal entre les canaux R, G et B pour considérer une image en niveaux de gris
+GRAYSCALE_TOLERANCE = 6
+# Niveaux considérés comme « noir » (0 à N) ou « blanc » (255 - N à 255)
+BILEVEL_TOLERANCE = 48
+# Part minimale de pixels noirs ou blancs pour passer une image en noir et blanc 1 bit
+BILEVEL_RATIO = 0.995
+
+# Recherche d'une taille cible : qualité minimale et échelles essayées (de la plus grande à la plus petite)
+MIN_TARGET_QUALITY = 20
+TARGET_SCALES = (1.0, 0.85, 0.7, 0.6, 0.5, 0.4, 0.3, 0.25)
+
+# Mémoire utilisée par l'encodage, en multiples de l'image décodée : recherche de
+# l'encodage le plus compact (copies en gris, palette...) ou encodage unique (chemin économe)
+FULL_PIPELINE_FACTOR = 4
+LOW_MEMORY_FACTOR = 2
+
+# Formats de conversion des PNG : format Pillow et extension du fichier produit
+PNG_CONVERSIONS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
+
+
+def has_transparency(img):
+    """Indique si l'image contient réellement des pixels transparents"""
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def flatten(img):
+    """Convertit l'image en RGB, les zones transparentes devenant blanches"""
+    from PIL import Image
+
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def to_8bit(img):
+    """
+    Image en niveaux de gris sur 16 bits (modes I;16 et I d'un PNG) ramenée sur 8 bits :
+    les valeurs sont mises à l'échelle, une conversion directe les écrêterait à 255
+    """
+    return img.convert("I").point(lambda value: value / 256).convert("L")
+
+
+def is_grayscale(img):
+    """Indique si une image RGB ne contient (presque) que des gris"""
+    from PIL import ImageChops
+
+    if img.mode == "L":
+        return True
+    if img.mode != "RGB":
+        return False
+    red, green, blue = img.split()
+    return (
+        ImageChops.difference(red, green).getextrema()[1] <= GRAYSCALE_TOLERANCE
+        and ImageChops.difference(green, blue).getextrema()[1] <= GRAYSCALE_TOLERANCE
+    )
+
+
+def is_bilevel(gray):
+    """Indique si une image en niveaux de gris est en pratique noir et blanc (ticket, facture scannée)"""
+    histogram = gray.histogram()
+    extremes = sum(histogram[:BILEVEL_TOLERANCE + 1]) + sum(histogram[255 - BILEVEL_TOLERANCE:])
+    return extremes >= BILEVEL_RATIO * gray.width * gray.height
+
+
+class MemoryBudgetError(Exception):
+    """L'image ne peut pas être traitée dans le budget mémoire, même par le chemin économe"""
+
+
+def draft_size(size, target_size):
+    """Taille décodée d'un JPEG en mode brouillon : échelle 1/1, 1/2, 1/4 ou 1/8 la plus petite couvrant la cible"""
+    for denominator in (8, 4, 2):
+        scaled_size = (-(-size[0] // denominator), -(-size[1] // denominator))
+        if scaled_size[0] >= target_size[0] and scaled_size[1] >= target_size[1]:
+            return scaled_size
+    return size
+
+
+def plan_memory(img, target_size, budget):
+    """
+    Estime, d'après l'en-tête (dimensions et mode), la mémoire nécessaire au traitement
+    et choisit le chemin adapté au budget (en octets). Le budget ne change que la manière
+    de traiter l'image (encodage unique, JPEG décodés en mode brouillon), jamais sa taille :
+    renvoie True pour le chemin économe, False pour le chemin habituel, et lève
+    MemoryBudgetError si même le chemin économe dépasse le budget.
+    """
+    bands = len(img.getbands())
+    decoded = draft_size(img.size, target_size) if img.format == "JPEG" else img.size
+
+    def estimate(factor):
+        return (decoded[0] * decoded[1] + target_size[0] * target_size[1] * factor) * bands
+
+    if estimate(FULL_PIPELINE_FACTOR) <= budget:
+        return False
+    if estimate(LOW_MEMORY_FACTOR) <= budget:
+        return True
+    raise MemoryBudgetError(
+        f"image de {img.width}x{img.height} px trop volumineuse pour le budget mémoire "
+        f"({budget / (1024 * 1024):.0f} MB)"
+    )
+
+
+def open_image(fp, pixel_limit=True):
+    """
+    Image.open ; sans pixel_limit, la limite de Pillow contre les « bombes de décompression »
+    (Image.MAX_IMAGE_PIXELS) n'est pas appliquée à cette ouverture : la taille décodée
+    est alors vérifiée par l'appelant d'après l'en-tête (plan_memory).
+    """
+    from PIL import Image
+
+    if pixel_limit:
+        return Image.open(fp)
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(fp)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def encode(img, image_format, **params):
+    """Encode l'image en mémoire et renvoie les octets obtenus"""
+    buffer = io.BytesIO()
+    img.save(buffer, image_format, **params)
+    return buffer.getvalue()
+
+
+def jpeg_candidates(img, quality, save_options):
+    """Encodages candidats pour une photo ou un scan JPEG"""
+    base = img if img.mode in ("RGB", "L", "CMYK") else flatten(img)
+    params = dict(save_options, optimize=True, quality=quality)
+    yield "jpeg", None, lambda: encode(base, "JPEG", **params)
+    if base.mode == "RGB" and is_grayscale(base):
+        yield "jpeg gris", None, lambda: encode(base.convert("L"), "JPEG", **params)
+
+
+def png_candidates(img, quality, save_options, png_colors=None, bilevel=False, convert_png=None):
+    """Encodages candidats pour un PNG (scan, capture, logo...)"""
+    from PIL import Image
+
+    params = dict(save_options, optimize=True)
+    transparent = has_transparency(img)
+    if img.mode.startswith("I"):
+        # Niveaux de gris sur 16 bits : PNG sans perte dans le mode d'origine,
+        # les autres encodages partent de l'image ramenée sur 8 bits
+        high_depth = img
+        yield "png", None, lambda: encode(high_depth, "PNG", **params)
+        img = to_8bit(img)
+        yield "png 8 bits", None, lambda: encode(img, "PNG", **params)
+    else:
+        if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            img = img.convert("RGBA" if transparent else "RGB")
+
+        # PNG sans perte, en conservant transparence et palette
+        yield "png", None, lambda: encode(img, "PNG", **params)
+
+    if not transparent and img.mode not in ("1", "L"):
+        rgb = flatten(img)
+        if is_grayscale(rgb):
+            gray = rgb.convert("L")
+            yield "png gris", None, lambda: encode(gray, "PNG", **params)
+            if bilevel and is_bilevel(gray):
+                bilevel_img = gray.convert("1", dither=Image.NONE)
+                yield "png noir et blanc", None, lambda: encode(bilevel_img, "PNG", **params)
+
+    # Palette réduite (avec perte) pour les scans en couleurs
+    if png_colors and img.mode in ("RGB", "RGBA"):
+        method = Image.FASTOCTREE if img.mode == "RGBA" else Image.MEDIANCUT
+        yield "png palette", None, lambda: encode(img.quantize(png_colors, method=method), "PNG", **params)
+
+    # Conversion facultative vers un format avec perte (uniquement sans transparence)
+    if convert_png in PNG_CONVERSIONS and not transparent:
+        image_format, extension = PNG_CONVERSIONS[convert_png]
+        converted = flatten(img)
+        if is_grayscale(converted):
+            converted = converted.convert("L")
+        yield convert_png, extension, lambda: encode(
+            converted, image_format, **dict(save_options, quality=quality)
+        )
+
+
+def choose_encoding(img, source_format, quality, save_options=None, low_memory=False, **options):
+    """
+    Encode l'image selon toutes les stratégies adaptées à son format et renvoie
+    (octets, extension, stratégie) pour le plus petit résultat.
+    L'extension vaut None si le format du fichier est inchangé.
+    low_memory : seul le premier encodage (JPEG ou PNG optimisé) est essayé, sans copie de l'image.
+    """
+    save_options = save_options or {}
+    if source_format == "JPEG":
+        candidates = jpeg_candidates(img, quality, save_options)
+    else:
+        candidates = png_candidates(img, quality, save_options, **options)
+    if low_memory:
+        candidates = itertools.islice(candidates, 1)
+
+    best = None
+    for strategy, extension, encoder in candidates:
+        data = encoder()
+        if best is None or len(data) < len(best[0]):
+            best = (data, extension, strategy)
+    return best
+
+
+def scaled(img, scale, save_options):
+    """Image réduite à l'échelle donnée, et options d'enregistrement (résolution) ajustées"""
+    from PIL import Image
+
+    if scale == 1:
+        return img, save_options
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    options = dict(save_options)
+    if "dpi" in options:
+        options["dpi"] = tuple(round(value * scale) for value in options["dpi"])
+    return img.resize(size, Image.LANCZOS), options
+
+
+def fit_to_size(img, source_format, quality, target, save_options=None, **options):
+    """
+    Cherche en mémoire l'encodage le plus fidèle qui tient dans target.max_bytes :
+    la plus grande échelle de TARGET_SCALES, puis la meilleure qualité (recherche
+    dichotomique entre MIN_TARGET_QUALITY et quality) pour les formats avec perte.
+    Le réglage retenu est essayé en premier s'il est fourni par target.hint,
+    et le réglage trouvé est enregistré dans target.setting.
+    Renvoie (octets, extension, stratégie) ; si la cible est inaccessible,
+    le plus petit encodage essayé.
+    """
+    save_options = save_options or {}
+    # La qualité n'influe que sur les encodages avec perte (JPEG, PNG converti)
+    lossy = source_format == "JPEG" or bool(options.get("convert_png"))
+    low_quality = min(MIN_TARGET_QUALITY, quality)
+    hint_scale = target.hint.get("scale", 1.0)
+    hint_quality = target.hint.get("quality")
+
+    smallest = None
+    for scale in TARGET_SCALES:
+        # Reprendre à l'échelle retenue lors de l'exécution précédente
+        if scale > hint_scale:
+            continue
+        candidate, candidate_options = scaled(img, scale, save_options)
+        encode_at = lambda q: choose_encoding(candidate, source_format, q, candidate_options, **options)
+
+        best = encode_at(low_quality if lossy else quality)
+        if smallest is None or len(best[0]) < len(smallest[0]):
+            smallest = best
+        if len(best[0]) > target.max_bytes:
+            continue
+
+        best_quality = low_quality if lossy else quality
+        if lossy:
+            low, high = low_quality + 1, quality
+            # Qualité retenue lors de l'exécution précédente, puis la suivante : si la première
+            # tient et pas la seconde, la recherche s'arrête après ces deux essais
+            probes = []
+            if hint_quality is not None and low <= hint_quality <= high:
+                probes = [hint_quality, hint_quality + 1]
+            while low <= high:
+                q = probes.pop(0) if probes else (low + high + 1) // 2
+                encoded = encode_at(q)
+                if len(encoded[0]) <= target.max_bytes:
+                    best, best_quality, low = encoded, q, q + 1
+                else:
+                    high = q - 1
+                    probes = []
+
+        target.setting = {"scale": scale, "quality": best_quality}
+        return best
+    return smallest
@@ -0,0 +1,223 @@
+"""
+Manifeste des fichiers déjà compressés, pour ne retraiter que les fichiers modifiés
+"""
+import os
+import json
+import time
+import hashlib
+
+# Fichier enregistré à la racine du dossier destination (ou du dossier source en compression sur place)
+MANIFEST_NAME = ".pj_compressor_manifest.json"
+MANIFEST_VERSION = 1
+
+# Journal des fichiers traités par l'exécution en cours, complété après chaque fichier.
+# Il n'existe plus à la fin d'une exécution complète : sa présence signale une interruption.
+JOURNAL_NAME = ".pj_compressor_journal.jsonl"
+# Intervalle (secondes) entre deux écritures forcées du journal sur le disque (fsync)
+JOURNAL_SYNC_INTERVAL = 1.0
+# Fichiers propres au manifeste, à ne pas confondre avec les fichiers temporaires
+# d'une compression interrompue (même préfixe .pj_)
+MANIFEST_FILES = (MANIFEST_NAME, MANIFEST_NAME + ".tmp", JOURNAL_NAME, JOURNAL_NAME + ".tmp")
+
+# Taille des blocs lus pour le calcul des empreintes
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    """Calcule l'empreinte SHA-256 d'un fichier, bloc par bloc"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path, with_hash=False):
+    """Taille, date de modification et (optionnellement) empreinte du contenu d'un fichier"""
+    stat = os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": file_hash(file_path) if with_hash else None,
+    }
+
+
+class Manifest:
+    """
+    Index des fichiers traités, indexé par chemin relatif : la décision de sauter
+    un fichier se fait par une simple recherche dans un dictionnaire.
+
+    Pendant une exécution, chaque fichier traité est aussi ajouté au journal
+    (une ligne JSON par fichier) : après un arrêt brutal, le manifeste est reconstitué
+    à partir du dernier enregistrement complet et du journal.
+    """
+    def __init__(self, root, entries=None):
+        self.root = root
+        self.entries = entries if entries is not None else {}
+        # Exécution interrompue retrouvée dans le journal : en-tête et fichiers déjà traités
+        # (puis complétés par les fichiers traités depuis la reprise)
+        self.interrupted = None
+        self.resumed = set()
+        self.journal = None
+        self.journal_header = None
+        self.last_sync = 0.0
+
+    @property
+    def path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.root, JOURNAL_NAME)
+
+    @classmethod
+    def load(cls, root):
+        """Charge le manifeste du dossier (vide s'il n'existe pas ou est illisible)"""
+        manifest = cls(root)
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                manifest.entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        manifest.replay_journal()
+        return manifest
+
+    def replay_journal(self):
+        """Applique le journal d'une exécution interrompue (s'il existe) au manifeste"""
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne incomplète (arrêt pendant l'écriture)
+                        continue
+                    if "run" in record:
+                        self.interrupted = record["run"]
+                    elif "key" in record:
+                        # Sans entrée : fichier déjà intégré au manifeste enregistré (journal réécrit)
+                        if "entry" in record:
+                            self.entries[record["key"]] = record["entry"]
+                        self.resumed.add(record["key"])
+        except OSError:
+            pass
+
+    def start_journal(self, run, resume=False):
+        """
+        Ouvre le journal de l'exécution décrite par run (dictionnaire enregistré en en-tête).
+        resume : poursuit le journal de l'exécution interrompue au lieu d'en commencer un nouveau.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        if self.interrupted is not None:
+            # Le journal précédent est intégré au manifeste avant d'être remplacé
+            self.save()
+        if resume and self.interrupted is not None:
+            # Même en-tête et mêmes fichiers traités : un nouvel arrêt pourra encore être repris
+            self.journal_header = self.interrupted
+        else:
+            self.journal_header = run
+            self.resumed = set()
+        self.rewrite_journal()
+
+    def rewrite_journal(self):
+        """
+        Remplace le journal par l'en-tête de l'exécution et la liste des fichiers qu'elle
+        a déjà traités (leurs entrées figurent dans le manifeste enregistré)
+        """
+        if self.journal is not None:
+            self.journal.close()
+        temp_file = self.journal_path + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"run": self.journal_header}, ensure_ascii=False) + "\n")
+            for key in sorted(self.resumed):
+                f.write(json.dumps({"key": key}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.journal_path)
+        self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.last_sync = time.monotonic()
+
+    def append_journal(self, record, sync=False):
+        self.journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.journal.flush()
+        if sync or time.monotonic() - self.last_sync >= JOURNAL_SYNC_INTERVAL:
+            os.fsync(self.journal.fileno())
+            self.last_sync = time.monotonic()
+
+    def compact_journal(self):
+        """Enregistre le manifeste et vide le journal (exécution de longue durée)"""
+        self.save()
+        if self.journal is not None:
+            self.rewrite_journal()
+
+    def close_journal(self, completed):
+        """Ferme le journal ; il est supprimé si l'exécution est allée à son terme"""
+        if self.journal is None:
+            return
+        self.journal.close()
+        self.journal = None
+        if completed:
+            os.remove(self.journal_path)
+
+    def is_up_to_date(self, rel_path, file_path, stat, settings, use_hash=False):
+        """
+        Indique si le fichier est inchangé depuis sa dernière compression avec les mêmes paramètres.
+        Si la date de modification diffère mais pas la taille, l'empreinte du contenu
+        peut être comparée (use_hash) pour éviter une recompression inutile.
+        """
+        entry = self.entries.get(rel_path)
+        if entry is None or entry["settings"] != settings:
+            return False
+        if entry["size"] != stat.st_size:
+            return False
+        if entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if use_hash and entry.get("hash"):
+            return file_hash(file_path) == entry["hash"]
+        return False
+
+    def record(self, rel_path, fingerprint, level, settings, output_size, output=None, fit=None):
+        """
+        Enregistre le résultat d'une compression réussie.
+        output : chemin relatif du fichier produit, s'il diffère de rel_path (PNG converti)
+        fit : réglage qui a permis d'atteindre la taille cible (mode taille cible)
+        """
+        entry = dict(
+            fingerprint,
+            level=level,
+            settings=settings,
+            output_size=output_size,
+        )
+        if output is not None and output != rel_path:
+            entry["output"] = output
+        if fit is not None:
+            entry["fit"] = fit
+        self.entries[rel_path] = entry
+        if self.journal is not None:
+            self.resumed.add(rel_path)
+            self.append_journal({"key": rel_path, "entry": entry})
+
+    def output_key(self, rel_path):
+        """Chemin relatif du fichier produit lors de la dernière compression"""
+        entry = self.entries.get(rel_path) or {}
+        return entry.get("output", rel_path)
+
+    def fit_hint(self, rel_path):
+        """Réglage retenu lors de la dernière compression en mode taille cible (None sinon)"""
+        entry = self.entries.get(rel_path) or {}
+        return entry.get("fit")
+
+    def save(self):
+        """Écrit le manifeste de façon atomique (fichier temporaire puis remplacement)"""
+        os.makedirs(self.root, exist_ok=True)
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(temp_file, self.path)
+
+
+def manifest_key(file_path, source):
+    """Clé du manifeste : chemin relatif au dossier source, avec des / quel que soit le système"""
+    return os.path.relpath(file_path, source).replace(os.sep, "/")
@@ -0,0 +1,270 @@
+"""
+Recompression des images d'un PDF sans Ghostscript (PyPDF2 et Pillow).
+
+Les images des pages sont réduites à la résolution du niveau et réencodées en JPEG ;
+les images identiques présentes sur plusieurs pages ne sont enregistrées qu'une fois.
+Les images que Pillow ne sait pas relire depuis un PDF (JBIG2, CCITT, JPEG 2000,
+masques, images à moins de 8 bits par composante) sont conservées telles quelles.
+"""
+import io
+import re
+import hashlib
+import binascii
+
+# Espaces de couleurs pris en charge et mode Pillow correspondant
+COLOR_SPACES = {
+    "/DeviceRGB": "RGB", "/CalRGB": "RGB",
+    "/DeviceGray": "L", "/CalGray": "L",
+}
+# Nombre de composantes d'un profil ICC et mode Pillow correspondant
+ICC_COMPONENTS = {1: "L", 3: "RGB"}
+# Filtres dont le résultat décodé est une suite brute de pixels
+RAW_FILTERS = ("/FlateDecode", "/LZWDecode", "/RunLengthDecode", "/ASCIIHexDecode", "/ASCII85Decode")
+# En dessous de cette taille, une image (logo, puce...) n'est pas réencodée
+MIN_IMAGE_BYTES = 4096
+
+
+def stream_filters(stream):
+    """Liste des filtres d'un flux PDF"""
+    filters = stream.get("/Filter")
+    if filters is None:
+        return []
+    filters = filters.get_object()
+    if isinstance(filters, list):
+        return [str(name) for name in filters]
+    return [str(filters)]
+
+
+def color_mode(stream):
+    """Mode Pillow de l'image (et palette RGB pour un espace /Indexed), ou (None, None)"""
+    color_space = stream.get("/ColorSpace")
+    if color_space is None:
+        return None, None
+    color_space = color_space.get_object()
+    if not isinstance(color_space, list):
+        return COLOR_SPACES.get(str(color_space)), None
+
+    family = str(color_space[0])
+    if family in COLOR_SPACES:
+        return COLOR_SPACES[family], None
+    if family == "/ICCBased":
+        profile = color_space[1].get_object()
+        return ICC_COMPONENTS.get(int(profile.get("/N", 0))), None
+    if family == "/Indexed":
+        base_mode, _ = color_mode({"/ColorSpace": color_space[1]})
+        lookup = color_space[3].get_object()
+        lookup = lookup.get_data() if hasattr(lookup, "get_data") else bytes(lookup.original_bytes)
+        if base_mode == "RGB":
+            return "P", lookup
+        if base_mode == "L":
+            return "P", b"".join(bytes((value, value, value)) for value in lookup)
+    return None, None
+
+
+def decode_image(stream, max_size=None, memory_budget=None):
+    """
+    Image Pillow d'un XObject image, ou None si l'image doit être conservée telle quelle.
+    Les JPEG sont décodés directement à échelle réduite s'ils dépassent max_size ;
+    MemoryBudgetError est levée, sans décodage, si la taille décodée (estimée
+    d'après le dictionnaire du flux) dépasse memory_budget.
+    """
+    from PIL import Image
+    from .images import LOW_MEMORY_FACTOR, MemoryBudgetError, draft_size
+
+    # Masques et tables de décodage : un réencodage avec perte changerait le rendu
+    if stream.get("/ImageMask") or "/Mask" in stream or "/Decode" in stream:
+        return None
+    filters = stream_filters(stream)
+    mode, palette = color_mode(stream)
+    if mode is None:
+        return None
+
+    width, height = int(stream["/Width"]), int(stream["/Height"])
+    channels = {"RGB": 3, "L": 1, "P": 1}[mode]
+    if memory_budget:
+        decoded = (width, height)
+        if filters == ["/DCTDecode"] and max_size:
+            decoded = draft_size(decoded, max_size)
+        if decoded[0] * decoded[1] * channels * LOW_MEMORY_FACTOR > memory_budget:
+            raise MemoryBudgetError(
+                f"image de {width}x{height} px trop volumineuse pour le budget mémoire "
+                f"({memory_budget / (1024 * 1024):.0f} MB)"
+            )
+
+    if filters == ["/DCTDecode"]:
+        img = Image.open(io.BytesIO(stream._data))
+        if max_size:
+            img.draft(None, max_size)
+        img.load()
+        # Les JPEG CMYK (souvent inversés dans les PDF) sont conservés tels quels
+        return img if img.mode in ("RGB", "L") else None
+
+    if not all(name in RAW_FILTERS for name in filters) or int(stream.get("/BitsPerComponent", 0)) != 8:
+        return None
+    if filters == ["/ASCIIHexDecode"]:
+        # Décodé ici : le filtre de PyPDF2 3.0 échoue sur les données binaires
+        digits = re.sub(rb"\s", b"", stream._data).split(b">")[0]
+        data = binascii.unhexlify(digits + b"0" * (len(digits) % 2))
+    else:
+        data = stream.get_data()
+    if len(data) < width * height * channels:
+        return None
+    img = Image.frombytes(mode, (width, height), data[:width * height * channels])
+    if mode == "P":
+        img.putpalette(palette)
+        img = img.convert("RGB")
+    return img
+
+
+def recompress_image(stream, max_size, quality, memory_budget=None):
+    """
+    Réduit l'image à max_size (largeur, hauteur en pixels) et la réencode en JPEG,
+    si le résultat est plus petit que le flux d'origine. Renvoie True si l'image a été remplacée.
+    MemoryBudgetError est propagée : le document entier est alors conservé.
+    """
+    from PIL import Image
+    from PyPDF2.generic import NameObject, NumberObject
+    from .images import MemoryBudgetError, is_grayscale
+
+    if len(stream._data) < MIN_IMAGE_BYTES:
+        return False
+    # Image éventuellement pivotée sur la page : comparer plus grand côté à plus grand côté
+    if (int(stream.get("/Width", 0)) >= int(stream.get("/Height", 0))) != (max_size[0] >= max_size[1]):
+        max_size = (max_size[1], max_size[0])
+    try:
+        img = decode_image(stream, max_size, memory_budget)
+    except MemoryBudgetError:
+        raise
+    except Exception:
+        # Flux que PyPDF2 ou Pillow ne savent pas décoder : image conservée telle quelle
+        return False
+    if img is None:
+        return False
+
+    if img.width > max_size[0] or img.height > max_size[1]:
+        scale = min(max_size[0] / img.width, max_size[1] / img.height)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    if img.mode == "RGB" and is_grayscale(img):
+        img = img.convert("L")
+
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality, optimize=True)
+    data = buffer.getvalue()
+    if len(data) >= len(stream._data):
+        return False
+
+    stream._data = data
+    # Le flux décodé mis en cache par PyPDF2 ne correspond plus aux nouvelles données
+    if hasattr(stream, "decoded_self"):
+        stream.decoded_self = None
+    stream.pop(NameObject("/DecodeParms"), None)
+    stream[NameObject("/Filter")] = NameObject("/DCTDecode")
+    stream[NameObject("/Width")] = NumberObject(img.width)
+    stream[NameObject("/Height")] = NumberObject(img.height)
+    stream[NameObject("/ColorSpace")] = NameObject("/DeviceGray" if img.mode == "L" else "/DeviceRGB")
+    stream[NameObject("/BitsPerComponent")] = NumberObject(8)
+    return True
+
+
+def image_digest(stream):
+    """Empreinte du contenu et des paramètres d'une image, pour repérer les doublons"""
+    digest = hashlib.sha256(stream._data)
+    for key in sorted(stream):
+        if key != "/Length":
+            digest.update(f"{key}={stream[key]!r};".encode("utf-8", "replace"))
+    return digest.hexdigest()
+
+
+class PdfImageRecompressor:
+    """
+    Recompression des images d'un document en cours d'écriture, page par page :
+    chaque page est traitée dès son ajout, si bien que seules ses images d'origine
+    sont en mémoire en même temps.
+
+    Les doublons sont remplacés dans les ressources de la page lue (dedupe_page), avant
+    sa copie : PyPDF2 reprend alors l'image déjà copiée au lieu d'en copier une autre.
+    Un doublon encore référencé ailleurs (apparence d'une annotation...) reste copié.
+
+    La taille d'affichage réelle des images n'est pas calculée (il faudrait interpréter
+    les flux de contenu) : une image est réduite pour tenir dans la page à dpi, ce qui
+    correspond aux PDF scannés (une image par page) sans jamais trop réduire une petite image.
+    """
+    def __init__(self, writer, dpi=120, quality=75, memory_budget=None):
+        self.writer = writer
+        self.dpi = dpi
+        self.quality = quality
+        self.memory_budget = memory_budget
+        self.processed = set()
+        # Empreinte d'une image du document lu → référence de sa première occurrence
+        self.digests = {}
+        # Numéros d'objet des images du document lu déjà indexées
+        self.indexed = set()
+        # Numéro d'objet d'un doublon → référence de l'image conservée
+        self.duplicates = {}
+        self.recompressed = 0
+
+    def dedupe_page(self, page):
+        """Remplace les doublons d'images dans les ressources d'une page du document lu"""
+        self.visit_duplicates(page.get("/Resources"), frozenset())
+
+    def visit_duplicates(self, resources, visited):
+        from PyPDF2.generic import IndirectObject, NameObject
+
+        resources = resources.get_object() if resources is not None else None
+        if not resources or "/XObject" not in resources:
+            return
+        xobjects = resources["/XObject"].get_object()
+        for name in list(xobjects):
+            ref = xobjects.raw_get(name)
+            if not isinstance(ref, IndirectObject):
+                continue
+            if ref.idnum in self.duplicates:
+                xobjects[NameObject(name)] = self.duplicates[ref.idnum]
+                continue
+            xobject = ref.get_object()
+            subtype = xobject.get("/Subtype")
+
+            if subtype == "/Form" and ref.idnum not in visited:
+                # Les formulaires peuvent contenir leurs propres images
+                self.visit_duplicates(xobject.get("/Resources"), visited | {ref.idnum})
+            elif subtype == "/Image" and ref.idnum not in self.indexed:
+                self.indexed.add(ref.idnum)
+                canonical = self.digests.setdefault(image_digest(xobject), ref)
+                if canonical.idnum != ref.idnum:
+                    self.duplicates[ref.idnum] = canonical
+                    xobjects[NameObject(name)] = canonical
+
+    def process_page(self, page):
+        """Réduit et réencode les images d'une page copiée dans le document écrit"""
+        box = page.mediabox
+        # Taille de la page en pixels à la résolution visée (1 point = 1/72 pouce)
+        max_size = (
+            max(1, round(float(box.width) / 72 * self.dpi)),
+            max(1, round(float(box.height) / 72 * self.dpi)),
+        )
+        self.visit(page.get("/Resources"), max_size, frozenset())
+
+    def visit(self, resources, max_size, visited):
+        from PyPDF2.generic import IndirectObject
+
+        resources = resources.get_object() if resources is not None else None
+        if not resources or "/XObject" not in resources:
+            return
+        xobjects = resources["/XObject"].get_object()
+        for name in list(xobjects):
+            ref = xobjects.raw_get(name)
+            if not isinstance(ref, IndirectObject):
+                continue
+            xobject = ref.get_object()
+            subtype = xobject.get("/Subtype")
+
+            if subtype == "/Form" and ref.idnum not in visited:
+                self.visit(xobject.get("/Resources"), max_size, visited | {ref.idnum})
+            elif subtype == "/Image" and ref.idnum not in self.processed:
+                self.processed.add(ref.idnum)
+                if recompress_image(xobject, max_size, self.quality, self.memory_budget):
+                    self.recompressed += 1
+
+    def finish(self):
+        """Termine le document ; renvoie (images réencodées, doublons remplacés)"""
+        return self.recompressed, len(self.duplicates)
@@ -0,0 +1,73 @@
+"""
+Lecture anticipée des fichiers à compresser : pendant qu'un fichier est compressé,
+des threads lisent en mémoire les suivants. Sur un partage réseau (SMB, NFS), la
+latence de lecture est ainsi masquée par le temps de calcul au lieu de s'y ajouter.
+"""
+import os
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+# Nombre de fichiers lus à l'avance et threads de lecture
+PREFETCH_FILES = 8
+PREFETCH_THREADS = 4
+# Les fichiers plus grands ne sont pas chargés en mémoire : seul leur stat est lu à l'avance
+PREFETCH_MAX_FILE_BYTES = 16 * 1024 * 1024
+
+
+def read_source(file_path, max_bytes=PREFETCH_MAX_FILE_BYTES):
+    """
+    (stat, contenu) d'un fichier lu en une fois ; contenu vaut None au-delà de max_bytes.
+    Renvoie None si le fichier est illisible (l'erreur sera signalée lors du traitement).
+    """
+    try:
+        with open(file_path, "rb") as f:
+            file_stat = os.fstat(f.fileno())
+            data = f.read() if file_stat.st_size <= max_bytes else None
+        return file_stat, data
+    except OSError:
+        return None
+
+
+class Prefetcher:
+    """
+    Étage de lecture d'un moteur : renvoie chaque job (source, destination, réglage)
+    complété de son fichier lu à l'avance (voir read_source), dans l'ordre des jobs.
+    Au plus depth fichiers sont en mémoire en attente d'être traités.
+    skip_extensions : fichiers lus par un autre programme (PDF compressés par Ghostscript),
+    transmis sans lecture anticipée (None) pour ne pas être lus deux fois.
+    """
+    def __init__(self, depth=PREFETCH_FILES, threads=PREFETCH_THREADS, max_file_bytes=PREFETCH_MAX_FILE_BYTES,
+                 skip_extensions=()):
+        self.depth = depth
+        self.threads = threads
+        self.max_file_bytes = max_file_bytes
+        self.skip_extensions = tuple(skip_extensions)
+
+    def run(self, jobs):
+        pending = collections.deque()
+
+        def ready():
+            queued, future = pending.popleft()
+            return queued + (future.result() if future is not None else None,)
+
+        with ThreadPoolExecutor(max_workers=self.threads) as readers:
+            try:
+                for job in jobs:
+                    if job is None:
+                        # Attente du mode surveillance : les fichiers lus sont transmis sans attendre la suite
+                        while pending:
+                            yield ready()
+                        yield None
+                        continue
+                    if self.skip_extensions and job[0].lower().endswith(self.skip_extensions):
+                        pending.append((job, None))
+                    else:
+                        pending.append((job, readers.submit(read_source, job[0], self.max_file_bytes)))
+                    if len(pending) >= self.depth:
+                        yield ready()
+                while pending:
+                    yield ready()
+            finally:
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
@@ -0,0 +1,197 @@
+"""
+Mesures d'exécution : durée de chaque étape du traitement d'un fichier (décodage,
+encodage, Ghostscript, remplacement...), compteurs et histogrammes de l'exécution,
+et rapport CSV ou JSON avec une ligne par fichier.
+"""
+import os
+import csv
+import json
+import time
+import random
+import collections
+import contextlib
+
+# Étapes mesurées, dans l'ordre des colonnes du rapport CSV
+STAGES = (
+    "walk", "manifest", "decode", "encode", "write", "gs", "pypdf",
+    "replace", "copy", "fingerprint", "dedup",
+)
+
+REPORT_VERSION = 1
+
+# Durées conservées par étape pour le calcul des percentiles (échantillon aléatoire au-delà)
+RESERVOIR_SIZE = 1024
+
+
+def percentile(values, percent):
+    """Percentile (rang le plus proche) d'une liste de valeurs"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+class StageTimings:
+    """
+    Durées des étapes du traitement d'un fichier, et méthode de compression utilisée.
+    Remplie dans le processus de travail, puis renvoyée avec le FileResult.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.method = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+class StageStats:
+    """
+    Statistiques des durées d'une étape en mémoire bornée : nombre, total et maximum
+    exacts, percentiles calculés sur un échantillon d'au plus RESERVOIR_SIZE durées
+    (échantillonnage par réservoir : chaque durée a la même chance d'y figurer)
+    """
+    def __init__(self, size=RESERVOIR_SIZE):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.reservoir = []
+        self.random = random.Random(0)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.reservoir) < self.size:
+            self.reservoir.append(value)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.size:
+                self.reservoir[index] = value
+
+    def percentile(self, percent):
+        return percentile(self.reservoir, percent)
+
+
+class RunMetrics:
+    """
+    Registre d'une exécution : compteurs, durées par étape (StageStats)
+    et, si rows est vrai, une ligne par fichier traité pour le rapport.
+    Sans rapport demandé, la mémoire utilisée ne dépend pas du nombre de fichiers
+    (mode surveillance, très grandes arborescences).
+    """
+    def __init__(self, rows=True):
+        self.started = time.perf_counter()
+        self.counters = collections.Counter()
+        self.histograms = collections.defaultdict(StageStats)
+        self.rows = [] if rows else None
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].add(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Mesure une étape exécutée dans le processus principal (parcours, manifeste)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed_iter(self, name, iterable):
+        """Itère sur iterable en mesurant le temps passé à obtenir chaque élément"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def add_result(self, result, rel_path):
+        """Enregistre le résultat d'un fichier (FileResult) et ses durées par étape"""
+        if not result.success:
+            status = "erreur"
+        elif result.rejected:
+            status = "conservé"
+        else:
+            status = "compressé"
+        file_type = os.path.splitext(result.file_path)[1].lower().lstrip(".")
+
+        self.count(f"fichiers.{status}")
+        self.count(f"type.{file_type}")
+        if result.method:
+            self.count(f"methode.{result.method}")
+        self.count("octets.avant", result.initial_size)
+        self.count("octets.après", result.final_size if result.success else result.initial_size)
+
+        self.observe("total", result.elapsed)
+        for stage, seconds in result.stages.items():
+            self.observe(stage, seconds)
+
+        if self.rows is None:
+            return
+        self.rows.append({
+            "path": rel_path,
+            "type": file_type,
+            "status": status,
+            "method": result.method,
+            "initial_size": result.initial_size,
+            "final_size": result.final_size if result.success else result.initial_size,
+            "elapsed_ms": round(result.elapsed * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in result.stages.items()},
+            "errors": " | ".join(result.messages),
+        })
+
+    def summary(self):
+        """Compteurs et statistiques (nombre, total, p50, p95, max en ms) de chaque étape"""
+        stages = {}
+        for stage, stats in self.histograms.items():
+            stages[stage] = {
+                "count": stats.count,
+                "total_ms": round(stats.total * 1000, 1),
+                "p50_ms": round(stats.percentile(50) * 1000, 2),
+                "p95_ms": round(stats.percentile(95) * 1000, 2),
+                "max_ms": round(stats.max * 1000, 2),
+            }
+        return {
+            "wall_time_s": round(time.perf_counter() - self.started, 3),
+            "counters": dict(self.counters),
+            "stages": stages,
+        }
+
+    def write(self, path):
+        """Écrit le rapport : CSV (une ligne par fichier) si l'extension est .csv, JSON sinon"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.lower().endswith(".csv"):
+            self.write_csv(path)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": REPORT_VERSION, "run": self.summary(), "files": self.rows or []},
+                    f, ensure_ascii=False, indent=1
+                )
+
+    def write_csv(self, path):
+        columns = ["path", "type", "status", "method", "initial_size", "final_size", "elapsed_ms"]
+        columns += [f"{stage}_ms" for stage in STAGES if stage not in ("walk", "manifest")]
+        columns.append("errors")
+        # utf-8-sig : le fichier s'ouvre correctement dans Excel (accents des noms de fichiers)
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, delimiter=";")
+            writer.writeheader()
+            for row in self.rows or []:
+                line = {key: value for key, value in row.items() if key != "stages_ms"}
+                for stage, milliseconds in row["stages_ms"].items():
+                    line[f"{stage}_ms"] = milliseconds
+                writer.writerow(line)
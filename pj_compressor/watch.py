@@ -0,0 +1,245 @@
+"""
+Mode surveillance : les fichiers déposés dans le dossier source (scanners, import
+des courriels) sont compressés au fil de l'eau par le moteur de compress_tree,
+sans reparcourir l'arborescence.
+
+Sous Linux, les modifications sont signalées par inotify ; ailleurs, seuls les
+dossiers dont la date de modification a changé sont relus à intervalle régulier.
+Un fichier n'est traité qu'une fois sa taille et sa date stables pendant quelques
+secondes, pour ne pas lire un fichier en cours d'écriture.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from .compressors import IMAGE_EXTENSIONS, PDF_EXTENSIONS, TEMP_PREFIX
+from .engine import compress_tree
+
+# Délai (secondes) pendant lequel un fichier doit rester inchangé avant d'être traité
+SETTLE_SECONDS = 2.0
+# Intervalle entre deux vérifications (attente inotify, ou relecture des dossiers sans inotify)
+POLL_INTERVAL = 1.0
+
+# Événements inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_candidate(name):
+    """Indique si un nom de fichier correspond à une pièce jointe à compresser"""
+    return name.lower().endswith(IMAGE_EXTENSIONS + PDF_EXTENSIONS) and not name.startswith(TEMP_PREFIX)
+
+
+class InotifyWatcher:
+    """
+    Surveillance d'une arborescence par inotify (Linux) : un abonnement par dossier,
+    ajouté dès la création d'un sous-dossier
+    """
+    def __init__(self, source, exclude=()):
+        self.excluded = {os.path.abspath(path) for path in exclude}
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        # Numéro d'abonnement → dossier surveillé
+        self.directories = {}
+        self.initial = []
+        self.add_tree(source, self.initial)
+
+    def add_tree(self, root, found):
+        """Surveille root et ses sous-dossiers ; les fichiers qu'ils contiennent déjà sont ajoutés à found"""
+        pending_dirs = [root]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            if os.path.abspath(directory) in self.excluded:
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                # Dossier supprimé entre-temps ou limite d'abonnements atteinte
+                if ctypes.get_errno() == errno.ENOSPC:
+                    raise OSError(errno.ENOSPC, "limite de surveillance inotify atteinte (fs.inotify.max_user_watches)")
+                continue
+            self.directories[wd] = directory
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending_dirs.append(entry.path)
+                        elif is_candidate(entry.name):
+                            found.append(entry.path)
+            except OSError:
+                continue
+
+    def changes(self, timeout):
+        """Fichiers créés ou modifiés depuis le dernier appel (attend au plus timeout secondes)"""
+        changed, self.initial = self.initial, []
+        if changed:
+            return changed
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # File d'événements du noyau saturée : les dossiers surveillés sont relus
+                for directory in list(self.directories.values()):
+                    self.add_tree(directory, changed)
+            elif mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                self.directories.pop(wd, None)
+            elif wd in self.directories and name:
+                path = os.path.join(self.directories[wd], name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.add_tree(path, changed)
+                elif is_candidate(name):
+                    changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Surveillance sans inotify : à chaque vérification, seuls les dossiers dont
+    la date de modification a changé (fichier ajouté, renommé ou supprimé) sont relus.
+    Un fichier en cours d'écriture est suivi jusqu'à ce qu'il soit stable.
+    """
+    def __init__(self, source, exclude=()):
+        self.excluded = {os.path.abspath(path) for path in exclude}
+        # Dossier → date de modification lors de sa dernière lecture
+        self.directories = {}
+        self.initial = []
+        self.scan(source, self.initial)
+
+    def scan(self, root, found):
+        pending_dirs = [root]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            if os.path.abspath(directory) in self.excluded:
+                continue
+            try:
+                self.directories[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path not in self.directories:
+                                pending_dirs.append(entry.path)
+                        elif is_candidate(entry.name):
+                            found.append(entry.path)
+            except OSError:
+                self.directories.pop(directory, None)
+
+    def changes(self, timeout):
+        changed, self.initial = self.initial, []
+        if changed:
+            return changed
+        time.sleep(timeout)
+        for directory, mtime_ns in list(self.directories.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                del self.directories[directory]
+                continue
+            if current != mtime_ns:
+                self.scan(directory, changed)
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(source, exclude=(), polling=False):
+    """inotify sous Linux si disponible, relecture des dossiers modifiés sinon"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(source, exclude)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(source, exclude)
+
+
+def settled_files(watcher, stop, settle=SETTLE_SECONDS, interval=POLL_INTERVAL):
+    """
+    Renvoie (chemin, stat) pour chaque fichier resté inchangé pendant settle secondes,
+    jusqu'à ce que stop() soit vrai. None est renvoyé à chaque vérification sans
+    fichier prêt, pour que le moteur publie les résultats déjà obtenus.
+    Les fichiers déjà traités sont reconnus par le manifeste de compress_tree.
+    """
+    # Chemin → (taille, date de modification, instant de la dernière modification constatée)
+    pending = {}
+    while not stop():
+        for path in watcher.changes(interval if not pending else min(interval, settle / 2)):
+            pending.setdefault(path, None)
+
+        now = time.monotonic()
+        ready = []
+        for path, previous in list(pending.items()):
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                # Fichier supprimé ou renommé avant d'être stable
+                del pending[path]
+                continue
+            current = (file_stat.st_size, file_stat.st_mtime_ns)
+            if previous is None or previous[:2] != current:
+                pending[path] = current + (now,)
+            elif now - previous[2] >= settle:
+                del pending[path]
+                ready.append((path, file_stat))
+
+        if not ready:
+            yield None
+        for item in sorted(ready, key=lambda item: item[0]):
+            yield item
+
+
+def watch_tree(source, destination=None, log=print, stop=None, settle=SETTLE_SECONDS,
+               interval=POLL_INTERVAL, polling=False, **options):
+    """
+    Compresse en continu les fichiers déposés dans le dossier source, avec le moteur
+    et les options de compress_tree (niveau, processus, conversion des PNG...).
+    Les fichiers déjà présents sont traités au démarrage s'ils ne figurent pas au manifeste.
+    stop : fonction sans argument ; la surveillance s'arrête dès qu'elle renvoie vrai,
+    après la fin des compressions en cours. Renvoie le RunSummary de la session.
+    """
+    if not os.path.isdir(source):
+        raise ValueError(f"Dossier source introuvable: {source}")
+    stop = stop or (lambda: False)
+    exclude = [destination] if destination else []
+    watcher = create_watcher(source, exclude, polling)
+    log(f"Surveillance du dossier {source} ({'inotify' if isinstance(watcher, InotifyWatcher) else 'relecture périodique'})")
+    try:
+        return compress_tree(
+            source, destination, log=log,
+            files=settled_files(watcher, stop, settle, interval), **options
+        )
+    finally:
+        watcher.close()
+        log("Surveillance arrêtée.")
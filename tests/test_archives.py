@@ -0,0 +1,163 @@
+"""
+Archives ZIP et tar en source et en destination
+"""
+import io
+import os
+import random
+import tarfile
+import zipfile
+
+import pytest
+
+from pj_compressor import compress_tree
+from pj_compressor.archives import ArchiveWriter, archive_type, safe_member_name
+
+
+def quiet(message):
+    pass
+
+
+def photo_png():
+    """PNG sans transparence au contenu photographique : converti en JPEG avec --convert-png jpeg"""
+    from PIL import Image
+
+    generator = random.Random(1)
+    img = Image.new("RGB", (200, 150))
+    img.putdata([
+        (generator.randrange(256), (x * 3) % 256, (y * 5) % 256)
+        for y in range(150) for x in range(200)
+    ])
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def jpeg():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (10, 120, 200)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def write_tar(path, members):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1700000000
+            info.mode = 0o640
+            info.uid, info.gid = 1234, 5678
+            info.uname, info.gname = "compta", "finance"
+            archive.addfile(info, io.BytesIO(data))
+
+
+def tar_members(path):
+    with tarfile.open(path) as archive:
+        return {member.name: member for member in archive.getmembers()}
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("factures/2024/a.pdf", "factures/2024/a.pdf"),
+    ("./factures//a.pdf", "factures/a.pdf"),
+    ("factures\\a.pdf", "factures/a.pdf"),
+    ("../a.pdf", None),
+    ("factures/../../a.pdf", None),
+    ("/etc/passwd", None),
+    ("C:/a.pdf", None),
+    ("", None),
+])
+def test_safe_member_name(name, expected):
+    assert safe_member_name(name) == expected
+
+
+def test_archive_type():
+    assert archive_type("export.ZIP") == "zip"
+    assert archive_type("export.tar.gz") == "tar"
+    assert archive_type("export.tgz") == "tar"
+    assert archive_type("dossier") is None
+
+
+def test_writer_refuses_duplicate_names(tmp_path):
+    path = str(tmp_path / "sortie.zip")
+    writer = ArchiveWriter(path)
+    assert writer.add("a.txt", b"1", {"mtime": 1700000000})
+    assert not writer.add("a.txt", b"2", {"mtime": 1700000000})
+    writer.close()
+    with zipfile.ZipFile(path) as archive:
+        assert archive.namelist() == ["a.txt"]
+        assert archive.read("a.txt") == b"1"
+
+
+def test_png_converted_without_name_collision(tmp_path):
+    source = str(tmp_path / "source.tar.gz")
+    write_tar(source, {"scans/a.png": photo_png()})
+    destination = str(tmp_path / "sortie.tar.gz")
+
+    compress_tree(source, destination, workers=1, convert_png="jpeg", log=quiet)
+
+    assert list(tar_members(destination)) == ["scans/a.jpg"]
+
+
+@pytest.mark.parametrize("destination_name", ["sortie.tar.gz", "sortie.zip"])
+def test_png_not_converted_onto_existing_member(tmp_path, destination_name):
+    source = str(tmp_path / "source.tar.gz")
+    write_tar(source, {"scans/a.png": photo_png(), "scans/a.jpg": jpeg()})
+    destination = str(tmp_path / destination_name)
+
+    summary = compress_tree(source, destination, workers=1, convert_png="jpeg", log=quiet)
+
+    if destination_name.endswith(".zip"):
+        with zipfile.ZipFile(destination) as archive:
+            names = archive.namelist()
+    else:
+        names = [member.name for member in tarfile.open(destination).getmembers()]
+    assert sorted(names) == ["scans/a.jpg", "scans/a.png"]
+    assert summary.failed == 0
+
+
+def test_directory_source_keeps_other_files(tmp_path):
+    source = tmp_path / "pieces"
+    (source / "2024").mkdir(parents=True)
+    (source / "2024" / "a.png").write_bytes(photo_png())
+    (source / "2024" / "a.jpg").write_bytes(jpeg())
+    (source / "lisezmoi.txt").write_text("à conserver")
+    (source / "export.xml").write_text("<export/>")
+    # Archive destination dans le dossier source : elle n'est pas ajoutée à elle-même
+    destination = str(source / "pieces.zip")
+
+    compress_tree(str(source), destination, workers=1, convert_png="jpeg", log=quiet)
+    compress_tree(str(source), destination, workers=1, convert_png="jpeg", log=quiet)
+
+    with zipfile.ZipFile(destination) as archive:
+        assert sorted(archive.namelist()) == ["2024/a.jpg", "2024/a.png", "export.xml", "lisezmoi.txt"]
+        assert archive.read("lisezmoi.txt").decode("utf-8") == "à conserver"
+    assert not [name for name in os.listdir(source) if name.startswith(".pj_")]
+
+
+def test_tar_keeps_member_attributes(tmp_path):
+    source = str(tmp_path / "source.tar.gz")
+    write_tar(source, {"factures/a.png": photo_png(), "factures/notes.txt": b"notes"})
+    destination = str(tmp_path / "sortie.tar.xz")
+
+    compress_tree(source, destination, workers=1, log=quiet)
+
+    members = tar_members(destination)
+    assert sorted(members) == ["factures/a.png", "factures/notes.txt"]
+    for member in members.values():
+        assert (member.mode, member.uid, member.gid) == (0o640, 1234, 5678)
+        assert (member.uname, member.gname) == ("compta", "finance")
+        assert member.mtime == 1700000000
+
+
+def test_unsafe_member_names_are_skipped(tmp_path):
+    source = str(tmp_path / "source.zip")
+    with zipfile.ZipFile(source, "w") as archive:
+        archive.writestr("../evil.txt", b"x")
+        archive.writestr("ok/notes.txt", b"notes")
+    destination = tmp_path / "sortie"
+
+    compress_tree(source, str(destination), workers=1, log=quiet)
+
+    assert os.listdir(destination) == ["ok"]
+    assert not (tmp_path / "evil.txt").exists()
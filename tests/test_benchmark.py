@@ -0,0 +1,20 @@
+"""
+Banc d'essai : corpus réutilisé d'une mesure à l'autre
+"""
+import os
+
+from pj_compressor.benchmark import CORPUS_INDEX, generate_corpus, load_corpus
+
+
+def test_existing_corpus_is_reused(tmp_path):
+    directory = str(tmp_path / "corpus")
+    assert load_corpus(directory) is None
+
+    corpus = generate_corpus(directory)
+
+    assert load_corpus(directory) == corpus
+    assert load_corpus(directory, seed=1) is None
+    assert load_corpus(directory, scale=2) is None
+    os.remove(corpus["photo"][0])
+    assert load_corpus(directory) is None
+    assert os.path.exists(os.path.join(directory, CORPUS_INDEX))
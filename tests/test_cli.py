@@ -0,0 +1,65 @@
+"""
+Ligne de commande et import du paquet sans Tk
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pj_compressor.cli import main, parse_level, parse_size
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("500", 500), ("500K", 500 * 1024), ("1.5Mo", int(1.5 * 1024 * 1024)), ("2g", 2 * 1024 ** 3),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "abc", "-1M", "0", "5T"])
+def test_parse_size_rejects_invalid_values(value):
+    with pytest.raises(Exception):
+        parse_size(value)
+
+
+def test_parse_level_accepts_the_name_without_accent():
+    assert parse_level("legere") == "légère"
+    assert parse_level("forte") == "forte"
+
+
+def test_package_imports_without_tk_or_pillow():
+    code = (
+        "import sys, pj_compressor, pj_compressor.cli; "
+        "print(sorted(name for name in ('tkinter', 'PIL', 'PyPDF2') if name in sys.modules))"
+    )
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert completed.stdout.strip() == "[]"
+
+
+def test_compress_a_folder(tmp_path, capsys):
+    from PIL import Image
+
+    source = tmp_path / "source"
+    source.mkdir()
+    Image.new("RGB", (300, 200), (250, 250, 250)).save(source / "facture.png", compress_level=0)
+
+    assert main([str(source), str(tmp_path / "copie"), "--workers", "1", "--quiet"]) == 0
+
+    assert os.path.getsize(tmp_path / "copie" / "facture.png") < os.path.getsize(source / "facture.png")
+    assert "Compression terminée" in capsys.readouterr().out
+
+
+def test_destination_or_in_place_is_required(tmp_path):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path)])
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), str(tmp_path / "copie"), "--in-place"])
+
+
+def test_missing_source_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(tmp_path / "absent"), str(tmp_path / "copie")])
+    assert exit_info.value.code == 2
+    assert "introuvable" in capsys.readouterr().err
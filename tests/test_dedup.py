@@ -0,0 +1,98 @@
+"""
+Fichiers identiques compressés une seule fois
+"""
+import os
+
+from pj_compressor import compress_tree, dedup
+from pj_compressor.dedup import DuplicateIndex, Outcome
+from pj_compressor.engine import FileResult
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path), os.stat(path)
+
+
+def test_duplicates_grouped_by_content(tmp_path):
+    index = DuplicateIndex()
+    facture = write(tmp_path / "a" / "facture.pdf", b"facture 1")
+    copie = write(tmp_path / "b" / "facture.pdf", b"facture 1")
+    autre = write(tmp_path / "c" / "facture.pdf", b"facture 2")
+
+    assert index.find(*facture) is None
+    assert index.find(*copie) == (facture[0], None)
+    # Même taille, contenu différent
+    assert index.find(*autre) is None
+    assert index.count == 1
+
+
+def test_original_changed_since_discovery_is_not_a_duplicate(tmp_path):
+    index = DuplicateIndex()
+    facture = write(tmp_path / "facture.pdf", b"facture 1")
+    assert index.find(*facture) is None
+
+    (tmp_path / "facture.pdf").write_bytes(b"facture 22")
+    os.utime(tmp_path / "facture.pdf", ns=(1, 1))
+
+    assert index.find(*write(tmp_path / "copie.pdf", b"facture 1")) is None
+
+
+def processed(index, path, success=True):
+    result = FileResult(path, path + ".sortie")
+    result.success = success
+    index.processed(result)
+
+
+def test_only_the_outcome_of_originals_is_kept(tmp_path):
+    index = DuplicateIndex()
+    facture = write(tmp_path / "a" / "facture.pdf", b"facture 1")
+    index.find(*facture)
+    processed(index, facture[0])
+
+    original, outcome = index.find(*write(tmp_path / "b" / "facture.pdf", b"facture 1"))
+
+    assert original == facture[0]
+    assert isinstance(outcome, Outcome)
+    assert outcome.dest_path == facture[0] + ".sortie"
+    assert not index.pending
+    assert index.indexed == 1
+
+
+def test_failed_original_is_forgotten(tmp_path):
+    index = DuplicateIndex()
+    facture = write(tmp_path / "a" / "facture.pdf", b"facture 1")
+    index.find(*facture)
+    processed(index, facture[0], success=False)
+
+    assert index.find(*write(tmp_path / "b" / "facture.pdf", b"facture 1")) is None
+    assert index.indexed == 1
+
+
+def test_index_size_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "MAX_INDEXED_FILES", 10)
+    index = DuplicateIndex()
+    for count in range(50):
+        path, file_stat = write(tmp_path / f"{count}.pdf", b"x" * (count + 1))
+        index.find(path, file_stat)
+        processed(index, path)
+
+    assert index.indexed <= 10
+    assert sum(len(group) for group in index.sizes.values()) == index.indexed
+
+
+def test_duplicate_receives_the_compressed_file(tmp_path):
+    from PIL import Image
+
+    source = tmp_path / "source"
+    (source / "2023").mkdir(parents=True)
+    (source / "2024").mkdir()
+    Image.new("RGB", (200, 200), (200, 30, 30)).save(source / "2023" / "logo.png", compress_level=0)
+    (source / "2024" / "logo.png").write_bytes((source / "2023" / "logo.png").read_bytes())
+    destination = tmp_path / "copie"
+
+    summary = compress_tree(str(source), str(destination), workers=1, dedup="copy", log=lambda message: None)
+
+    assert summary.total == 2
+    assert (destination / "2023" / "logo.png").read_bytes() == (destination / "2024" / "logo.png").read_bytes()
+    assert os.path.getsize(destination / "2024" / "logo.png") < os.path.getsize(source / "2024" / "logo.png")
@@ -0,0 +1,95 @@
+"""
+Cache des sondes de dépendances (Ghostscript, bibliothèques Python)
+"""
+import os
+import sys
+
+import pytest
+
+from pj_compressor import dependencies
+
+
+@pytest.fixture
+def fake_gs(tmp_path, monkeypatch):
+    """Exécutable gs factice qui note chacun de ses lancements"""
+    if sys.platform == "win32":
+        pytest.skip("script shell")
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    calls = tmp_path / "appels"
+    script = bin_dir / "gs"
+
+    def install(version):
+        script.write_text(f"#!/bin/sh\necho appel >> '{calls}'\necho {version}\n")
+        script.chmod(0o755)
+
+    install("10.02.1")
+    monkeypatch.setattr(dependencies, "GHOSTSCRIPT_EXECUTABLES", ("gs",))
+    monkeypatch.setattr(dependencies, "PROBE_CACHE", str(tmp_path / "cache" / "dependances.json"))
+    monkeypatch.setenv("PATH", str(bin_dir))
+
+    def count():
+        return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+    return install, count
+
+
+def test_ghostscript_version_is_reused_until_gs_changes(fake_gs):
+    install, count = fake_gs
+
+    assert dependencies.detect_ghostscript() == ("gs", "10.02.1")
+    assert count() == 1
+    # Lancement suivant : version lue dans le cache, sans exécuter gs
+    assert dependencies.detect_ghostscript() == ("gs", "10.02.1")
+    assert count() == 1
+
+    # Mise à jour de Ghostscript : taille et date de l'exécutable différentes
+    install("10.03.0-mise-a-jour")
+    assert dependencies.detect_ghostscript() == ("gs", "10.03.0-mise-a-jour")
+    assert count() == 2
+
+
+def test_ghostscript_info_probes_once_per_process(fake_gs, monkeypatch):
+    _, count = fake_gs
+    monkeypatch.setattr(dependencies, "_ghostscript_probe", dependencies._NOT_PROBED)
+    detections = []
+    detect = dependencies.detect_ghostscript
+    monkeypatch.setattr(dependencies, "detect_ghostscript", lambda: detections.append(1) or detect())
+
+    assert dependencies.ghostscript_info().version == "10.02.1"
+    assert dependencies.ghostscript_info().version == "10.02.1"
+    assert len(detections) == 1
+    assert dependencies.ghostscript_info(refresh=True).version == "10.02.1"
+    assert len(detections) == 2
+    assert count() == 1
+
+
+def test_unreadable_cache_is_ignored(fake_gs):
+    _, count = fake_gs
+    os.makedirs(os.path.dirname(dependencies.PROBE_CACHE))
+    with open(dependencies.PROBE_CACHE, "w") as f:
+        f.write("{ cache tronqué")
+
+    assert dependencies.detect_ghostscript() == ("gs", "10.02.1")
+    assert count() == 1
+
+
+def test_library_probe_is_cached_until_the_module_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(dependencies, "PROBE_CACHE", str(tmp_path / "dependances.json"))
+    module = tmp_path / "module_sonde.py"
+    module.write_text("VALEUR = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    searches = []
+    find_spec = dependencies.importlib.util.find_spec
+    monkeypatch.setattr(dependencies.importlib.util, "find_spec", lambda name: searches.append(name) or find_spec(name))
+
+    assert dependencies.is_library_installed("module_sonde")
+    assert dependencies.is_library_installed("module_sonde")
+    assert searches == ["module_sonde"]
+
+    module.write_text("VALEUR = 2  # module mis à jour\n")
+    assert dependencies.is_library_installed("module_sonde")
+    assert searches == ["module_sonde", "module_sonde"]
+
+    module.unlink()
+    assert not dependencies.is_library_installed("module_sonde")
@@ -0,0 +1,177 @@
+"""
+Moteur de compression : erreurs par fichier, seuils de gain
+"""
+import os
+
+import pytest
+
+from pj_compressor import compress_tree
+from pj_compressor.engine import (
+    COMPRESSION_SETTINGS, ParallelEngine, SerialEngine, create_engine, is_worth_saving, process_file,
+)
+
+
+def quiet(message):
+    pass
+
+
+def scans(folder, count):
+    """Scans PNG de contenus différents"""
+    from PIL import Image
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for index in range(count):
+        img = Image.new("RGB", (120, 90), (255, 255, 255))
+        img.paste((index * 20, 40, 200 - index * 10), (10, 10, 60 + index * 5, 50))
+        img.save(folder / f"scan{index:02}.png", compress_level=0)
+    return sorted(str(path) for path in folder.iterdir())
+
+
+def test_create_engine():
+    settings = COMPRESSION_SETTINGS["moyenne"]
+    assert isinstance(create_engine(settings, 1), SerialEngine)
+    engine = create_engine(settings, 3)
+    assert isinstance(engine, ParallelEngine)
+    assert engine.workers == 3
+
+
+def test_parallel_engine_returns_results_in_order(tmp_path):
+    sources = scans(tmp_path / "source", 12)
+    jobs = [(path, str(tmp_path / "copie" / os.path.basename(path)), None) for path in sources]
+    os.makedirs(tmp_path / "copie")
+
+    results = list(ParallelEngine(COMPRESSION_SETTINGS["moyenne"], 2).run(iter(jobs)))
+
+    assert [result.file_path for result in results] == sources
+    assert all(result.success for result in results)
+    assert all(os.path.exists(result.dest_path) for result in results)
+
+
+def test_parallel_and_serial_runs_give_the_same_files(tmp_path):
+    scans(tmp_path / "source" / "2024", 6)
+
+    for workers in (1, 2):
+        summary = compress_tree(str(tmp_path / "source"), str(tmp_path / f"copie{workers}"), workers=workers, log=quiet)
+        assert summary.processed == 6 and summary.failed == 0
+
+    for name in os.listdir(tmp_path / "source" / "2024"):
+        serial = (tmp_path / "copie1" / "2024" / name).read_bytes()
+        assert (tmp_path / "copie2" / "2024" / name).read_bytes() == serial
+
+
+@pytest.mark.parametrize("initial, output, settings, expected", [
+    (1000, 999, {}, True),
+    (1000, 1000, {}, False),
+    (1000, 1200, {}, False),
+    (1000, 900, {"min_saving_bytes": 100}, True),
+    (1000, 901, {"min_saving_bytes": 100}, False),
+    (1000, 900, {"min_saving_percent": 10}, True),
+    (1000, 901, {"min_saving_percent": 10}, False),
+])
+def test_is_worth_saving(initial, output, settings, expected):
+    assert is_worth_saving(initial, output, settings) is expected
+
+
+def test_missing_file_is_a_failed_result(tmp_path):
+    file_path = str(tmp_path / "disparu.png")
+    result = process_file(file_path, str(tmp_path / "copie" / "disparu.png"), COMPRESSION_SETTINGS["moyenne"])
+    assert not result.success
+    assert "disparu.png" in result.messages[0]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".pj_")]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_file_removed_after_discovery_does_not_stop_the_run(tmp_path, workers):
+    from PIL import Image
+
+    source = tmp_path / "source"
+    source.mkdir()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(source / "a.png")
+    Image.new("RGB", (64, 64), (30, 200, 30)).save(source / "b.png")
+    # Fichier signalé par la surveillance puis supprimé avant son traitement
+    files = [
+        (str(source / "a.png"), os.stat(source / "a.png")),
+        (str(source / "disparu.png"), os.stat(source / "a.png")),
+        (str(source / "b.png"), os.stat(source / "b.png")),
+    ]
+
+    summary = compress_tree(str(source), str(tmp_path / "copie"), workers=workers, files=iter(files), log=quiet)
+
+    assert summary.total == 3
+    assert summary.failed == 1
+    assert sorted(name for name in os.listdir(tmp_path / "copie") if not name.startswith(".")) == ["a.png", "b.png"]
+
+
+def test_copy_mode_leaves_the_source_untouched(tmp_path):
+    source = tmp_path / "source"
+    paths = scans(source / "sous-dossier", 3)
+    before = {path: (os.path.getsize(path), os.stat(path).st_mtime_ns) for path in paths}
+    os.utime(paths[0], ns=(1_000_000_000, 1_000_000_000))
+    before[paths[0]] = (os.path.getsize(paths[0]), 1_000_000_000)
+
+    summary = compress_tree(str(source), str(tmp_path / "copie"), workers=1, log=quiet)
+
+    assert summary.processed == 3
+    assert {path: (os.path.getsize(path), os.stat(path).st_mtime_ns) for path in paths} == before
+    copy = tmp_path / "copie" / "sous-dossier"
+    assert sorted(os.listdir(copy)) == sorted(os.path.basename(path) for path in paths)
+    for path in paths:
+        assert os.path.getsize(copy / os.path.basename(path)) < os.path.getsize(path)
+    assert os.stat(copy / os.path.basename(paths[0])).st_mtime_ns == 1_000_000_000
+    assert not [name for name in os.listdir(source / "sous-dossier") if name.startswith(".pj_")]
+
+
+@pytest.mark.parametrize("in_place", [False, True])
+def test_file_that_would_grow_is_kept_unchanged(tmp_path, in_place):
+    from PIL import Image
+
+    source = tmp_path / "source"
+    source.mkdir()
+    # JPEG déjà très compressé : le réencodage à la qualité du niveau le ferait grossir
+    img = Image.effect_noise((200, 150), 60).convert("RGB")
+    img.save(source / "photo.jpg", quality=10)
+    original = (source / "photo.jpg").read_bytes()
+    destination = None if in_place else str(tmp_path / "copie")
+
+    summary = compress_tree(str(source), destination, level="légère", workers=1, log=quiet)
+
+    assert summary.rejected == 1
+    assert summary.saved_space == 0
+    output = source / "photo.jpg" if in_place else tmp_path / "copie" / "photo.jpg"
+    assert output.read_bytes() == original
+
+
+def test_minimum_saving_rejects_small_gains(tmp_path):
+    source = tmp_path / "source"
+    paths = scans(source, 2)
+
+    summary = compress_tree(str(source), str(tmp_path / "copie"), workers=1, log=quiet, min_saving_percent=100)
+
+    assert summary.rejected == 2
+    for path in paths:
+        with open(path, "rb") as f:
+            assert (tmp_path / "copie" / os.path.basename(path)).read_bytes() == f.read()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_files_are_compressed_while_the_source_is_scanned(tmp_path, workers):
+    source = tmp_path / "source"
+    # Plus de fichiers que la fenêtre du moteur parallèle (4 par processus)
+    paths = scans(source, 12)
+    events = []
+
+    def walk():
+        for path in paths:
+            events.append("découvert")
+            yield path, os.stat(path)
+
+    def progress(processed, discovered, discovery_done):
+        events.append("fin" if discovery_done else "traité")
+
+    summary = compress_tree(str(source), str(tmp_path / "copie"), workers=workers, log=quiet,
+                            progress=progress, files=walk(), prefetch=0)
+
+    assert summary.processed == 12
+    # Le premier fichier est traité avant la fin du parcours
+    assert events.index("traité") < len(events) - 1 - events[::-1].index("découvert")
+    assert events[-1] == "fin"
@@ -0,0 +1,180 @@
+"""
+Pool de processus Ghostscript persistants
+"""
+import io
+import os
+import shutil
+import types
+
+import pytest
+
+from pj_compressor import ghostscript
+from pj_compressor.ghostscript import (
+    MAX_FAILURES_WITHOUT_SUCCESS, GhostscriptError, GhostscriptPool, GhostscriptWorker, ps_string,
+)
+
+requires_gs = pytest.mark.skipif(shutil.which("gs") is None, reason="Ghostscript n'est pas installé")
+
+
+def quiet(message):
+    pass
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("/tmp/facture.pdf", "(/tmp/facture.pdf)"),
+    ("factures (2024).pdf", "(factures \\(2024\\).pdf)"),
+    ("C:\\export\\a.pdf", "(C:\\\\export\\\\a.pdf)"),
+    ("reçu.pdf", "(re\\303\\247u.pdf)"),
+    ("a\nb", "(a\\012b)"),
+])
+def test_ps_string(text, expected):
+    assert ps_string(text) == expected
+
+
+class FakeProcess:
+    """Processus gs simulé : enregistre le programme reçu et renvoie les lignes prévues"""
+    def __init__(self, lines):
+        self.stdin = io.BytesIO()
+        self.stdout = io.BytesIO(b"".join(lines))
+
+    def poll(self):
+        return None
+
+
+def fake_worker(lines):
+    worker = GhostscriptWorker.__new__(GhostscriptWorker)
+    worker.marker = "PJ_test"
+    worker.idle_output = "/tmp/repos.pdf"
+    worker.process = FakeProcess(lines)
+    return worker
+
+
+def test_worker_waits_for_the_end_of_job_marker():
+    worker = fake_worker([b"Processing pages 1 through 1.\n", b"Page 1\n", b"PJ_test OK\n"])
+
+    worker.convert("/dossier/reçu (1).pdf", "/dossier/sortie.pdf")
+
+    program = worker.process.stdin.getvalue().decode("ascii")
+    assert "(/dossier/re\\303\\247u \\(1\\).pdf) run" in program
+    assert "/OutputFile (/tmp/repos.pdf)" in program
+
+
+@pytest.mark.parametrize("lines, error", [
+    ([b"PJ_test ERROR undefinedfilename\n"], "undefinedfilename"),
+    ([b"Page 1\n"], "interrompu"),
+])
+def test_worker_reports_failures(lines, error):
+    with pytest.raises(GhostscriptError, match=error):
+        fake_worker(lines).convert("/dossier/a.pdf", "/dossier/b.pdf")
+
+
+@pytest.fixture
+def fake_pool(tmp_path, monkeypatch):
+    """Pool dont les interpréteurs sont simulés ; la méthode un gs par fichier est enregistrée"""
+    calls = types.SimpleNamespace(started=0, fallback=[], fail=True)
+
+    class Worker:
+        def __init__(self, executable, preset, roots, scratch_dir):
+            calls.started += 1
+
+        alive = True
+
+        def convert(self, input_path, output_path):
+            if calls.fail:
+                raise GhostscriptError("rangecheck")
+            with open(output_path, "wb") as f:
+                f.write(b"%PDF-1.4 compresse")
+
+        def close(self):
+            pass
+
+    def compress_pdf_ghostscript(file_path, dpi=120, log=print, output_path=None):
+        calls.fallback.append(file_path)
+        return True
+
+    monkeypatch.setattr(ghostscript, "GhostscriptWorker", Worker)
+    monkeypatch.setattr(ghostscript, "compress_pdf_ghostscript", compress_pdf_ghostscript)
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1.4 original")
+    with GhostscriptPool([str(tmp_path)], types.SimpleNamespace(executable="gs")) as pool:
+        yield pool, calls
+
+
+def test_pool_falls_back_then_disables_itself(fake_pool, tmp_path):
+    pool, calls = fake_pool
+    source = str(tmp_path / "a.pdf")
+
+    for _ in range(MAX_FAILURES_WITHOUT_SUCCESS + 2):
+        assert pool.compress(source, 120, quiet, str(tmp_path / "b.pdf"))
+
+    # Un interpréteur relancé après chaque échec, puis plus aucun une fois le pool désactivé
+    assert calls.started == MAX_FAILURES_WITHOUT_SUCCESS
+    assert len(calls.fallback) == MAX_FAILURES_WITHOUT_SUCCESS + 2
+    assert not pool.enabled
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".pj_")]
+
+
+def test_pool_stays_enabled_after_a_success(fake_pool, tmp_path):
+    pool, calls = fake_pool
+    source = str(tmp_path / "a.pdf")
+    calls.fail = False
+    assert pool.compress(source, 120, quiet, str(tmp_path / "b.pdf"))
+    assert (tmp_path / "b.pdf").read_bytes() == b"%PDF-1.4 compresse"
+
+    calls.fail = True
+    for _ in range(MAX_FAILURES_WITHOUT_SUCCESS + 1):
+        pool.compress(source, 120, quiet, str(tmp_path / "b.pdf"))
+
+    assert pool.enabled
+    # Le premier échec survient dans l'interpréteur déjà lancé, chacun des suivants dans un nouveau
+    assert calls.started == 1 + MAX_FAILURES_WITHOUT_SUCCESS
+
+
+def test_files_outside_the_roots_use_one_gs_per_file(fake_pool, tmp_path_factory):
+    pool, calls = fake_pool
+    outside = tmp_path_factory.mktemp("ailleurs") / "a.pdf"
+    outside.write_bytes(b"%PDF-1.4")
+
+    pool.compress(str(outside), 120, quiet)
+
+    assert calls.started == 0
+    assert calls.fallback == [str(outside)]
+
+
+def scan_pdf(path):
+    from PIL import Image
+
+    Image.new("RGB", (1200, 1600), (230, 230, 230)).save(path, "PDF", resolution=150)
+
+
+@requires_gs
+def test_pool_compresses_several_files_with_one_interpreter(tmp_path):
+    from PyPDF2 import PdfReader
+
+    folder = tmp_path / "factures (été)"
+    folder.mkdir()
+    sources = [folder / "reçu 1.pdf", folder / "reçu (2).pdf"]
+    for source in sources:
+        scan_pdf(source)
+
+    with GhostscriptPool([str(tmp_path)]) as pool:
+        for source in sources:
+            output = str(source) + ".compressé.pdf"
+            assert pool.compress(str(source), 72, quiet, output)
+            assert len(PdfReader(output).pages) == 1
+        assert pool.successes == 2
+        assert pool.failures == 0
+        assert len(pool.workers) == 1
+
+
+@requires_gs
+def test_pool_recovers_from_an_invalid_pdf(tmp_path):
+    from PyPDF2 import PdfReader
+
+    (tmp_path / "abîmé.pdf").write_bytes(b"%PDF-1.4\nceci n'est pas un PDF")
+    scan_pdf(tmp_path / "scan.pdf")
+
+    with GhostscriptPool([str(tmp_path)]) as pool:
+        pool.compress(str(tmp_path / "abîmé.pdf"), 72, quiet, str(tmp_path / "sortie1.pdf"))
+        assert pool.compress(str(tmp_path / "scan.pdf"), 72, quiet, str(tmp_path / "sortie2.pdf"))
+
+    assert len(PdfReader(str(tmp_path / "sortie2.pdf")).pages) == 1
@@ -0,0 +1,84 @@
+"""
+Interface graphique : événements appliqués par lots depuis le thread Tk
+(ignoré sans tkinter ni affichage)
+"""
+import os
+import runpy
+import time
+
+import pytest
+
+from pj_compressor import dependencies
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Compression v2.py")
+
+
+def display_available():
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+    except Exception:
+        return False
+    return True
+
+
+requires_display = pytest.mark.skipif(not display_available(), reason="tkinter ou affichage indisponible")
+
+
+@pytest.fixture
+def start_app(monkeypatch, tmp_path):
+    """Lance le script sans boucle principale ; la vérification des dépendances renvoie available"""
+    import tkinter
+    from tkinter import messagebox
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(tkinter.Tk, "mainloop", lambda self, n=0: None)
+    errors = []
+    monkeypatch.setattr(messagebox, "showerror", lambda *args, **kwargs: errors.append(args))
+    roots = []
+
+    def start(available=True):
+        monkeypatch.setattr(dependencies, "check_and_install_libraries", lambda log=print: available)
+        script = runpy.run_path(SCRIPT, run_name="__main__")
+        app = script["app"]
+        roots.append(app.root)
+        # Résultat de la vérification en arrière-plan
+        deadline = time.monotonic() + 5
+        while app.dependencies_ok != available or (not available and not errors):
+            assert time.monotonic() < deadline
+            app.process_events()
+            time.sleep(0.01)
+        return script, app
+
+    yield start
+    for root in roots:
+        root.destroy()
+
+
+@requires_display
+def test_events_are_applied_in_batches(start_app):
+    script, app = start_app()
+    max_lines = script["MAX_LOG_LINES"]
+
+    for index in range(max_lines + 500):
+        app.log(f"ligne {index}")
+    app.update_progress(1, 10, False)
+    app.update_progress(7, 10, True)
+    app.process_events()
+
+    lines = app.log_text.get("1.0", "end-1c").splitlines()
+    assert len(lines) == max_lines
+    assert lines[-1] == f"ligne {max_lines + 499}"
+    # Seul le dernier état d'avancement est affiché
+    assert app.status_var.get() == "7 / 10 fichiers traités"
+
+
+@requires_display
+@pytest.mark.parametrize("available", [True, False])
+def test_compress_button_follows_the_dependency_check(start_app, available):
+    _, app = start_app(available)
+
+    app.events.put(("done", None, None))
+    app.process_events()
+
+    assert str(app.compress_button["state"]) == ("normal" if available else "disabled")
@@ -0,0 +1,123 @@
+"""
+Choix de l'encodage des images
+"""
+import pytest
+
+from pj_compressor.compressors import compress_image
+from pj_compressor.engine import COMPRESSION_SETTINGS
+
+
+def quiet(message):
+    pass
+
+
+def gradient_16bit(path, width=512, height=64):
+    """Scan en niveaux de gris sur 16 bits : dégradé horizontal du noir au blanc"""
+    from PIL import Image
+
+    img = Image.new("I;16", (width, height))
+    img.putdata([x * 65535 // (width - 1) for x in range(width)] * height)
+    img.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("level, convert_png", [
+    ("légère", None), ("moyenne", None), ("forte", None), ("moyenne", "jpeg"),
+])
+def test_16bit_png_keeps_its_gray_levels(tmp_path, level, convert_png):
+    from PIL import Image
+
+    settings = COMPRESSION_SETTINGS[level]
+    source = gradient_16bit(tmp_path / "scan.png")
+
+    written = compress_image(
+        source, settings["image_quality"], quiet, str(tmp_path / "sortie.png"),
+        settings["image_max_dimension"], settings["png_colors"], settings["image_bilevel"], convert_png,
+    )
+
+    with Image.open(written) as img:
+        if img.mode.startswith("I"):
+            img = img.convert("I").point(lambda value: value / 256)
+        gray = img.convert("L")
+        # Dégradé conservé : sombre à gauche, clair à droite, gris moyen au centre
+        assert gray.getpixel((0, 0)) < 16
+        assert gray.getpixel((511, 0)) > 240
+        assert 100 < gray.getpixel((256, 0)) < 156
+
+
+@pytest.mark.parametrize("image_format, extension", [("JPEG", ".jpg"), ("PNG", ".png")])
+def test_large_image_is_downscaled_with_its_resolution(tmp_path, image_format, extension):
+    from PIL import Image
+
+    source = str(tmp_path / ("scan" + extension))
+    Image.new("RGB", (2400, 1600), (200, 180, 160)).save(source, image_format, dpi=(300, 300))
+
+    written = compress_image(source, 75, quiet, str(tmp_path / ("sortie" + extension)), max_dimension=1200)
+
+    with Image.open(written) as img:
+        assert img.size == (1200, 800)
+        # Même taille physique : la résolution est divisée comme les dimensions
+        assert [round(value) for value in img.info["dpi"]] == [150, 150]
+
+
+def test_large_jpeg_is_decoded_in_draft_mode(tmp_path, monkeypatch):
+    from PIL import Image, JpegImagePlugin
+
+    decoded = []
+    draft = JpegImagePlugin.JpegImageFile.draft
+
+    def recorded_draft(img, mode, size):
+        result = draft(img, mode, size)
+        decoded.append(img.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", recorded_draft)
+    source = str(tmp_path / "photo.jpg")
+    Image.new("RGB", (4000, 3000), (90, 120, 150)).save(source)
+
+    written = compress_image(source, 75, quiet, str(tmp_path / "sortie.jpg"), max_dimension=900)
+
+    # Décodage au 1/4 (plus petite échelle au-dessus de la cible), puis rééchantillonnage
+    assert decoded == [(1000, 750)]
+    with Image.open(written) as img:
+        assert img.size == (900, 675)
+
+
+def photo(size=(300, 200)):
+    """Image à la texture de photo, que la conversion en JPEG réduit nettement"""
+    from PIL import Image
+
+    return Image.merge("RGB", [Image.effect_noise(size, sigma) for sigma in (30, 40, 50)])
+
+
+def test_gray_scan_is_stored_as_grayscale(tmp_path):
+    from PIL import Image
+
+    source = str(tmp_path / "scan.png")
+    Image.effect_noise((200, 150), 40).convert("RGB").save(source)
+
+    written = compress_image(source, 75, quiet, str(tmp_path / "sortie.png"))
+
+    with Image.open(written) as img:
+        assert img.mode == "L"
+
+
+@pytest.mark.parametrize("convert_png, extension", [("jpeg", ".jpg"), ("webp", ".webp")])
+def test_png_conversion_changes_the_extension(tmp_path, convert_png, extension):
+    source = str(tmp_path / "photo.png")
+    photo().save(source)
+
+    written = compress_image(source, 75, quiet, str(tmp_path / "sortie.png"), convert_png=convert_png)
+
+    assert written == str(tmp_path / ("sortie" + extension))
+
+
+def test_transparent_png_is_not_converted(tmp_path):
+    source = str(tmp_path / "logo.png")
+    img = photo().convert("RGBA")
+    img.putalpha(128)
+    img.save(source)
+
+    written = compress_image(source, 75, quiet, str(tmp_path / "sortie.png"), convert_png="jpeg")
+
+    assert written == str(tmp_path / "sortie.png")
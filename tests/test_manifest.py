@@ -0,0 +1,147 @@
+"""
+Manifeste et journal : reprise d'une exécution interrompue
+"""
+import os
+
+import pytest
+
+from pj_compressor import compress_tree, interrupted_run
+from pj_compressor.engine import remove_temp_files
+from pj_compressor.manifest import JOURNAL_NAME, MANIFEST_NAME, Manifest
+
+
+class Interruption(Exception):
+    pass
+
+
+def interrupt_after(count):
+    """Rappel de progression qui interrompt l'exécution après count fichiers traités"""
+    def progress(processed, discovered, discovery_done):
+        if processed >= count:
+            raise Interruption()
+    return progress
+
+
+@pytest.fixture
+def source(tmp_path):
+    from PIL import Image
+
+    root = tmp_path / "source"
+    (root / "sous-dossier").mkdir(parents=True)
+    for index, name in enumerate(["a.png", "b.png", "sous-dossier/c.png", "sous-dossier/d.png"]):
+        Image.new("RGB", (64, 64), (index * 60, 100, 200)).save(root / name)
+    return str(root)
+
+
+def fingerprint(size):
+    return {"size": size, "mtime_ns": 1, "hash": None}
+
+
+def test_remove_temp_files_keeps_manifest_files(tmp_path):
+    root = str(tmp_path)
+    for name in (MANIFEST_NAME, MANIFEST_NAME + ".tmp", JOURNAL_NAME, ".pj_abc123.pdf"):
+        (tmp_path / name).write_text("{}")
+    (tmp_path / "sous-dossier").mkdir()
+    (tmp_path / "sous-dossier" / ".pj_facture.png").write_text("")
+
+    assert remove_temp_files(root) == 2
+    assert sorted(os.listdir(root)) == sorted([MANIFEST_NAME, MANIFEST_NAME + ".tmp", JOURNAL_NAME, "sous-dossier"])
+
+
+def test_journal_survives_two_interruptions(tmp_path):
+    root = str(tmp_path)
+    run = {"started": "2024-01-01 10:00:00", "options": {"force": True}}
+
+    manifest = Manifest.load(root)
+    manifest.start_journal(run)
+    manifest.record("a.png", fingerprint(10), "moyenne", {}, 5)
+    manifest.journal.close()
+
+    manifest = Manifest.load(root)
+    assert manifest.interrupted == run
+    assert manifest.resumed == {"a.png"}
+    manifest.start_journal({"started": "2024-01-01 11:00:00", "options": {}}, resume=True)
+    manifest.record("b.png", fingerprint(20), "moyenne", {}, 8)
+    manifest.journal.close()
+
+    manifest = Manifest.load(root)
+    assert manifest.interrupted == run
+    assert manifest.resumed == {"a.png", "b.png"}
+    assert set(manifest.entries) == {"a.png", "b.png"}
+
+
+def test_new_run_replaces_interrupted_journal(tmp_path):
+    root = str(tmp_path)
+    manifest = Manifest.load(root)
+    manifest.start_journal({"started": "avant"})
+    manifest.record("a.png", fingerprint(10), "moyenne", {}, 5)
+    manifest.journal.close()
+
+    manifest = Manifest.load(root)
+    manifest.start_journal({"started": "après"})
+    manifest.close_journal(completed=True)
+
+    manifest = Manifest.load(root)
+    assert manifest.interrupted is None
+    assert "a.png" in manifest.entries
+
+
+def test_forced_run_resumed_twice(source, tmp_path):
+    destination = str(tmp_path / "destination")
+    log = lambda message: None
+
+    with pytest.raises(Interruption):
+        compress_tree(source, destination, workers=1, force=True, log=log, progress=interrupt_after(2))
+    run = interrupted_run(source, destination)
+    assert run["processed"] == 2
+    assert run["options"]["force"] is True
+    # Fichier temporaire laissé par un arrêt brutal
+    open(os.path.join(destination, ".pj_tmp.png"), "w").close()
+
+    with pytest.raises(Interruption):
+        compress_tree(source, destination, workers=1, log=log, progress=interrupt_after(1),
+                      resume=True, **run["options"])
+    run = interrupted_run(source, destination)
+    assert run is not None
+    assert run["processed"] == 3
+    assert not os.path.exists(os.path.join(destination, ".pj_tmp.png"))
+    assert os.path.exists(os.path.join(destination, MANIFEST_NAME))
+
+    summary = compress_tree(source, destination, workers=1, log=log, resume=True, **run["options"])
+    assert summary.skipped == 3
+    assert summary.processed == 1
+    assert interrupted_run(source, destination) is None
+    assert not os.path.exists(os.path.join(destination, JOURNAL_NAME))
+
+
+def test_second_run_skips_unchanged_files(source, tmp_path):
+    destination = str(tmp_path / "destination")
+    log = lambda message: None
+
+    first = compress_tree(source, destination, workers=1, log=log)
+    assert first.processed == 4
+    assert first.skipped == 0
+
+    second = compress_tree(source, destination, workers=1, log=log)
+    assert second.skipped == 4
+    assert second.processed == 0
+
+
+def test_modified_file_level_change_and_force_recompress(source, tmp_path):
+    from PIL import Image
+
+    destination = str(tmp_path / "destination")
+    log = lambda message: None
+    compress_tree(source, destination, workers=1, log=log)
+
+    Image.new("RGB", (80, 80), (10, 20, 30)).save(os.path.join(source, "a.png"))
+    summary = compress_tree(source, destination, workers=1, log=log)
+    assert (summary.processed, summary.skipped) == (1, 3)
+
+    summary = compress_tree(source, destination, level="forte", workers=1, log=log)
+    assert (summary.processed, summary.skipped) == (4, 0)
+
+    summary = compress_tree(source, destination, level="forte", workers=1, log=log, force=True)
+    assert (summary.processed, summary.skipped) == (4, 0)
+    summary = compress_tree(source, destination, level="forte", workers=1, log=log)
+    assert (summary.processed, summary.skipped) == (0, 4)
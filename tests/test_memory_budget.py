@@ -0,0 +1,76 @@
+"""
+Budget mémoire : chemin économe sans réduction supplémentaire, originaux conservés
+"""
+import os
+
+import pytest
+
+from pj_compressor import compress_tree
+from pj_compressor.compressors import compress_image
+
+MB = 1024 * 1024
+
+
+def quiet(message):
+    pass
+
+
+def save(path, size, image_format):
+    from PIL import Image
+
+    Image.new("RGB", size, (180, 40, 90)).save(path, image_format)
+    return str(path)
+
+
+@pytest.mark.parametrize("budget", [32 * MB, 64 * MB])
+def test_budget_never_shrinks_below_the_level_size(tmp_path, budget):
+    from PIL import Image
+
+    source = save(tmp_path / "recu.jpg", (3000, 2000), "JPEG")
+    output = str(tmp_path / "sortie.jpg")
+
+    written = compress_image(source, 75, quiet, output, max_dimension=1600, memory_budget=budget)
+
+    assert written == output
+    with Image.open(output) as img:
+        assert img.size == (1600, 1067)
+
+
+def test_image_over_budget_is_kept(tmp_path):
+    from PIL import Image
+
+    source = save(tmp_path / "recu.jpg", (3000, 2000), "JPEG")
+    messages = []
+
+    written = compress_image(source, 75, messages.append, str(tmp_path / "sortie.jpg"),
+                             max_dimension=1600, memory_budget=8 * MB)
+
+    assert written is None
+    assert not os.path.exists(tmp_path / "sortie.jpg")
+    assert "recu.jpg" in messages[0] and "original conservé" in messages[0]
+    # La limite de Pillow n'est levée que le temps de l'ouverture
+    assert Image.MAX_IMAGE_PIXELS is not None
+
+
+def test_kept_file_is_compressed_by_the_next_run(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    save(source / "scan.png", (3000, 2000), "PNG")
+    destination = tmp_path / "copie"
+
+    summary = compress_tree(str(source), str(destination), workers=1, memory_budget=8 * MB, log=quiet)
+
+    assert summary.failed == 0
+    assert summary.kept == 1
+    assert (destination / "scan.png").read_bytes() == (source / "scan.png").read_bytes()
+
+    summary = compress_tree(str(source), str(destination), workers=1, log=quiet)
+
+    assert summary.skipped == 0
+    assert summary.processed == 1
+    assert summary.kept == 0
+
+
+def test_budget_share_per_process_too_small(tmp_path):
+    with pytest.raises(ValueError, match="par processus"):
+        compress_tree(str(tmp_path), workers=2, memory_budget=MB, log=quiet)
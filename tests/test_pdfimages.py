@@ -0,0 +1,89 @@
+"""
+Recompression des images d'un PDF sans Ghostscript
+"""
+import random
+
+from pj_compressor.compressors import compress_pdf_alternative
+
+
+def quiet(message):
+    pass
+
+
+def scan_pdf(path, pages=2):
+    """PDF scanné : la même image (doublon) sur chaque page, en objets distincts"""
+    from PIL import Image
+
+    generator = random.Random(0)
+    img = Image.new("RGB", (600, 800))
+    img.putdata([
+        (generator.randrange(256), (x * 3) % 256, (y * 5) % 256)
+        for y in range(800) for x in range(600)
+    ])
+    img.save(path, "PDF", save_all=True, append_images=[img.copy() for _ in range(pages - 1)], resolution=100)
+    return str(path)
+
+
+def add_stamp(path):
+    """
+    Ajoute à la dernière page une annotation dont l'apparence (/AP) dessine l'image
+    de cette page : une référence à l'image hors des ressources de la page
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject
+
+    writer = PdfWriter()
+    for page in PdfReader(path).pages:
+        writer.add_page(page)
+    page = writer.pages[len(writer.pages) - 1]
+    image = page["/Resources"]["/XObject"].raw_get("/image")
+
+    form = DecodedStreamObject()
+    form.set_data(b"q 100 0 0 100 0 0 cm /Tampon Do Q")
+    form.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0), FloatObject(100), FloatObject(100)]),
+        NameObject("/Resources"): DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Tampon"): image}),
+        }),
+    })
+    annotation = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Stamp"),
+        NameObject("/Rect"): ArrayObject([FloatObject(0), FloatObject(0), FloatObject(100), FloatObject(100)]),
+        NameObject("/AP"): DictionaryObject({NameObject("/N"): form}),
+    })
+    page[NameObject("/Annots")] = ArrayObject([annotation])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def test_duplicate_images_are_stored_once(tmp_path):
+    from PyPDF2 import PdfReader
+
+    source = scan_pdf(tmp_path / "scan.pdf", pages=3)
+    output = str(tmp_path / "sortie.pdf")
+
+    assert compress_pdf_alternative(source, quiet, output, dpi=72, quality=60)
+
+    reader = PdfReader(output)
+    images = {page["/Resources"]["/XObject"].raw_get("/image").idnum for page in reader.pages}
+    assert len(images) == 1
+    assert len(reader.pages[0]["/Resources"]["/XObject"]["/image"].get_data()) > 0
+
+
+def test_images_referenced_outside_page_resources_stay_valid(tmp_path):
+    from PyPDF2 import PdfReader
+
+    source = scan_pdf(tmp_path / "scan.pdf")
+    add_stamp(source)
+    output = str(tmp_path / "sortie.pdf")
+
+    assert compress_pdf_alternative(source, quiet, output, dpi=72, quality=60)
+
+    page = PdfReader(output).pages[1]
+    appearance = page["/Annots"][0].get_object()["/AP"]["/N"].get_object()
+    stamp = appearance["/Resources"]["/XObject"]["/Tampon"].get_object()
+    assert stamp["/Subtype"] == "/Image"
+    assert len(stamp.get_data()) > 0
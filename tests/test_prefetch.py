@@ -0,0 +1,64 @@
+"""
+Lecture anticipée des fichiers
+"""
+from pj_compressor.compressors import PDF_EXTENSIONS, compress_image, compress_pdf_alternative
+from pj_compressor.prefetch import Prefetcher
+
+
+def make_jobs(tmp_path, names):
+    jobs = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(name.encode("utf-8") * 10)
+        jobs.append((str(path), str(tmp_path / "copie" / name), None))
+    return jobs
+
+
+def test_jobs_keep_their_order_and_content(tmp_path):
+    jobs = make_jobs(tmp_path, [f"{index}.png" for index in range(20)])
+
+    results = list(Prefetcher(depth=3).run(iter(jobs)))
+
+    assert [result[:3] for result in results] == jobs
+    for job, (_, _, _, (file_stat, data)) in zip(jobs, results):
+        assert data == open(job[0], "rb").read()
+        assert file_stat.st_size == len(data)
+
+
+def test_skipped_extensions_are_not_read(tmp_path):
+    jobs = make_jobs(tmp_path, ["a.png", "b.pdf", "c.PDF"])
+
+    results = list(Prefetcher(skip_extensions=PDF_EXTENSIONS).run(iter(jobs)))
+
+    assert results[0][3][1] is not None
+    assert results[1][3] is None
+    assert results[2][3] is None
+
+
+def test_idle_ticks_flush_pending_files(tmp_path):
+    jobs = make_jobs(tmp_path, ["a.png", "b.png"])
+
+    results = list(Prefetcher(depth=8).run(iter([jobs[0], None, jobs[1]])))
+
+    assert [result if result is None else result[:3] for result in results] == [jobs[0], None, jobs[1]]
+
+
+def test_files_over_the_size_limit_are_not_loaded(tmp_path):
+    jobs = make_jobs(tmp_path, ["grand.png"])
+
+    (_, _, _, (file_stat, data)), = Prefetcher(max_file_bytes=10).run(iter(jobs))
+
+    assert data is None
+    assert file_stat.st_size > 10
+
+
+def test_errors_name_the_file_read_in_memory(tmp_path):
+    messages = []
+    compress_image(str(tmp_path / "facture.png"), log=messages.append,
+                   output_path=str(tmp_path / "sortie.png"), source=b"pas une image")
+    compress_pdf_alternative(str(tmp_path / "releve.pdf"), messages.append,
+                             str(tmp_path / "sortie.pdf"), source=b"pas un PDF")
+
+    assert len(messages) == 2
+    assert "facture.png" in messages[0] and "BytesIO" not in messages[0]
+    assert "releve.pdf" in messages[1] and "BytesIO" not in messages[1]
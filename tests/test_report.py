@@ -0,0 +1,66 @@
+"""
+Mesures d'exécution et rapport
+"""
+import csv
+import json
+
+from pj_compressor.engine import FileResult
+from pj_compressor.report import RESERVOIR_SIZE, RunMetrics, StageStats, percentile
+
+
+def file_result(name, elapsed=0.01):
+    result = FileResult(name, name)
+    result.success = True
+    result.initial_size, result.final_size = 1000, 400
+    result.elapsed = elapsed
+    result.stages = {"encode": elapsed}
+    result.method = "pillow"
+    return result
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+def test_stage_stats_memory_is_bounded():
+    stats = StageStats()
+    values = [index / 1000 for index in range(20000)]
+    for value in values:
+        stats.add(value)
+
+    assert len(stats.reservoir) == RESERVOIR_SIZE
+    assert stats.count == len(values)
+    assert abs(stats.total - sum(values)) < 1e-6
+    assert stats.max == values[-1]
+    # Échantillon uniforme : percentiles proches des valeurs exactes (10 et 19 s)
+    assert abs(stats.percentile(50) - 10) < 1.5
+    assert abs(stats.percentile(95) - 19) < 1
+
+
+def test_rows_only_kept_for_a_report():
+    metrics = RunMetrics(rows=False)
+    for index in range(100):
+        metrics.add_result(file_result(f"{index}.png"), f"{index}.png")
+
+    assert metrics.rows is None
+    assert metrics.counters["fichiers.compressé"] == 100
+    assert metrics.summary()["stages"]["total"]["count"] == 100
+
+
+def test_report_files(tmp_path):
+    metrics = RunMetrics()
+    metrics.add_result(file_result("a.png", 0.02), "dossier/a.png")
+
+    metrics.write(str(tmp_path / "rapport.json"))
+    with open(tmp_path / "rapport.json", encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["files"][0]["path"] == "dossier/a.png"
+    assert report["run"]["stages"]["encode"]["p50_ms"] == 20.0
+
+    metrics.write(str(tmp_path / "rapport.csv"))
+    with open(tmp_path / "rapport.csv", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f, delimiter=";"))
+    assert rows[0]["path"] == "dossier/a.png"
+    assert rows[0]["encode_ms"] == "20.0"
@@ -0,0 +1,111 @@
+"""
+Mode taille cible : recherche de l'échelle et de la qualité
+"""
+import io
+import random
+
+import pytest
+
+from pj_compressor import images
+from pj_compressor.compressors import SizeTarget
+from pj_compressor.images import MIN_TARGET_QUALITY, fit_to_size
+
+
+def photo(width=400, height=300):
+    from PIL import Image
+
+    generator = random.Random(0)
+    img = Image.new("RGB", (width, height))
+    img.putdata([
+        (generator.randrange(256), (x * 3) % 256, (y * 5) % 256)
+        for y in range(height) for x in range(width)
+    ])
+    return img
+
+
+def jpeg_size(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return buffer.tell()
+
+
+def test_best_quality_under_the_target():
+    img = photo()
+    max_bytes = jpeg_size(img, 50)
+    target = SizeTarget(max_bytes)
+
+    data, _, _ = fit_to_size(img, "JPEG", 85, target)
+
+    assert len(data) <= max_bytes
+    assert target.setting["scale"] == 1.0
+    assert MIN_TARGET_QUALITY <= target.setting["quality"] <= 85
+    # Qualité la plus haute qui tient : un cran au-dessus dépasse la cible
+    if target.setting["quality"] < 85:
+        assert len(fit_to_size(img, "JPEG", target.setting["quality"] + 1, SizeTarget(10 ** 9))[0]) > max_bytes
+
+
+def test_image_scaled_down_when_quality_is_not_enough():
+    img = photo()
+    target = SizeTarget(jpeg_size(img, MIN_TARGET_QUALITY) // 3)
+
+    data, _, _ = fit_to_size(img, "JPEG", 85, target)
+
+    assert len(data) <= target.max_bytes
+    assert target.setting["scale"] < 1.0
+
+
+def counted_encoder(monkeypatch):
+    """Compte les encodages essayés par fit_to_size"""
+    calls = []
+    original = images.choose_encoding
+
+    def choose_encoding(*args, **kwargs):
+        calls.append(args[2])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(images, "choose_encoding", choose_encoding)
+    return calls
+
+
+@pytest.mark.parametrize("max_bytes", [
+    lambda img: jpeg_size(img, 50),
+    lambda img: jpeg_size(img, MIN_TARGET_QUALITY) // 2,
+], ids=["qualité", "échelle"])
+def test_hint_saves_encoding_trials(monkeypatch, max_bytes):
+    img = photo()
+    calls = counted_encoder(monkeypatch)
+    target = SizeTarget(max_bytes(img))
+    fit_to_size(img, "JPEG", 85, target)
+    cold = len(calls)
+
+    calls.clear()
+    hinted = SizeTarget(target.max_bytes, hint=target.setting)
+    fit_to_size(img, "JPEG", 85, hinted)
+
+    assert hinted.setting == target.setting
+    # Qualité minimale à l'échelle retenue, puis qualité retenue et la suivante
+    assert len(calls) == 3
+    assert len(calls) < cold
+
+
+def test_outdated_hint_gives_the_cold_search_result():
+    img = photo()
+    target = SizeTarget(jpeg_size(img, 40))
+    fit_to_size(img, "JPEG", 85, target)
+
+    cold = SizeTarget(jpeg_size(img, 70))
+    fit_to_size(img, "JPEG", 85, cold)
+    hinted = SizeTarget(cold.max_bytes, hint=target.setting)
+    fit_to_size(img, "JPEG", 85, hinted)
+
+    assert hinted.setting == cold.setting
+
+
+def test_unreachable_target_returns_smallest_encoding():
+    img = photo()
+    target = SizeTarget(100)
+
+    data, _, _ = fit_to_size(img, "JPEG", 85, target)
+
+    assert target.setting is None
+    assert len(data) > 100